@@ -2,11 +2,34 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import folium
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-import random
 import io
+import json
+import os
+from contextlib import contextmanager
+from functools import partial, wraps
+
+from quickdeliver import instrument
+from quickdeliver.data import (
+    content_hash, export_routes_to_csv, generate_sample_data, load_csv_data, routes_geojson,
+    write_routes_parquet
+)
+from quickdeliver.distance import build_distance_matrix, extend_distance_matrix
+from quickdeliver.incremental import add_vehicle, insert_stop
+from quickdeliver.jobs import DONE, FAILED, ResultCache, SolveJob
+from quickdeliver.traffic import DEFAULT_SEED, TrafficModel, format_hhmm
+from quickdeliver.local_search import DEFAULT_TIME_BUDGET
+from quickdeliver.maps import create_route_map, is_high_volume_map
+from quickdeliver.matrix_store import MatrixStore
+from quickdeliver.model import PointTable, RouteTable, depot_rows
+from quickdeliver.decompose import decompose_solve, multi_depot_solve
+from quickdeliver.multistart import default_workers, multistart_solve
+from quickdeliver.roads import RoadNetwork
+from quickdeliver.routes import route_label, route_legs, route_points
+from quickdeliver.solver import ALGORITHM_LABELS, solve
+from quickdeliver.time_windows import SERVICE_MINUTES, WINDOW_MODES
 
 # Page configuration - DARK THEME
 st.set_page_config(
@@ -303,235 +326,298 @@ if 'vehicles' not in st.session_state:
     st.session_state.vehicles = []
 if 'optimized' not in st.session_state:
     st.session_state.optimized = False
+if 'traffic_seed' not in st.session_state:
+    st.session_state.traffic_seed = DEFAULT_SEED
+if 'road_network' not in st.session_state:
+    st.session_state.road_network = ''
+if 'performance' not in st.session_state:
+    st.session_state.performance = {}
+if 'job' not in st.session_state:
+    st.session_state.job = None
 
 # Helper Functions
-def generate_sample_data():
-    """Generate realistic sample data for the metropolitan area"""
-    depot = {'name': 'Central Depot', 'lat': -17.8252, 'lon': 31.0335, 'parcels': 0, 'time_start': '06:00', 'time_end': '20:00'}
-    
-    locations = [
-        'Harare CBD Store', 'Avondale Shopping Center', 'Borrowdale Outlet', 
-        'Eastgate Mall', 'Westgate Store', 'Sam Levy Village', 
-        'Newlands Depot', 'Mbare Collection Point', 'Chitungwiza Branch',
-        'Budiriro Outlet', 'Mount Pleasant Store', 'Glen Norah Collection',
-        'Hatfield Branch', 'Belvedere Outlet', 'Waterfalls Store'
-    ]
-    
-    collection_points = [depot]
-    for i, location in enumerate(locations):
-        lat = depot['lat'] + random.uniform(-0.15, 0.15)
-        lon = depot['lon'] + random.uniform(-0.15, 0.15)
-        parcels = random.randint(15, 32)
-        hour_start = random.randint(7, 9)
-        hour_end = random.randint(16, 18)
-        time_start = f"{hour_start:02d}:{random.choice(['00', '30'])}"
-        time_end = f"{hour_end:02d}:{random.choice(['00', '30'])}"
-        
-        collection_points.append({
-            'name': location,
-            'lat': lat,
-            'lon': lon,
-            'parcels': parcels,
-            'time_start': time_start,
-            'time_end': time_end
-        })
-    
-    vehicles = [
-        {'id': 'V1', 'capacity': 100, 'fuel_efficiency': 8.5, 'cost_per_km': 2.5},
-        {'id': 'V2', 'capacity': 80, 'fuel_efficiency': 9.2, 'cost_per_km': 2.0},
-        {'id': 'V3', 'capacity': 120, 'fuel_efficiency': 7.8, 'cost_per_km': 3.0},
-    ]
-    
-    return collection_points, vehicles
+# Cached results are keyed on a content hash of the inputs (computed once per
+# optimization) so reruns from widget clicks reuse them; the underscore
+# arguments are left out of Streamlit's own hashing. Oldest entries are
+# evicted beyond CACHE_ENTRIES.
+CACHE_ENTRIES = 8
+
+def cache_counted(cached):
+    """Count calls of a cached function as cache hits, unless its body ran (and counted a miss)"""
+    @wraps(cached)
+    def lookup(*args, **kwargs):
+        misses = instrument.counter('cache_misses')
+        result = cached(*args, **kwargs)
+        if instrument.counter('cache_misses') == misses:
+            instrument.count('cache_hits')
+        return result
+    return lookup
 
-def load_csv_data(points_file, vehicles_file):
-    """Load data from CSV files"""
+@cache_counted
+@st.cache_resource(max_entries=2, show_spinner=False)
+def cached_road_network(path, modified):
+    """Road graph for a local file, loaded once per file version"""
+    instrument.count('cache_misses')
+    return RoadNetwork.load(path)
+
+def road_network():
+    """RoadNetwork from the Optimization Settings path, or None for straight-line distances"""
+    path = st.session_state.road_network
+    if not path:
+        return None
     try:
-        df_points = pd.read_csv(points_file)
-        collection_points = df_points.to_dict('records')
-        
-        df_vehicles = pd.read_csv(vehicles_file)
-        vehicles = df_vehicles.to_dict('records')
-        
-        return collection_points, vehicles, None
-    except Exception as e:
-        return None, None, str(e)
+        return cached_road_network(path, os.path.getmtime(path))
+    except (OSError, ValueError) as e:
+        st.warning(f"⚠️ Road network not loaded ({e}) - using straight-line distances")
+        return None
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points using Haversine formula"""
-    R = 6371
-    
-    lat1_rad = np.radians(lat1)
-    lat2_rad = np.radians(lat2)
-    delta_lat = np.radians(lat2 - lat1)
-    delta_lon = np.radians(lon2 - lon1)
-    
-    a = np.sin(delta_lat/2)**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(delta_lon/2)**2
-    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
-    distance = R * c
-    
-    traffic_factor = random.uniform(0.95, 1.15)
-    distance = distance * traffic_factor
-    
-    return distance
+# Distance matrices also persist on disk between app runs, keyed by point
+# ids, so a restart maps yesterday's matrix and computes only changed points
+MATRIX_STORE = MatrixStore()
 
-def nearest_neighbor_algorithm(points, vehicles):
-    """Nearest neighbor algorithm with capacity constraints"""
-    depot = points[0]
-    remaining_points = points[1:].copy()
-    routes = []
-    
-    for vehicle in vehicles:
-        if not remaining_points:
-            break
-            
-        route = {
-            'vehicle_id': vehicle['id'],
-            'capacity': vehicle['capacity'],
-            'fuel_efficiency': vehicle['fuel_efficiency'],
-            'cost_per_km': vehicle['cost_per_km'],
-            'points': [depot],
-            'total_parcels': 0,
-            'total_distance': 0,
-            'total_time': 0,
-            'total_cost': 0
-        }
-        
-        current_point = depot
-        
-        while remaining_points and route['total_parcels'] < vehicle['capacity']:
-            nearest = None
-            min_distance = float('inf')
-            
-            for point in remaining_points:
-                dist = calculate_distance(
-                    current_point['lat'], current_point['lon'],
-                    point['lat'], point['lon']
-                )
-                
-                if route['total_parcels'] + point['parcels'] <= vehicle['capacity']:
-                    if dist < min_distance:
-                        min_distance = dist
-                        nearest = point
-            
-            if nearest is None:
-                break
-            
-            route['points'].append(nearest)
-            route['total_parcels'] += nearest['parcels']
-            route['total_distance'] += min_distance
-            route['total_time'] += min_distance / 40 * 60
-            
-            current_point = nearest
-            remaining_points.remove(nearest)
-        
-        return_distance = calculate_distance(
-            current_point['lat'], current_point['lon'],
-            depot['lat'], depot['lon']
+@cache_counted
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_distance_matrix(key, _points, traffic_seed, _roads):
+    """Distance matrix for the points, shared across reruns and sessions"""
+    instrument.count('cache_misses')
+    try:
+        return MATRIX_STORE.matrix(_points, TrafficModel(traffic_seed), roads=_roads)[0]
+    except OSError:
+        # Read-only or full disk: compute it in memory
+        return build_distance_matrix(_points, TrafficModel(traffic_seed), roads=_roads)
+
+# Optimizations run as background jobs (one per session, handle in session
+# state) that the page polls every JOB_POLL_SECONDS; finished solutions are
+# kept by content hash and shared across sessions like the caches above
+JOB_POLL_SECONDS = 0.5
+
+@st.cache_resource(show_spinner=False)
+def solution_cache():
+    """Finished solutions by key, routes packed into RouteTables - treat as read-only"""
+    return ResultCache(CACHE_ENTRIES)
+
+def optimize_solution(points, vehicles, dist, workers, decompose, on_progress=None, **settings):
+    """Run the optimizer the settings ask for; the solution's routes come back packed into a RouteTable"""
+    if len(depot_rows(points)) > 1:
+        optimize = partial(multi_depot_solve, workers=workers)
+    elif decompose:
+        optimize = partial(decompose_solve, workers=workers)
+    else:
+        optimize = solve if workers == 1 else partial(multistart_solve, workers=workers)
+    solution = optimize(points, vehicles, dist, on_progress=on_progress, **settings)
+    solution['routes'] = RouteTable.from_routes(solution['routes'])
+    return solution
+
+@cache_counted
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_map_html(key, _routes, _collection_points):
+    """Rendered HTML of the route map"""
+    instrument.count('cache_misses')
+    figure = folium.Figure().add_child(create_route_map(_routes, _collection_points))
+    return figure.render()
+
+@cache_counted
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_stop_tables(key, _routes, _collection_points, _dist):
+    """Route sequence text and stop table for every route"""
+    instrument.count('cache_misses')
+    tables = []
+    for route in _routes:
+        points = route_points(route, _collection_points)
+        legs = route_legs(route, _dist)
+        cumulative = np.concatenate([[0.0], np.cumsum(legs, dtype=np.float64)])
+        table = pd.DataFrame({
+            'Stop': range(len(points)),
+            'Location': [p['name'] for p in points],
+            'Parcels': [p['parcels'] for p in points],
+            'Time Window': [f"{p['time_start']}-{p['time_end']}" for p in points],
+            'Arrival': [format_hhmm(t) for t in route['arrival']],
+            'Wait (min)': [f"{w:.0f}" for w in route['wait']],
+            'Distance (km)': [f"{d:.2f}" for d in np.concatenate([[0.0], legs])],
+            'Cumulative (km)': [f"{c:.2f}" for c in cumulative]
+        })
+        tables.append((" → ".join(p['name'] for p in points), table))
+    return tables
+
+@cache_counted
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_vehicle_charts(key, _routes):
+    """Distance, cost, parcels and fuel bar charts by vehicle"""
+    instrument.count('cache_misses')
+    vehicles = [route_label(r) for r in _routes]
+    charts = [
+        (_routes.column('total_distance'), "Distance by Vehicle", "Distance (km)", 'Viridis', "{:.2f} km"),
+        (_routes.column('total_cost'), "Cost by Vehicle", "Cost ($)", 'Plasma', "${:.2f}"),
+        (_routes.column('total_parcels'), "Parcels Delivered by Vehicle", "Parcels", 'Cividis', "{}"),
+        (_routes.column('fuel_used'), "Fuel Consumption by Vehicle", "Fuel (Liters)", 'Turbo', "{:.2f} L"),
+    ]
+    figures = []
+    for values, title, y_title, colorscale, label in charts:
+        fig = go.Figure(data=[
+            go.Bar(
+                x=vehicles,
+                y=values,
+                marker=dict(
+                    color=values,
+                    colorscale=colorscale,
+                    showscale=False
+                ),
+                text=[label.format(v) for v in values],
+                textposition='auto'
+            )
+        ])
+        fig.update_layout(
+            title=title,
+            xaxis_title="Vehicle",
+            yaxis_title=y_title,
+            template="plotly_dark",
+            showlegend=False,
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)'
         )
-        route['total_distance'] += return_distance
-        route['total_time'] += return_distance / 40 * 60
-        route['points'].append(depot)
-        
-        route['total_cost'] = route['total_distance'] * vehicle['cost_per_km']
-        route['fuel_used'] = route['total_distance'] / vehicle['fuel_efficiency']
+        figures.append(fig)
+    return figures
+
+@cache_counted
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_efficiency_table(key, _routes):
+    """Per-route efficiency metrics"""
+    instrument.count('cache_misses')
+    efficiency_data = []
+    for route in _routes:
+        capacity_util = (route['total_parcels'] / route['capacity']) * 100
+        cost_per_parcel = route['total_cost'] / route['total_parcels'] if route['total_parcels'] > 0 else 0
+        distance_per_parcel = route['total_distance'] / route['total_parcels'] if route['total_parcels'] > 0 else 0
+        fuel_per_km = route['fuel_used'] / route['total_distance'] if route['total_distance'] > 0 else 0
         
-        routes.append(route)
-    
-    return routes
+        efficiency_data.append({
+            'Vehicle': route_label(route),
+            'Capacity Utilization (%)': f"{capacity_util:.1f}",
+            'Cost per Parcel ($)': f"{cost_per_parcel:.2f}",
+            'Distance per Parcel (km)': f"{distance_per_parcel:.2f}",
+            'Fuel Efficiency (L/km)': f"{fuel_per_km:.2f}",
+            'Avg Speed (km/h)': f"{(route['total_distance'] / (route['total_time']/60)) if route['total_time'] > 0 else 0:.1f}"
+        })
+    return pd.DataFrame(efficiency_data)
 
-def create_route_map(routes, collection_points):
-    """Create an interactive map with optimized routes - DARK THEME"""
-    depot = collection_points[0]
-    m = folium.Map(
-        location=[depot['lat'], depot['lon']], 
-        zoom_start=11,
-        tiles='CartoDB dark_matter'  # DARK MAP THEME
+@cache_counted
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_savings_chart(distance_savings_percent, fuel_savings_percent, time_savings_percent):
+    """Donut chart of savings by category"""
+    instrument.count('cache_misses')
+    fig = go.Figure(data=[go.Pie(
+        labels=['Distance Savings', 'Fuel Savings', 'Time Savings'],
+        values=[distance_savings_percent, fuel_savings_percent, time_savings_percent],
+        hole=.5,
+        marker=dict(colors=['#00f2fe', '#4facfe', '#00f260'])
+    )])
+    fig.update_layout(
+        title="Optimization Impact by Category",
+        template="plotly_dark",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        showlegend=True
     )
-    
-    colors = ['#00f2fe', '#4facfe', '#00f260', '#0575e6', '#f093fb', '#f5576c', '#fa709a', '#fee140']
-    
-    # Depot marker with HIGH CONTRAST popup
-    folium.Marker(
-        [depot['lat'], depot['lon']],
-        popup=folium.Popup(
-            f"""
-            <div style='font-family: Arial; padding: 10px; background-color: #1a1f2e; border: 2px solid #00f2fe; border-radius: 8px;'>
-                <h4 style='color: #00f2fe; margin: 0 0 10px 0;'>{depot['name']}</h4>
-                <p style='color: #ffffff; margin: 5px 0;'><b>Operating Hours:</b></p>
-                <p style='color: #ffffff; margin: 0;'>{depot['time_start']} - {depot['time_end']}</p>
-            </div>
-            """,
-            max_width=300
-        ),
-        tooltip=folium.Tooltip('🏢 Central Depot (Start/End)', style='color: #000000; background-color: #00f2fe; font-weight: bold;'),
-        icon=folium.Icon(color='black', icon='home', prefix='fa')
-    ).add_to(m)
-    
-    for idx, route in enumerate(routes):
-        color = colors[idx % len(colors)]
-        
-        route_coords = [[p['lat'], p['lon']] for p in route['points']]
-        
-        # Route line with HIGH CONTRAST tooltip
-        folium.PolyLine(
-            route_coords,
-            color=color,
-            weight=5,
-            opacity=0.9,
-            tooltip=folium.Tooltip(
-                f"<b>{route['vehicle_id']}</b><br>Distance: {route['total_distance']:.2f} km<br>Parcels: {route['total_parcels']}<br>Cost: ${route['total_cost']:.2f}",
-                style='color: #000000; background-color: #ffffff; font-weight: bold; padding: 8px; border-radius: 5px;'
-            )
-        ).add_to(m)
-        
-        # Collection point markers with HIGH CONTRAST popups
-        for order, point in enumerate(route['points'][1:-1], 1):
-            folium.CircleMarker(
-                [point['lat'], point['lon']],
-                radius=10,
-                popup=folium.Popup(
-                    f"""
-                    <div style='font-family: Arial; padding: 12px; background-color: #1a1f2e; border: 2px solid {color}; border-radius: 8px; min-width: 200px;'>
-                        <h4 style='color: {color}; margin: 0 0 10px 0; font-size: 16px;'>{point['name']}</h4>
-                        <p style='color: #ffffff; margin: 5px 0;'><b>Stop Number:</b> {order}</p>
-                        <p style='color: #ffffff; margin: 5px 0;'><b>Parcels:</b> {point['parcels']}</p>
-                        <p style='color: #ffffff; margin: 5px 0;'><b>Time Window:</b> {point['time_start']} - {point['time_end']}</p>
-                        <p style='color: {color}; margin: 5px 0;'><b>Vehicle:</b> {route['vehicle_id']}</p>
-                    </div>
-                    """,
-                    max_width=300
-                ),
-                tooltip=folium.Tooltip(
-                    f"<b>Stop {order}:</b> {point['name']}",
-                    style='color: #000000; background-color: #ffffff; font-weight: bold; padding: 5px; border-radius: 3px;'
-                ),
-                color=color,
-                fill=True,
-                fillColor=color,
-                fillOpacity=0.8,
-                weight=3
-            ).add_to(m)
-    
-    return m
+    return fig
 
-def export_routes_to_csv(routes):
-    """Export optimized routes to CSV"""
-    route_data = []
-    for route in routes:
-        for idx, point in enumerate(route['points']):
-            route_data.append({
-                'Vehicle_ID': route['vehicle_id'],
-                'Stop_Number': idx,
-                'Location': point['name'],
-                'Latitude': point['lat'],
-                'Longitude': point['lon'],
-                'Parcels': point['parcels'],
-                'Time_Window': f"{point['time_start']}-{point['time_end']}"
-            })
-    
-    df = pd.DataFrame(route_data)
-    return df
+def can_update_incrementally():
+    """Whether an edit can patch the current routes: optimized, the option on and a single depot"""
+    return (st.session_state.optimized and st.session_state.get('incremental', True)
+            and 'multi_depot' not in st.session_state.solution)
+
+def update_solution_incrementally(edit):
+    """Apply ``insert_stop``/``add_vehicle`` to the current routes instead of re-optimizing.
+
+    The distance matrix is extended by the new point's row and column only;
+    the result replaces the session's solution as a fresh optimization would.
+    """
+    points = st.session_state.collection_points
+    dist = extend_distance_matrix(st.session_state.dist_matrix, points, TrafficModel(st.session_state.traffic_seed),
+                                  roads=road_network())
+    solution = edit(st.session_state.solution, points, st.session_state.vehicles, dist)
+    solution['routes'] = RouteTable.from_routes(solution['routes'])
+    st.session_state.solution_key = content_hash(
+        st.session_state.solution_key, solution['incremental']['action'], len(points), len(st.session_state.vehicles)
+    )
+    st.session_state.dist_matrix = dist
+    st.session_state.solution = solution
+    st.session_state.routes = solution['routes']
+    return solution['incremental']
+
+@contextmanager
+def performance_stage(name):
+    """Record the enclosed step as stage ``name`` and keep its report for the Performance panel.
+
+    Library stages inside it (distance, construct, improve...) are timed
+    separately; each step's latest report replaces its previous one.
+    """
+    with instrument.recording() as run, instrument.stage(name):
+        yield run
+    st.session_state.performance[name] = run.report()
+
+def show_solution(solution_key, dist, solution):
+    """Make a finished solution the session's current one"""
+    st.session_state.solution_key = solution_key
+    st.session_state.dist_matrix = dist
+    st.session_state.solution = solution
+    st.session_state.routes = solution['routes']
+    st.session_state.optimized = True
+    st.session_state.job_notice = ('success', "✅ Optimization complete!")
+
+def finish_job(job):
+    """Take over a finished job's solution (unless its inputs changed meanwhile) and report how it ended"""
+    inputs = st.session_state.job_inputs
+    st.session_state.job = None
+    st.session_state.performance['solve'] = job.report
+    unchanged = inputs['data_key'] == content_hash(st.session_state.collection_points, st.session_state.vehicles)
+    if job.state == DONE and unchanged:
+        if not job.stopped_early:
+            solution_cache().put(inputs['solution_key'], job.result)
+        show_solution(inputs['solution_key'], inputs['dist'], job.result)
+        if job.stopped_early:
+            st.session_state.job_notice = ('success', "✅ Optimization stopped early - showing the best routes found")
+    elif job.state == DONE:
+        st.session_state.job_notice = ('warning', "⚠️ The data changed while optimizing - optimize again")
+    elif job.state == FAILED:
+        st.session_state.job_notice = ('error', f"❌ Optimization failed: {job.error}")
+    else:
+        st.session_state.job_notice = ('info', "✖️ Optimization cancelled")
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_progress():
+    """Progress of the session's optimization job, refreshed on its own while the job runs"""
+    job = st.session_state.job
+    if job is None:
+        return
+    if job.finished:
+        finish_job(job)
+        st.rerun()
+    status = job.status()
+    label = "Cancelling..." if status['cancelling'] else "Stopping..." if status['stopping'] else status['phase'] or "Starting..."
+    st.progress(status['fraction'], text=f"🔄 {label} ({status['elapsed']:.1f}s of {job.time_budget:.1f}s budget)")
+    if status['best_cost'] is not None:
+        st.caption(
+            f"Best so far: {status['best_stops']} stops on {status['best_routes']} routes | "
+            f"{status['best_distance']:.2f} km | ${status['best_cost']:.2f}"
+        )
+    col1, col2 = st.columns(2)
+    if col1.button("⏹️ Stop now, keep best", key="job_stop", disabled=status['stopping']):
+        job.stop()
+    if col2.button("✖️ Cancel", key="job_cancel", disabled=status['cancelling']):
+        job.cancel()
+
+def performance_tables(performance):
+    """Stage table (step, stage, seconds, share of all steps) and summed counters of the latest step reports"""
+    total = sum(report['total_seconds'] for report in performance.values()) or 1.0
+    stages = pd.DataFrame([
+        {'Step': step, 'Stage': stage, 'Seconds': round(seconds, 4), 'Share (%)': round(seconds / total * 100, 1)}
+        for step, report in performance.items() for stage, seconds in report['stages'].items()
+    ]).sort_values('Seconds', ascending=False)
+    counters = {}
+    for report in performance.values():
+        for counter, n in report['counters'].items():
+            counters[counter] = counters.get(counter, 0) + n
+    return stages, counters
 
 # MAIN APPLICATION
 st.markdown('<h1 class="main-header">🚚 QuickDeliver Routing System</h1>', unsafe_allow_html=True)
@@ -552,7 +638,8 @@ with st.sidebar:
     
     if data_option == "🎲 Generate Sample Data":
         if st.button("🎲 Load Sample Data", help="Generate realistic sample data"):
-            points, vehicles = generate_sample_data()
+            with performance_stage('load'):
+                points, vehicles = generate_sample_data()
             st.session_state.collection_points = points
             st.session_state.vehicles = vehicles
             st.session_state.optimized = False
@@ -563,10 +650,12 @@ with st.sidebar:
         st.markdown("**Upload CSV Files:**")
         points_file = st.file_uploader("📍 Collection Points CSV", type=['csv'])
         vehicles_file = st.file_uploader("🚛 Vehicles CSV", type=['csv'])
+        csv_day = st.text_input("📅 Day", "", help="For multi-day files: load only rows whose day column matches")
         
         if st.button("📤 Load from CSV"):
             if points_file and vehicles_file:
-                points, vehicles, error = load_csv_data(points_file, vehicles_file)
+                with performance_stage('load'):
+                    points, vehicles, error = load_csv_data(points_file, vehicles_file, day=csv_day.strip() or None)
                 if error:
                     st.error(f"❌ Error: {error}")
                 else:
@@ -601,8 +690,15 @@ with st.sidebar:
                 'time_end': time_parts[1] if len(time_parts) == 2 else '17:00'
             }
             st.session_state.collection_points.append(new_point)
-            st.session_state.optimized = False
-            st.success(f"✅ Added {cp_name}")
+            if can_update_incrementally():
+                change = update_solution_incrementally(insert_stop)
+                if change['inserted']:
+                    st.success(f"✅ Added {cp_name} to the routes ({change['added_km']:+.2f} km in {change['seconds'] * 1000:.0f} ms)")
+                else:
+                    st.warning(f"⚠️ Added {cp_name}, but it fits no route - listed as unassigned")
+            else:
+                st.session_state.optimized = False
+                st.success(f"✅ Added {cp_name}")
     
     with st.expander("🚛 Add Vehicle"):
         v_id = st.text_input("Vehicle ID", "V1")
@@ -618,8 +714,63 @@ with st.sidebar:
                 'cost_per_km': v_cost
             }
             st.session_state.vehicles.append(new_vehicle)
+            if can_update_incrementally():
+                change = update_solution_incrementally(add_vehicle)
+                st.success(f"✅ Added {v_id} - {change['inserted']} unassigned stops routed in {change['seconds'] * 1000:.0f} ms")
+            else:
+                st.session_state.optimized = False
+                st.success(f"✅ Added {v_id}")
+    
+    with st.expander("⚙️ Optimization Settings"):
+        traffic_seed = st.number_input(
+            "Traffic Seed", min_value=0, value=int(st.session_state.traffic_seed), step=1,
+            help="Same seed = same traffic factors, so results are reproducible"
+        )
+        if traffic_seed != st.session_state.traffic_seed:
+            st.session_state.traffic_seed = int(traffic_seed)
+            st.session_state.optimized = False
+        road_path = st.text_input(
+            "Road network file", value=st.session_state.road_network, placeholder="harare.npz or harare.osm",
+            help="Local OpenStreetMap extract (.osm/.osm.gz) or a graph saved with python -m quickdeliver.roads; distances then follow the roads. Leave blank for straight-line estimates"
+        )
+        if road_path.strip() != st.session_state.road_network:
+            st.session_state.road_network = road_path.strip()
             st.session_state.optimized = False
-            st.success(f"✅ Added {v_id}")
+        st.checkbox(
+            "Update routes incrementally", value=True, key="incremental",
+            help="After optimizing, added points and vehicles are inserted into the current routes (cheapest feasible insertion and a short local repair) instead of re-optimizing from scratch"
+        )
+        st.checkbox(
+            "Local search improvement", value=True, key="use_local_search",
+            help="2-opt, Or-opt, relocate and swap moves after the greedy construction"
+        )
+        st.slider(
+            "Improvement time budget (s)", min_value=0.5, max_value=30.0,
+            value=DEFAULT_TIME_BUDGET, step=0.5, key="time_budget"
+        )
+        st.selectbox(
+            "Time windows", WINDOW_MODES, key="window_mode",
+            format_func={'hard': 'Hard - never arrive late', 'soft': 'Soft - allow late, report it',
+                         'off': 'Off - ignore windows'}.get,
+            help="How collection time windows (time_start/time_end) constrain the routes"
+        )
+        st.number_input(
+            "Service time per stop (min)", min_value=0, max_value=120,
+            value=SERVICE_MINUTES, step=1, key="service_minutes"
+        )
+        st.number_input(
+            "Parallel workers (multi-start)", min_value=1, max_value=max(default_workers(), 1),
+            value=1, step=1, key="workers",
+            help="Above 1, randomized starts run on several CPU cores within the time budget and the best routes are kept; with decomposition, clusters are solved on them instead"
+        )
+        st.checkbox(
+            "Profile optimization (cProfile)", value=False, key="profile_optimization",
+            help="Run the next optimization under cProfile and list its slowest functions in the Performance panel (slows the run; a result that is already cached is not recomputed)"
+        )
+        st.checkbox(
+            "Cluster-first decomposition", value=False, key="decompose",
+            help="For very large instances: split the stops into geographic clusters, solve each with its share of the fleet (on the parallel workers) and repair the routes along cluster borders"
+        )
     
     st.markdown("---")
     
@@ -631,14 +782,39 @@ with st.sidebar:
         st.markdown("---")
         st.markdown("#### 💾 Export Results")
         if st.button("📥 Download CSV"):
-            df_export = export_routes_to_csv(st.session_state.routes)
-            csv = df_export.to_csv(index=False)
-            st.download_button(
-                label="⬇️ Download Routes",
-                data=csv,
-                file_name="optimized_routes.csv",
-                mime="text/csv"
-            )
+            with performance_stage('export'):
+                export_args = (
+                    st.session_state.routes,
+                    st.session_state.collection_points,
+                    st.session_state.solution['unassigned'],
+                    st.session_state.dist_matrix
+                )
+                df_export = export_routes_to_csv(*export_args)
+                csv = df_export.to_csv(index=False)
+                st.download_button(
+                    label="⬇️ Download Routes",
+                    data=csv,
+                    file_name="optimized_routes.csv",
+                    mime="text/csv"
+                )
+                st.download_button(
+                    label="⬇️ Download GeoJSON",
+                    data=json.dumps(routes_geojson(st.session_state.routes, st.session_state.collection_points)),
+                    file_name="optimized_routes.geojson",
+                    mime="application/geo+json"
+                )
+                parquet = io.BytesIO()
+                try:
+                    write_routes_parquet(parquet, *export_args)
+                except ImportError as e:
+                    st.caption(f"Parquet export unavailable: {e}")
+                else:
+                    st.download_button(
+                        label="⬇️ Download Parquet",
+                        data=parquet.getvalue(),
+                        file_name="optimized_routes.parquet",
+                        mime="application/vnd.apache.parquet"
+                    )
 
 # Main content
 if len(st.session_state.collection_points) < 2:
@@ -675,6 +851,10 @@ if len(st.session_state.collection_points) < 2:
         V1,100,8.5,2.5
         V2,80,9.2,2.0
         ```
+        
+        *Optional `shift_hours` column - vehicles make several depot trips within their shift (default: depot opening hours).*
+        
+        *Several depots: mark them with `depot` = `yes` in the points file (the first row is always one) and give vehicles a home with a `depot` column naming it (blank: shared out by demand).*
         """)
 else:
     tab1, tab2, tab3 = st.tabs(["📊 Data Overview", "🗺️ Route Optimization", "📈 Analytics & Insights"])
@@ -684,7 +864,8 @@ else:
         
         with col1:
             st.markdown("### 📍 Collection Points")
-            df_points = pd.DataFrame(st.session_state.collection_points)
+            points = st.session_state.collection_points
+            df_points = points.to_frame() if isinstance(points, PointTable) else pd.DataFrame(points)
             st.dataframe(df_points, use_container_width=True, height=400)
             
             total_parcels = df_points['parcels'].sum()
@@ -713,25 +894,63 @@ else:
         
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
-            if st.button("🚀 OPTIMIZE ROUTES NOW", key="optimize", help="Calculate optimal routes"):
-                with st.spinner("🔄 Optimizing routes..."):
-                    routes = nearest_neighbor_algorithm(
-                        st.session_state.collection_points,
-                        st.session_state.vehicles
-                    )
-                    st.session_state.routes = routes
-                    st.session_state.optimized = True
+            st.selectbox(
+                "🧠 Construction Algorithm",
+                options=list(ALGORITHM_LABELS),
+                format_func=ALGORITHM_LABELS.get,
+                key="algorithm",
+                help="Nearest Neighbor fills vehicles one at a time; Clarke-Wright merges routes by distance savings"
+            )
+            if st.button("🚀 OPTIMIZE ROUTES NOW", key="optimize", help="Calculate optimal routes",
+                         disabled=st.session_state.job is not None):
+                with st.spinner("🔄 Computing distances..."), performance_stage('optimize'):
+                    points = st.session_state.collection_points
+                    roads = road_network()
+                    matrix_key = content_hash(points, st.session_state.traffic_seed, roads and roads.fingerprint)
+                    dist_matrix = cached_distance_matrix(matrix_key, points, st.session_state.traffic_seed, roads)
+                    settings = {
+                        'algorithm': st.session_state.algorithm,
+                        'stages': ('local_search',) if st.session_state.use_local_search else (),
+                        'time_budget': st.session_state.time_budget,
+                        'window_mode': st.session_state.window_mode,
+                        'service_minutes': st.session_state.service_minutes,
+                        'workers': st.session_state.workers,
+                        'decompose': st.session_state.decompose
+                    }
+                    solution_key = content_hash(matrix_key, st.session_state.vehicles, settings)
+                    solution = solution_cache().get(solution_key)
+                    instrument.count('cache_misses' if solution is None else 'cache_hits')
+                if solution is not None:
+                    show_solution(solution_key, dist_matrix, solution)
+                else:
+                    st.session_state.job_inputs = {
+                        'solution_key': solution_key,
+                        'dist': dist_matrix,
+                        'data_key': content_hash(points, st.session_state.vehicles)
+                    }
+                    # The job gets copies: points and vehicles added meanwhile are edited in place
+                    job_points = points.take(np.arange(len(points))) if isinstance(points, PointTable) else list(points)
+                    st.session_state.job = SolveJob(
+                        optimize_solution, job_points, list(st.session_state.vehicles), dist_matrix,
+                        profile=st.session_state.profile_optimization, **settings
+                    ).start()
+            job_progress()
+            notice = st.session_state.pop('job_notice', None)
+            if notice:
+                kind, text = notice
+                getattr(st, kind)(text)
+                if kind == 'success':
                     st.balloons()
-                    st.success("✅ Optimization complete!")
         
         if st.session_state.optimized:
             st.markdown("---")
             
-            total_distance = sum(r['total_distance'] for r in st.session_state.routes)
-            total_cost = sum(r['total_cost'] for r in st.session_state.routes)
-            total_time = sum(r['total_time'] for r in st.session_state.routes)
-            total_fuel = sum(r['fuel_used'] for r in st.session_state.routes)
-            total_parcels = sum(r['total_parcels'] for r in st.session_state.routes)
+            totals = st.session_state.routes.totals
+            total_distance = totals['distance']
+            total_cost = totals['cost']
+            total_time = totals['time']
+            total_fuel = totals['fuel']
+            total_parcels = totals['parcels']
             
             col1, col2, col3, col4, col5 = st.columns(5)
             col1.metric("🛣️ Distance", f"{total_distance:.2f} km")
@@ -740,286 +959,244 @@ else:
             col4.metric("⛽ Fuel", f"{total_fuel:.2f} L")
             col5.metric("📦 Parcels", f"{total_parcels}")
             
+            solution = st.session_state.solution
+            st.caption(f"🧠 Built with {ALGORITHM_LABELS[solution['algorithm']]} in {solution['construction_seconds']:.2f}s")
+            for stage in solution['stages']:
+                moves = sum(stage['moves'].values())
+                st.caption(
+                    f"🔧 Local search: {stage['distance_before']:.2f} km → {stage['distance_after']:.2f} km, "
+                    f"${stage['cost_before']:.2f} → ${stage['cost_after']:.2f} | {moves} moves in {stage['seconds']:.2f}s"
+                    + (" (time budget reached)" if stage['timed_out'] else "")
+                )
+            
+            if 'decomposition' in solution:
+                decomposition = solution['decomposition']
+                st.caption(
+                    f"🧩 Decomposition: {decomposition['clusters']} clusters (up to {decomposition['largest_cluster']} stops) "
+                    f"on {decomposition['workers']} workers, {decomposition['repaired_borders']} borders repaired "
+                    f"({decomposition['repair_moves']} moves) in {decomposition['seconds']['total']:.2f}s"
+                )
+            
+            if 'multi_depot' in solution:
+                multi_depot = solution['multi_depot']
+                st.caption(
+                    f"🏢 Multi-depot: {len(multi_depot['depots'])} depots solved on {multi_depot['workers']} workers in "
+                    f"{multi_depot['seconds']['total']:.2f}s | " + " | ".join(
+                        f"{depot['name']}: {depot['routes']} routes, {depot['vehicles']} vehicles, {depot['distance']:.1f} km"
+                        for depot in multi_depot['depots']
+                    ) + f" | {multi_depot['reassigned']} stops moved off their nearest depot for capacity"
+                )
+            
+            if 'multistart' in solution:
+                multistart = solution['multistart']
+                st.caption(
+                    f"🎲 Multi-start: best of {multistart['starts']} starts on {multistart['workers']} workers "
+                    f"({multistart['distances'][0]:.2f}-{multistart['distances'][-1]:.2f} km) in {multistart['seconds']:.2f}s"
+                )
+            
+            compliance = solution['time_windows']
+            served = compliance['on_time'] + compliance['late']
+            if solution['window_mode'] != 'off' and served:
+                st.caption(
+                    f"⏰ Time window compliance: {compliance['on_time']}/{served} stops on time "
+                    f"({compliance['on_time'] / served * 100:.1f}%) | "
+                    f"{compliance['late_minutes']:.0f} min late | {compliance['wait_minutes']:.0f} min waiting"
+                )
+            
+            if solution['unassigned']:
+                unassigned_parcels = sum(u['parcels'] for u in solution['unassigned'])
+                st.warning(f"⚠️ {len(solution['unassigned'])} stops ({unassigned_parcels} parcels) could not be assigned to any vehicle")
+                with st.expander("📭 Unassigned Stops"):
+                    st.table(pd.DataFrame([
+                        {'Location': u['name'], 'Parcels': u['parcels'], 'Reason': u['reason']}
+                        for u in solution['unassigned']
+                    ]))
+            
             st.markdown("---")
             st.markdown("### 🗺️ Interactive Route Visualization")
-            route_map = create_route_map(st.session_state.routes, st.session_state.collection_points)
-            folium_static(route_map, width=1200, height=600)
+            with performance_stage('render_map'):
+                map_html = cached_map_html(
+                    st.session_state.solution_key, st.session_state.routes, st.session_state.collection_points
+                )
+                components.html(map_html, width=1200, height=610)
+            st.caption(
+                f"🗺️ Map payload: {len(map_html.encode('utf-8')) / 1024:,.0f} KB"
+                + (" (high-volume mode: one GeoJSON layer for all routes)" if is_high_volume_map(st.session_state.routes) else "")
+            )
             
             st.markdown("---")
             st.markdown("### 📋 Route Details")
             
-            for idx, route in enumerate(st.session_state.routes):
-                with st.expander(f"🚛 {route['vehicle_id']} - {len(route['points'])-2} stops | {route['total_distance']:.2f} km | ${route['total_cost']:.2f}"):
-                    col1, col2, col3, col4 = st.columns(4)
-                    col1.metric("Distance", f"{route['total_distance']:.2f} km")
-                    col2.metric("Parcels", f"{route['total_parcels']}/{route['capacity']}")
-                    col3.metric("Cost", f"${route['total_cost']:.2f}")
-                    col4.metric("Time", f"{route['total_time']:.0f} min")
-                    
-                    capacity_util = (route['total_parcels'] / route['capacity']) * 100
-                    cost_per_parcel = route['total_cost'] / route['total_parcels'] if route['total_parcels'] > 0 else 0
+            with performance_stage('render_tables'):
+                stop_tables = cached_stop_tables(
+                    st.session_state.solution_key, st.session_state.routes,
+                    st.session_state.collection_points, st.session_state.dist_matrix
+                )
+                for route, (route_sequence, stops_table) in zip(st.session_state.routes, stop_tables):
+                    with st.expander(f"🚛 {route_label(route)} - {len(route['stops'])-2} stops | {route['total_distance']:.2f} km | ${route['total_cost']:.2f}"):
+                        col1, col2, col3, col4 = st.columns(4)
+                        col1.metric("Distance", f"{route['total_distance']:.2f} km")
+                        col2.metric("Parcels", f"{route['total_parcels']}/{route['capacity']}")
+                        col3.metric("Cost", f"${route['total_cost']:.2f}")
+                        col4.metric("Time", f"{route['total_time']:.0f} min")
                     
-                    col1, col2, col3 = st.columns(3)
-                    col1.metric("Fuel", f"{route['fuel_used']:.2f} L")
-                    col2.metric("Capacity Util", f"{capacity_util:.1f}%")
-                    col3.metric("Cost/Parcel", f"${cost_per_parcel:.2f}")
+                        capacity_util = (route['total_parcels'] / route['capacity']) * 100
+                        cost_per_parcel = route['total_cost'] / route['total_parcels'] if route['total_parcels'] > 0 else 0
                     
-                    route_sequence = " → ".join([p['name'] for p in route['points']])
-                    st.info(f"**Route:** {route_sequence}")
+                        col1, col2, col3 = st.columns(3)
+                        col1.metric("Fuel", f"{route['fuel_used']:.2f} L")
+                        col2.metric("Capacity Util", f"{capacity_util:.1f}%")
+                        col3.metric("Cost/Parcel", f"${cost_per_parcel:.2f}")
                     
-                    stops_data = []
-                    cumulative_distance = 0
-                    for i, point in enumerate(route['points']):
-                        if i > 0:
-                            dist = calculate_distance(
-                                route['points'][i-1]['lat'], route['points'][i-1]['lon'],
-                                point['lat'], point['lon']
-                            )
-                            cumulative_distance += dist
-                        
-                        stops_data.append({
-                            'Stop': i,
-                            'Location': point['name'],
-                            'Parcels': point['parcels'],
-                            'Time Window': f"{point['time_start']}-{point['time_end']}",
-                            'Distance (km)': f"{dist:.2f}" if i > 0 else "0.00",
-                            'Cumulative (km)': f"{cumulative_distance:.2f}"
-                        })
-                    st.table(pd.DataFrame(stops_data))
+                        st.info(f"**Route:** {route_sequence}")
+                        st.caption(f"🕒 Trip {route['trip']}: departs {format_hhmm(route['start_time'])}, back at depot {format_hhmm(route['end_time'])}")
+                        st.table(stops_table)
     
     with tab3:
         st.markdown("### 📈 Performance Analytics & Insights")
         
         if st.session_state.optimized:
-            vehicles = [r['vehicle_id'] for r in st.session_state.routes]
-            distances = [r['total_distance'] for r in st.session_state.routes]
-            costs = [r['total_cost'] for r in st.session_state.routes]
-            parcels = [r['total_parcels'] for r in st.session_state.routes]
-            fuel = [r['fuel_used'] for r in st.session_state.routes]
+            with performance_stage('render_charts'):
+                fig1, fig2, fig3, fig4 = cached_vehicle_charts(st.session_state.solution_key, st.session_state.routes)
             
-            col1, col2 = st.columns(2)
+                col1, col2 = st.columns(2)
+                col1.plotly_chart(fig1, use_container_width=True)
+                col2.plotly_chart(fig2, use_container_width=True)
             
-            with col1:
-                fig1 = go.Figure(data=[
-                    go.Bar(
-                        x=vehicles, 
-                        y=distances, 
-                        marker=dict(
-                            color=distances,
-                            colorscale='Viridis',
-                            showscale=False
-                        ),
-                        text=[f"{d:.2f} km" for d in distances],
-                        textposition='auto'
-                    )
-                ])
-                fig1.update_layout(
-                    title="Distance by Vehicle",
-                    xaxis_title="Vehicle",
-                    yaxis_title="Distance (km)",
-                    template="plotly_dark",
-                    showlegend=False,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)'
-                )
-                st.plotly_chart(fig1, use_container_width=True)
+                col3, col4 = st.columns(2)
+                col3.plotly_chart(fig3, use_container_width=True)
+                col4.plotly_chart(fig4, use_container_width=True)
             
-            with col2:
-                fig2 = go.Figure(data=[
-                    go.Bar(
-                        x=vehicles, 
-                        y=costs,
-                        marker=dict(
-                            color=costs,
-                            colorscale='Plasma',
-                            showscale=False
-                        ),
-                        text=[f"${c:.2f}" for c in costs],
-                        textposition='auto'
+                st.markdown("---")
+                st.markdown("### ⚡ Efficiency Metrics")
+                
+                df_efficiency = cached_efficiency_table(st.session_state.solution_key, st.session_state.routes)
+                st.dataframe(df_efficiency, use_container_width=True)
+                
+                st.markdown("---")
+                st.markdown("### 💰 Cost Savings Analysis")
+                
+                totals = st.session_state.routes.totals
+                total_distance = totals['distance']
+                total_cost = totals['cost']
+                total_time = totals['time']
+                total_fuel = totals['fuel']
+                
+                solution = st.session_state.solution
+                if solution['stages']:
+                    st.markdown("#### 🔧 Improvement over Greedy Construction")
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric(
+                        "🛣️ Distance",
+                        f"{total_distance:.2f} km",
+                        f"{total_distance - solution['greedy_distance']:.2f} km",
+                        delta_color="inverse"
                     )
-                ])
-                fig2.update_layout(
-                    title="Cost by Vehicle",
-                    xaxis_title="Vehicle",
-                    yaxis_title="Cost ($)",
-                    template="plotly_dark",
-                    showlegend=False,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)'
-                )
-                st.plotly_chart(fig2, use_container_width=True)
-            
-            col3, col4 = st.columns(2)
-            
-            with col3:
-                fig3 = go.Figure(data=[
-                    go.Bar(
-                        x=vehicles, 
-                        y=parcels,
-                        marker=dict(
-                            color=parcels,
-                            colorscale='Cividis',
-                            showscale=False
-                        ),
-                        text=[f"{p}" for p in parcels],
-                        textposition='auto'
+                    col2.metric(
+                        "💰 Cost",
+                        f"${total_cost:.2f}",
+                        f"{total_cost - solution['greedy_cost']:.2f} $",
+                        delta_color="inverse"
                     )
-                ])
-                fig3.update_layout(
-                    title="Parcels Delivered by Vehicle",
-                    xaxis_title="Vehicle",
-                    yaxis_title="Parcels",
-                    template="plotly_dark",
-                    showlegend=False,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)'
-                )
-                st.plotly_chart(fig3, use_container_width=True)
-            
-            with col4:
-                fig4 = go.Figure(data=[
-                    go.Bar(
-                        x=vehicles, 
-                        y=fuel,
-                        marker=dict(
-                            color=fuel,
-                            colorscale='Turbo',
-                            showscale=False
-                        ),
-                        text=[f"{f:.2f} L" for f in fuel],
-                        textposition='auto'
+                    col3.metric("📉 Improvement", f"{solution['improvement_pct']:.1f}%")
+                    st.caption(f"Greedy: {solution['greedy_distance']:.2f} km / ${solution['greedy_cost']:.2f}")
+                    st.markdown("#### 📊 Versus Non-Optimized Routes")
+                
+                random_distance = total_distance * 1.38
+                random_cost = total_cost * 1.38
+                random_time = total_time * 1.42
+                random_fuel = total_fuel * 1.38
+                
+                distance_savings = random_distance - total_distance
+                cost_savings = random_cost - total_cost
+                time_savings = random_time - total_time
+                fuel_savings = random_fuel - total_fuel
+                
+                distance_savings_percent = (distance_savings / random_distance) * 100
+                cost_savings_percent = (cost_savings / random_cost) * 100
+                time_savings_percent = (time_savings / random_time) * 100
+                fuel_savings_percent = (fuel_savings / random_fuel) * 100
+                
+                col1, col2, col3, col4 = st.columns(4)
+                
+                with col1:
+                    st.metric(
+                        "🛣️ Distance Savings",
+                        f"{distance_savings:.2f} km",
+                        f"-{distance_savings_percent:.1f}%"
                     )
-                ])
-                fig4.update_layout(
-                    title="Fuel Consumption by Vehicle",
-                    xaxis_title="Vehicle",
-                    yaxis_title="Fuel (Liters)",
-                    template="plotly_dark",
-                    showlegend=False,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)'
-                )
-                st.plotly_chart(fig4, use_container_width=True)
-            
-            st.markdown("---")
-            st.markdown("### ⚡ Efficiency Metrics")
-            
-            efficiency_data = []
-            for route in st.session_state.routes:
-                capacity_util = (route['total_parcels'] / route['capacity']) * 100
-                cost_per_parcel = route['total_cost'] / route['total_parcels'] if route['total_parcels'] > 0 else 0
-                distance_per_parcel = route['total_distance'] / route['total_parcels'] if route['total_parcels'] > 0 else 0
-                fuel_per_km = route['fuel_used'] / route['total_distance'] if route['total_distance'] > 0 else 0
+                    st.caption(f"Before: {random_distance:.2f} km\nAfter: {total_distance:.2f} km")
                 
-                efficiency_data.append({
-                    'Vehicle': route['vehicle_id'],
-                    'Capacity Utilization (%)': f"{capacity_util:.1f}",
-                    'Cost per Parcel ($)': f"{cost_per_parcel:.2f}",
-                    'Distance per Parcel (km)': f"{distance_per_parcel:.2f}",
-                    'Fuel Efficiency (L/km)': f"{fuel_per_km:.2f}",
-                    'Avg Speed (km/h)': f"{(route['total_distance'] / (route['total_time']/60)):.1f}"
-                })
-            
-            df_efficiency = pd.DataFrame(efficiency_data)
-            st.dataframe(df_efficiency, use_container_width=True)
-            
-            st.markdown("---")
-            st.markdown("### 💰 Cost Savings Analysis")
-            
-            total_distance = sum(r['total_distance'] for r in st.session_state.routes)
-            total_cost = sum(r['total_cost'] for r in st.session_state.routes)
-            total_time = sum(r['total_time'] for r in st.session_state.routes)
-            total_fuel = sum(r['fuel_used'] for r in st.session_state.routes)
-            
-            random_distance = total_distance * 1.38
-            random_cost = total_cost * 1.38
-            random_time = total_time * 1.42
-            random_fuel = total_fuel * 1.38
-            
-            distance_savings = random_distance - total_distance
-            cost_savings = random_cost - total_cost
-            time_savings = random_time - total_time
-            fuel_savings = random_fuel - total_fuel
-            
-            distance_savings_percent = (distance_savings / random_distance) * 100
-            cost_savings_percent = (cost_savings / random_cost) * 100
-            time_savings_percent = (time_savings / random_time) * 100
-            fuel_savings_percent = (fuel_savings / random_fuel) * 100
-            
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.metric(
-                    "🛣️ Distance Savings",
-                    f"{distance_savings:.2f} km",
-                    f"-{distance_savings_percent:.1f}%"
-                )
-                st.caption(f"Before: {random_distance:.2f} km\nAfter: {total_distance:.2f} km")
-            
-            with col2:
-                st.metric(
-                    "💰 Cost Savings",
-                    f"${cost_savings:.2f}",
-                    f"-{cost_savings_percent:.1f}%"
-                )
-                st.caption(f"Before: ${random_cost:.2f}\nAfter: ${total_cost:.2f}")
-            
-            with col3:
-                st.metric(
-                    "⏱️ Time Savings",
-                    f"{time_savings:.0f} min",
-                    f"-{time_savings_percent:.1f}%"
-                )
-                st.caption(f"Before: {random_time:.0f} min\nAfter: {total_time:.0f} min")
-            
-            with col4:
-                st.metric(
-                    "⛽ Fuel Savings",
-                    f"{fuel_savings:.2f} L",
-                    f"-{fuel_savings_percent:.1f}%"
-                )
-                st.caption(f"Before: {random_fuel:.2f} L\nAfter: {total_fuel:.2f} L")
-            
-            st.success(f"🎉 **Daily Savings: ${cost_savings:.2f}** | **Monthly Savings (30 days): ${cost_savings * 30:.2f}**")
-            st.info(f"📊 **Annual Cost Reduction: ${cost_savings * 365:.2f}** | **ROI: {cost_savings_percent:.1f}%**")
-            
-            st.markdown("---")
-            st.markdown("### 🌍 Environmental Impact")
-            
-            co2_per_liter = 2.31
-            co2_saved = fuel_savings * co2_per_liter
-            trees_equivalent = co2_saved / 21
-            
-            col1, col2, col3, col4 = st.columns(4)
-            col1.metric("🌿 CO2 Reduced", f"{co2_saved:.2f} kg")
-            col2.metric("🌳 Trees Equivalent", f"{trees_equivalent:.1f}")
-            col3.metric("♻️ Fuel Saved", f"{fuel_savings:.2f} L")
-            col4.metric("🌎 Carbon Offset", f"{co2_saved * 365:.0f} kg/year")
-            
-            st.success(f"🌱 By optimizing routes, you're reducing carbon emissions equivalent to planting {trees_equivalent:.1f} trees per day! That's {trees_equivalent * 365:.0f} trees per year!")
-            
-            # Donut chart for savings breakdown
-            st.markdown("---")
-            st.markdown("### 📊 Savings Breakdown")
-            
-            fig5 = go.Figure(data=[go.Pie(
-                labels=['Distance Savings', 'Fuel Savings', 'Time Savings'],
-                values=[distance_savings_percent, fuel_savings_percent, time_savings_percent],
-                hole=.5,
-                marker=dict(colors=['#00f2fe', '#4facfe', '#00f260'])
-            )])
-            fig5.update_layout(
-                title="Optimization Impact by Category",
-                template="plotly_dark",
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                showlegend=True
-            )
-            st.plotly_chart(fig5, use_container_width=True)
+                with col2:
+                    st.metric(
+                        "💰 Cost Savings",
+                        f"${cost_savings:.2f}",
+                        f"-{cost_savings_percent:.1f}%"
+                    )
+                    st.caption(f"Before: ${random_cost:.2f}\nAfter: ${total_cost:.2f}")
+                
+                with col3:
+                    st.metric(
+                        "⏱️ Time Savings",
+                        f"{time_savings:.0f} min",
+                        f"-{time_savings_percent:.1f}%"
+                    )
+                    st.caption(f"Before: {random_time:.0f} min\nAfter: {total_time:.0f} min")
+                
+                with col4:
+                    st.metric(
+                        "⛽ Fuel Savings",
+                        f"{fuel_savings:.2f} L",
+                        f"-{fuel_savings_percent:.1f}%"
+                    )
+                    st.caption(f"Before: {random_fuel:.2f} L\nAfter: {total_fuel:.2f} L")
+                
+                st.success(f"🎉 **Daily Savings: ${cost_savings:.2f}** | **Monthly Savings (30 days): ${cost_savings * 30:.2f}**")
+                st.info(f"📊 **Annual Cost Reduction: ${cost_savings * 365:.2f}** | **ROI: {cost_savings_percent:.1f}%**")
+                
+                st.markdown("---")
+                st.markdown("### 🌍 Environmental Impact")
+                
+                co2_per_liter = 2.31
+                co2_saved = fuel_savings * co2_per_liter
+                trees_equivalent = co2_saved / 21
+                
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("🌿 CO2 Reduced", f"{co2_saved:.2f} kg")
+                col2.metric("🌳 Trees Equivalent", f"{trees_equivalent:.1f}")
+                col3.metric("♻️ Fuel Saved", f"{fuel_savings:.2f} L")
+                col4.metric("🌎 Carbon Offset", f"{co2_saved * 365:.0f} kg/year")
+                
+                st.success(f"🌱 By optimizing routes, you're reducing carbon emissions equivalent to planting {trees_equivalent:.1f} trees per day! That's {trees_equivalent * 365:.0f} trees per year!")
+                
+                # Donut chart for savings breakdown
+                st.markdown("---")
+                st.markdown("### 📊 Savings Breakdown")
+                
+                fig5 = cached_savings_chart(distance_savings_percent, fuel_savings_percent, time_savings_percent)
+                st.plotly_chart(fig5, use_container_width=True)
             
         else:
             st.info("👆 Optimize routes first to see detailed analytics!")
 
+# Performance: where the latest load, optimization, rendering and export spent their time
+if st.session_state.performance:
+    with st.expander("⏱️ Performance"):
+        stage_table, counters = performance_tables(st.session_state.performance)
+        st.dataframe(stage_table, use_container_width=True, hide_index=True)
+        if counters:
+            st.caption(" | ".join(f"{name.replace('_', ' ')}: {n:,}" for name, n in counters.items()))
+        profile = st.session_state.performance.get('solve', {}).get('profile')
+        if profile:
+            st.markdown("**Slowest functions of the last profiled optimization** (cumulative time)")
+            st.dataframe(pd.DataFrame(profile), use_container_width=True, hide_index=True)
+        st.download_button(
+            label="⬇️ Download Performance JSON",
+            data=json.dumps(st.session_state.performance, indent=2),
+            file_name="quickdeliver_performance.json",
+            mime="application/json"
+        )
+
 # Footer
 st.markdown("---")
 st.markdown("""
@@ -0,0 +1,83 @@
+"""Benchmark: the route constructors side by side.
+
+Run from the quickdeliver-routing folder:
+
+    python benchmarks/bench_construction.py
+    python benchmarks/bench_construction.py --sizes 1000 10000
+    python benchmarks/bench_construction.py --sizes 3000 --algorithms regret
+
+Reports runtime, stops routed and total distance for each constructor on
+the sample CSVs and on synthetic instances (fleet sized to ~110% of demand).
+The distance matrix is built once per instance and shared by all of them.
+Nearest neighbor and savings take a few seconds at 10,000 stops; regret
+insertion grows faster (about 5s at 3,000 stops, under a minute at 10,000).
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from quickdeliver.distance import build_distance_matrix  # noqa: E402
+from quickdeliver.solver import ALGORITHM_LABELS, CONSTRUCTORS, total_distance  # noqa: E402
+
+
+def sample_instance():
+    """Collection points and vehicles from the bundled sample CSVs"""
+    points = pd.read_csv(os.path.join(ROOT, 'sample_collection_points.csv')).to_dict('records')
+    vehicles = pd.read_csv(os.path.join(ROOT, 'sample_vehicles.csv')).to_dict('records')
+    return points, vehicles
+
+
+def synthetic_instance(n, seed=0):
+    """Random stops around the Harare depot with a fleet sized to the demand"""
+    rng = np.random.default_rng(seed)
+    points = [{'name': 'Central Depot', 'lat': -17.8252, 'lon': 31.0335, 'parcels': 0,
+               'time_start': '06:00', 'time_end': '20:00'}]
+    for i in range(1, n):
+        points.append({
+            'name': f'Stop {i}',
+            'lat': -17.8252 + rng.uniform(-0.15, 0.15),
+            'lon': 31.0335 + rng.uniform(-0.15, 0.15),
+            'parcels': int(rng.integers(5, 33)),
+            'time_start': '08:00',
+            'time_end': '17:00'
+        })
+    demand = sum(p['parcels'] for p in points)
+    vehicles = []
+    while sum(v['capacity'] for v in vehicles) < demand * 1.1:
+        vehicles.append({'id': f'V{len(vehicles) + 1}', 'capacity': int(rng.choice([80, 100, 120])),
+                         'fuel_efficiency': 8.5, 'cost_per_km': 2.5})
+    return points, vehicles
+
+
+def run(name, points, vehicles, algorithms):
+    dist = build_distance_matrix(points)
+    for algorithm in algorithms:
+        start = time.perf_counter()
+        routes = CONSTRUCTORS[algorithm](points, vehicles, dist)
+        elapsed = time.perf_counter() - start
+        routed = sum(len(r['stops']) - 2 for r in routes)
+        print(f"{name:>10} {ALGORITHM_LABELS[algorithm]:>22} {elapsed:>9.3f} "
+              f"{routed:>7}/{len(points) - 1:<7} {len(routes):>7} {total_distance(routes):>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--algorithms', nargs='+', choices=list(CONSTRUCTORS), default=list(CONSTRUCTORS))
+    args = parser.parse_args()
+
+    print(f"{'instance':>10} {'algorithm':>22} {'time (s)':>9} {'routed':>15} {'routes':>7} {'distance km':>12}")
+    run('sample', *sample_instance(), args.algorithms)
+    for n in args.sizes:
+        run(f'{n}', *synthetic_instance(n), args.algorithms)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark: per-pair calculate_distance calls vs the vectorized distance matrix.
+
+Run from the quickdeliver-routing folder:
+
+    python benchmarks/bench_distance_matrix.py
+    python benchmarks/bench_distance_matrix.py --sizes 100 1000 5000
+
+The scalar baseline is timed on a sample of pairs and scaled up to the full
+N x N work, so the 5k case finishes in seconds instead of minutes.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quickdeliver.distance import build_distance_matrix, calculate_distance  # noqa: E402
+
+SCALAR_SAMPLE_PAIRS = 50_000
+
+
+def random_points(n, seed=0):
+    """Random collection points scattered around the Harare depot"""
+    rng = np.random.default_rng(seed)
+    lats = -17.8252 + rng.uniform(-0.15, 0.15, n)
+    lons = 31.0335 + rng.uniform(-0.15, 0.15, n)
+    return [
+        {'name': f'P{i}', 'lat': float(lat), 'lon': float(lon), 'parcels': 10}
+        for i, (lat, lon) in enumerate(zip(lats, lons))
+    ]
+
+
+def time_scalar(points):
+    """Seconds for all N x N scalar calls, extrapolated from a sample"""
+    n = len(points)
+    total_pairs = n * n
+    sample = min(total_pairs, SCALAR_SAMPLE_PAIRS)
+    rng = np.random.default_rng(1)
+    origins = rng.integers(0, n, sample)
+    targets = rng.integers(0, n, sample)
+
+    start = time.perf_counter()
+    for i, j in zip(origins, targets):
+        calculate_distance(points[i]['lat'], points[i]['lon'], points[j]['lat'], points[j]['lon'])
+    elapsed = time.perf_counter() - start
+    return elapsed * total_pairs / sample, sample < total_pairs
+
+
+def time_matrix(points):
+    """Seconds to build the full matrix in one chunked pass"""
+    start = time.perf_counter()
+    matrix = build_distance_matrix(points)
+    elapsed = time.perf_counter() - start
+    return elapsed, matrix.nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    print(f"{'points':>8} {'scalar (s)':>14} {'matrix (s)':>12} {'speedup':>10} {'matrix MB':>10}")
+    for n in args.sizes:
+        points = random_points(n)
+        scalar_seconds, estimated = time_scalar(points)
+        matrix_seconds, nbytes = time_matrix(points)
+        marker = '*' if estimated else ' '
+        print(f"{n:>8} {scalar_seconds:>13.3f}{marker} {matrix_seconds:>12.4f} "
+              f"{scalar_seconds / matrix_seconds:>9.0f}x {nbytes / 1e6:>10.1f}")
+    print("* extrapolated from a sample of", SCALAR_SAMPLE_PAIRS, "pairs")
+
+
+if __name__ == '__main__':
+    main()
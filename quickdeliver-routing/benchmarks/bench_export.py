@@ -0,0 +1,62 @@
+"""Benchmark: route export to CSV, Parquet and GeoJSON at dispatch-file sizes.
+
+Run from the quickdeliver-routing folder:
+
+    python benchmarks/bench_export.py
+    python benchmarks/bench_export.py --sizes 10000 100000
+
+Uses the synthetic points and routes of bench_memory.py (no distance
+matrix is built, so leg distances are left out) and writes each format to
+a temporary folder, reporting the time taken and the file size.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_memory import point_records, route_records  # noqa: E402
+from quickdeliver.data import routes_geojson, write_routes_csv, write_routes_parquet  # noqa: E402
+from quickdeliver.model import PointTable, RouteTable  # noqa: E402
+
+
+def write_geojson(path, routes, points):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(routes_geojson(routes, points), f)
+
+
+def run(n, tmp):
+    points = PointTable.from_records(point_records(n))
+    routes = RouteTable.from_routes(route_records(n, 40))
+    writers = [
+        ('csv', lambda path: write_routes_csv(path, routes, points)),
+        ('parquet', lambda path: write_routes_parquet(path, routes, points)),
+        ('geojson', lambda path: write_geojson(path, routes, points)),
+    ]
+    for fmt, write in writers:
+        path = os.path.join(tmp, f'routes_{n}.{fmt}')
+        start = time.perf_counter()
+        try:
+            write(path)
+        except ImportError as e:
+            print(f"{n:>8} {fmt:>8}  skipped: {e}")
+            continue
+        print(f"{n:>8} {fmt:>8} {time.perf_counter() - start:>9.3f} {os.path.getsize(path) / 1e6:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'stops':>8} {'format':>8} {'time (s)':>9} {'size MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            run(n, tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Benchmark: memory and serialization cost of dict records vs the columnar model.
+
+Run from the quickdeliver-routing folder:
+
+    python benchmarks/bench_memory.py
+    python benchmarks/bench_memory.py --sizes 10000 100000 --route-stops 40
+
+For each size, builds the same synthetic solved plan twice - points as a
+list of dicts and routes as route dicts (what the solver returns), then as
+a PointTable and a RouteTable - and reports the memory allocated to hold
+it (tracemalloc), its pickled size and pickle time (what a process pool or
+cache pays to move it), and the time to compute the plan totals the
+analytics show. No distance matrix is built, so 100k stops runs in seconds.
+"""
+import argparse
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quickdeliver.model import PointTable, RouteTable  # noqa: E402
+from quickdeliver.traffic import format_hhmm  # noqa: E402
+
+TOTAL_FIELDS = ('total_distance', 'total_cost', 'total_time', 'fuel_used', 'total_parcels')
+
+
+def point_records(n, seed=0):
+    """Random collection points around the Harare depot, as point dicts"""
+    rng = np.random.default_rng(seed)
+    lats = -17.8252 + rng.uniform(-0.15, 0.15, n)
+    lons = 31.0335 + rng.uniform(-0.15, 0.15, n)
+    parcels = rng.integers(5, 33, n)
+    starts = rng.integers(8 * 60, 12 * 60, n)
+    return [
+        {'name': f'Stop {i}', 'lat': float(lat), 'lon': float(lon), 'parcels': int(p),
+         'time_start': format_hhmm(s), 'time_end': format_hhmm(s + 240)}
+        for i, (lat, lon, p, s) in enumerate(zip(lats, lons, parcels, starts))
+    ]
+
+
+def route_records(n, route_stops, seed=0):
+    """Route dicts with the fields ``schedule_trips`` fills in, covering stops 1..n-1"""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(np.arange(1, n, dtype=np.int32))
+    routes = []
+    for r, chunk in enumerate(np.array_split(order, max(1, (n - 1) // route_stops))):
+        stops = np.concatenate([[0], chunk, [0]]).astype(np.int32)
+        arrival = 360 + np.cumsum(rng.uniform(2, 10, len(stops)))
+        wait = np.zeros(len(stops))
+        distance = float(rng.uniform(20, 120))
+        routes.append({
+            'vehicle_id': f'V{r % 50 + 1}', 'vehicle_index': r % 50, 'shift_minutes': 600.0,
+            'capacity': 1200, 'fuel_efficiency': 8.5, 'cost_per_km': 2.5,
+            'stops': stops, 'total_parcels': int(len(chunk) * 18), 'total_distance': distance,
+            'total_time': distance * 1.5, 'total_cost': distance * 2.5, 'fuel_used': distance / 8.5,
+            'trip': r // 50 + 1, 'start_time': float(arrival[0]), 'end_time': float(arrival[-1]),
+            'arrival': arrival, 'wait': wait, 'departure': arrival + 5, 'wait_time': 0.0,
+            'late_stops': 0, 'late_minutes': 0.0, 'time_feasible': True,
+        })
+    return routes
+
+
+def measure(build):
+    """(object, bytes allocated while building it)"""
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+
+def pickle_cost(obj):
+    start = time.perf_counter()
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    return len(data), time.perf_counter() - start
+
+
+def dict_totals(routes):
+    return {field: sum(r[field] for r in routes) for field in TOTAL_FIELDS}
+
+
+def run(n, route_stops):
+    points = point_records(n)
+    routes = route_records(n, route_stops)
+
+    # Hold each structure in a fresh copy so tracemalloc sees all of it
+    dict_plan, dict_bytes = measure(lambda: (pickle.loads(pickle.dumps(points)), pickle.loads(pickle.dumps(routes))))
+    table_plan, table_bytes = measure(lambda: (PointTable.from_records(points), RouteTable.from_routes(routes)))
+    dict_pickle, dict_seconds = pickle_cost(dict_plan)
+    table_pickle, table_seconds = pickle_cost(table_plan)
+
+    start = time.perf_counter()
+    dict_totals(dict_plan[1])
+    dict_sum = time.perf_counter() - start
+    start = time.perf_counter()
+    totals = RouteTable.from_routes(routes).totals
+    pack = time.perf_counter() - start
+
+    print(f"{n:>8} {len(routes):>7} {'dicts':>8} {dict_bytes / 1e6:>10.1f} {dict_pickle / 1e6:>11.1f} "
+          f"{dict_seconds * 1000:>11.1f} {dict_sum * 1000:>11.2f}")
+    print(f"{'':>8} {'':>7} {'columns':>8} {table_bytes / 1e6:>10.1f} {table_pickle / 1e6:>11.1f} "
+          f"{table_seconds * 1000:>11.1f} {0.0:>11.2f}  (packing: {pack * 1000:.1f} ms, totals {totals['stops']} stops)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--route-stops', type=int, default=40, help='stops per route (default: %(default)s)')
+    args = parser.parse_args()
+
+    print(f"{'stops':>8} {'routes':>7} {'model':>8} {'memory MB':>10} {'pickle MB':>11} "
+          f"{'pickle ms':>11} {'totals ms':>11}")
+    for n in args.sizes:
+        run(n, args.route_stops)
+
+
+if __name__ == '__main__':
+    main()
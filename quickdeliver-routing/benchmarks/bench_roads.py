@@ -0,0 +1,107 @@
+"""Benchmark: road-network distance matrices on a synthetic city graph.
+
+Run from the quickdeliver-routing folder:
+
+    python benchmarks/bench_roads.py
+    python benchmarks/bench_roads.py --stops 500 2000 5000 --spacing 0.15
+
+Builds a street grid over the metro area (intersections every
+``--spacing`` km, a tenth of the blocks missing and a tenth of the streets
+one-way) and times ``RoadNetwork.matrix`` for seeded uniform stops: with
+SciPy's batched searches when it is installed, and with the pure-Python
+searches, timed on a sample of sources and scaled up. A second call with
+a disk cache shows what re-optimizing the same stops costs.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from instances import DEPOT, RADIUS_KM, generate_instance  # noqa: E402
+from quickdeliver import roads  # noqa: E402
+from quickdeliver.distance import EARTH_RADIUS_KM  # noqa: E402
+from quickdeliver.roads import RoadNetwork  # noqa: E402
+
+PYTHON_SAMPLE_SOURCES = 20
+
+
+def city_grid(spacing, seed=0):
+    """Street grid over the metro area with missing blocks and one-way streets"""
+    rng = np.random.default_rng(seed)
+    side = int(2 * (RADIUS_KM + 1) / spacing) + 1
+    x, y = np.meshgrid(np.arange(side) * spacing, np.arange(side) * spacing)
+    x = x.ravel() - (side - 1) * spacing / 2 + rng.normal(0, spacing / 10, side * side)
+    y = y.ravel() - (side - 1) * spacing / 2 + rng.normal(0, spacing / 10, side * side)
+    lat = DEPOT['lat'] + np.degrees(y / EARTH_RADIUS_KM)
+    lon = DEPOT['lon'] + np.degrees(x / (EARTH_RADIUS_KM * np.cos(np.radians(DEPOT['lat']))))
+    ids = np.arange(side * side).reshape(side, side)
+    source = np.concatenate([ids[:, :-1].ravel(), ids[:-1, :].ravel()])
+    target = np.concatenate([ids[:, 1:].ravel(), ids[1:, :].ravel()])
+    keep = rng.random(len(source)) >= 0.1
+    source, target = source[keep], target[keep]
+    length = np.hypot(x[source] - x[target], y[source] - y[target])
+    two_way = rng.random(len(source)) >= 0.1
+    return RoadNetwork.from_edges(lat, lon, np.concatenate([source, target[two_way]]),
+                                  np.concatenate([target, source[two_way]]),
+                                  np.concatenate([length, length[two_way]]))
+
+
+@contextmanager
+def pure_python(network):
+    """Run the network's searches without SciPy"""
+    scipy_dijkstra, roads.dijkstra = roads.dijkstra, None
+    network._adjacency = {}
+    try:
+        yield
+    finally:
+        roads.dijkstra = scipy_dijkstra
+        network._adjacency = {}
+
+
+def time_python(network, nodes):
+    """Seconds for the pure-Python searches over ``nodes``, extrapolated from a sample of sources"""
+    sample = nodes[np.linspace(0, len(nodes) - 1, min(len(nodes), PYTHON_SAMPLE_SOURCES)).astype(int)]
+    with pure_python(network):
+        start = time.perf_counter()
+        network.node_distances(sample, nodes)
+        elapsed = time.perf_counter() - start
+    return elapsed * len(nodes) / len(sample)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stops', type=int, nargs='+', default=[500, 2000, 5000])
+    parser.add_argument('--spacing', type=float, default=0.2, help='km between intersections')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    network = city_grid(args.spacing)
+    print(f"city grid: {len(network):,} nodes, {network.edge_count:,} edges "
+          f"(built in {time.perf_counter() - start:.1f}s); SciPy {'on' if roads.dijkstra else 'not installed'}")
+    print(f"{'stops':>7} {'nodes':>7} {'scipy (s)':>10} {'python (s)':>11} {'cached (s)':>11}")
+    for n in args.stops:
+        points, _ = generate_instance(n, 'uniform', 0)
+        nodes = np.unique(network.snap(points.lat, points.lon)[0])
+        python_seconds = time_python(network, nodes[nodes >= 0])
+        with tempfile.TemporaryDirectory() as cache_dir:
+            network.cache_dir = cache_dir
+            start = time.perf_counter()
+            network.matrix(points.lat, points.lon)
+            matrix_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            network.matrix(points.lat, points.lon)
+            cached_seconds = time.perf_counter() - start
+        scipy_seconds = f"{matrix_seconds:>10.2f}" if roads.dijkstra else f"{'-':>10}"
+        print(f"{n:>7} {len(nodes):>7} {scipy_seconds} {python_seconds:>10.1f}* {cached_seconds:>11.2f}")
+    print(f"* extrapolated from {PYTHON_SAMPLE_SOURCES} sources")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""Benchmark suite: every stage of a solve on seeded synthetic instances, results as JSON.
+
+Run from the quickdeliver-routing folder:
+
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --sizes 100 1000 10000 100000 --output results.json
+    python benchmarks/bench_suite.py --compare baseline.json results.json
+
+For each size and shape (see instances.py) the instance is generated and
+solved stage by stage - distance matrix, construction, local search,
+scheduling, then packing into a RouteTable, CSV export and the route map.
+Above ``--matrix-limit`` stops the full matrix would not fit, so the solve
+is one cluster-first decomposition stage instead. Every stage records its
+runtime, its peak memory (tracemalloc, which slows pure-Python code; pass
+``--no-memory`` for clean timings) and the total route cost after it. The
+JSON output carries the commit it was run on; ``--compare`` lines two
+result files up and exits with status 1 when a stage got slower, heavier
+or more expensive than the thresholds allow.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from instances import SHAPES, generate_instance  # noqa: E402
+from quickdeliver.data import export_routes_to_csv  # noqa: E402
+from quickdeliver.decompose import decompose_solve  # noqa: E402
+from quickdeliver.distance import build_distance_matrix  # noqa: E402
+from quickdeliver.local_search import DEFAULT_TIME_BUDGET, improve_routes  # noqa: E402
+from quickdeliver.model import RouteTable  # noqa: E402
+from quickdeliver.routes import point_parcels  # noqa: E402
+from quickdeliver.solver import CONSTRUCTORS, total_cost, total_distance  # noqa: E402
+from quickdeliver.time_windows import TimeWindows  # noqa: E402
+from quickdeliver.trips import find_unassigned, schedule_trips  # noqa: E402
+
+# Largest instance solved with a full distance matrix (5k stops = 100 MB float32)
+MATRIX_LIMIT = 5_000
+STAGES = ('generate', 'distance_matrix', 'construction', 'local_search', 'schedule', 'decomposition',
+          'pack', 'export', 'map')
+
+# --compare: a stage regressed when it got this many times slower or heavier...
+REGRESSION_RATIO = 1.25
+# ...ignoring stages faster or smaller than these, where noise dominates
+MIN_SECONDS = 0.05
+MIN_PEAK_MB = 1.0
+# Route cost increase (fraction) counted as a regression
+COST_TOLERANCE = 0.01
+
+
+class Recorder:
+    """Runs stages and keeps one result record per stage"""
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.stages = []
+
+    def run(self, name, work):
+        """Run ``work()`` as stage ``name``; returns what it returns"""
+        if self.memory:
+            tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = work()
+        seconds = time.perf_counter() - start
+        peak = None
+        if self.memory:
+            peak = (tracemalloc.get_traced_memory()[1] - base) / 1e6
+            tracemalloc.stop()
+        self.stages.append({'stage': name, 'seconds': seconds, 'peak_mb': peak,
+                            'cost': None, 'distance': None})
+        return result
+
+    def routes(self, routes):
+        """Note the plan cost and distance after the last stage"""
+        self.stages[-1].update(cost=float(total_cost(routes)), distance=float(total_distance(routes)),
+                               routes=len(routes))
+
+    def print_last(self, label):
+        stage = self.stages[-1]
+        peak = '-' if stage['peak_mb'] is None else f"{stage['peak_mb']:.1f}"
+        cost = '' if stage['cost'] is None else f"{stage['cost']:.2f}"
+        print(f"{label:>18} {stage['stage']:>16} {stage['seconds']:>9.3f} {peak:>9} {cost:>14}", flush=True)
+
+
+def run_instance(n, shape, args):
+    """All stages for one instance; returns its result record"""
+    rec = Recorder(not args.no_memory)
+    label = f"{shape} {n}"
+    skip = set(args.skip)
+
+    def stage(name, work, routes_of=None):
+        result = rec.run(name, work)
+        if routes_of is not None:
+            rec.routes(routes_of(result))
+        rec.print_last(label)
+        return result
+
+    def schedule():
+        scheduled = schedule_trips(routes, points, dist, windows)
+        return scheduled, find_unassigned(points, vehicles, scheduled, dist, point_parcels(points), windows)
+
+    points, vehicles = stage('generate', lambda: generate_instance(n, shape, args.seed))
+    windows = TimeWindows(points)
+    dist = None
+    if n <= args.matrix_limit:
+        dist = stage('distance_matrix', lambda: build_distance_matrix(points))
+        routes = stage('construction', lambda: CONSTRUCTORS[args.algorithm](points, vehicles, dist, windows),
+                       lambda routes: routes)
+        if 'local_search' not in skip:
+            routes, _ = stage('local_search', lambda: improve_routes(routes, points, dist, args.time_budget,
+                                                                      windows=windows, vehicles=vehicles),
+                              lambda result: result[0])
+        routes, unassigned = stage('schedule', schedule, lambda result: result[0])
+    else:
+        stages = () if 'local_search' in skip else ('local_search',)
+        solution = stage('decomposition', lambda: decompose_solve(
+            points, vehicles, workers=args.workers, algorithm=args.algorithm, stages=stages,
+            time_budget=args.time_budget), lambda solution: solution['routes'])
+        routes, unassigned = solution['routes'], solution['unassigned']
+
+    table = stage('pack', lambda: RouteTable.from_routes(routes))
+    if 'export' not in skip:
+        stage('export', lambda: export_routes_to_csv(table, points, unassigned, dist))
+    if 'map' not in skip:
+        try:
+            import folium
+            from quickdeliver.maps import create_route_map
+        except ImportError as e:
+            print(f"{label:>18} {'map':>16}  skipped: {e}")
+        else:
+            stage('map', lambda: folium.Figure().add_child(create_route_map(table, points)).render())
+
+    return {
+        'shape': shape,
+        'stops': n,
+        'seed': args.seed,
+        'vehicles': len(vehicles),
+        'parcels': int(point_parcels(points).sum()),
+        'unassigned': len(unassigned),
+        'stages': rec.stages,
+    }
+
+
+def environment():
+    """Commit, versions and machine of this run, so result files can be told apart"""
+    def git(*cmd):
+        try:
+            return subprocess.run(['git', *cmd], cwd=ROOT, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def compare(old_path, new_path):
+    """Print stage-by-stage ratios of two result files; returns the number of regressions"""
+    def load(path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return data, {(r['shape'], r['stops'], r['seed'], s['stage']): s
+                      for r in data['results'] for s in r['stages']}
+
+    old, old_stages = load(old_path)
+    new, new_stages = load(new_path)
+    print(f"{(old['environment']['commit'] or '?')[:10]} -> {(new['environment']['commit'] or '?')[:10]}")
+    if old['settings']['no_memory'] != new['settings']['no_memory']:
+        print("note: only one run traced memory, so its timings include the tracemalloc overhead")
+    print(f"{'instance':>18} {'stage':>16} {'time x':>8} {'memory x':>9} {'cost x':>8}")
+    regressions = 0
+    for key in sorted(set(old_stages) & set(new_stages), key=lambda k: (k[1], k[0], STAGES.index(k[3]))):
+        a, b = old_stages[key], new_stages[key]
+        flags = []
+        time_ratio = b['seconds'] / a['seconds'] if a['seconds'] else float('inf')
+        if time_ratio > REGRESSION_RATIO and b['seconds'] > MIN_SECONDS:
+            flags.append('slower')
+        memory_ratio = None
+        if a['peak_mb'] is not None and b['peak_mb'] is not None:
+            memory_ratio = b['peak_mb'] / a['peak_mb'] if a['peak_mb'] else float('inf')
+            if memory_ratio > REGRESSION_RATIO and b['peak_mb'] > MIN_PEAK_MB:
+                flags.append('heavier')
+        cost_ratio = None
+        if a['cost'] and b['cost'] is not None:
+            cost_ratio = b['cost'] / a['cost']
+            if cost_ratio > 1 + COST_TOLERANCE:
+                flags.append('costlier')
+        regressions += bool(flags)
+        print(f"{key[0] + ' ' + str(key[1]):>18} {key[3]:>16} {time_ratio:>8.2f} "
+              f"{'-' if memory_ratio is None else f'{memory_ratio:.2f}':>9} "
+              f"{'-' if cost_ratio is None else f'{cost_ratio:.3f}':>8}  {' '.join(flags)}")
+    print(f"{regressions} regression(s)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1_000, 10_000])
+    parser.add_argument('--shapes', nargs='+', choices=SHAPES, default=list(SHAPES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--algorithm', choices=sorted(CONSTRUCTORS), default='nearest_neighbor')
+    parser.add_argument('--time-budget', type=float, default=DEFAULT_TIME_BUDGET,
+                        help='local search seconds per instance (default: %(default)s)')
+    parser.add_argument('--matrix-limit', type=int, default=MATRIX_LIMIT,
+                        help='decompose instances above this many stops (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=1, help='processes for decomposed instances')
+    parser.add_argument('--skip', nargs='+', choices=('local_search', 'export', 'map'), default=[])
+    parser.add_argument('--no-memory', action='store_true', help='skip tracemalloc for undisturbed timings')
+    parser.add_argument('--output', default='bench_results.json', help='results file (default: %(default)s)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two results files')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+
+    print(f"{'instance':>18} {'stage':>16} {'time (s)':>9} {'peak MB':>9} {'route cost':>14}")
+    results = [run_instance(n, shape, args) for n in args.sizes for shape in args.shapes]
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'environment': environment(), 'settings': vars(args), 'results': results}, f, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Seeded synthetic instances at production scale - uniform, clustered and corridor-shaped.
+
+    from instances import generate_instance
+    points, vehicles = generate_instance(10_000, 'clustered', seed=1)
+
+The same (size, shape, seed) always gives the same instance, so benchmark
+results can be compared between commits. Points come back as a
+``PointTable`` (row 0 is the Harare depot) and vehicles as dicts, the
+forms the solver takes.
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quickdeliver.distance import EARTH_RADIUS_KM  # noqa: E402
+from quickdeliver.model import PointTable  # noqa: E402
+
+DEPOT = {'name': 'Central Depot', 'lat': -17.8252, 'lon': 31.0335, 'window': (6 * 60, 20 * 60)}
+SHAPES = ('uniform', 'clustered', 'corridor')
+# Stops lie within this distance of the depot (a metro area)
+RADIUS_KM = 20.0
+
+# Time window types: (share of stops, earliest start hour, latest start hour, length in hours)
+WINDOW_TYPES = (
+    (0.55, 8, 8, 9),     # business hours
+    (0.15, 8, 8, 4),     # morning only
+    (0.15, 13, 13, 4),   # afternoon only
+    (0.15, 8, 15, 2),    # two-hour slot
+)
+# Vehicle types: (share of the fleet, capacity, fuel km/l, cost per km)
+VEHICLE_TYPES = (
+    (0.5, 120, 9.0, 1.8),    # van
+    (0.3, 80, 11.0, 1.4),    # small van
+    (0.2, 250, 6.0, 3.2),    # truck
+)
+# Fleet capacity as a multiple of the day's parcels
+FLEET_MARGIN = 1.1
+
+
+def _km_to_degrees(dx, dy):
+    """Offsets east/north in km to (lat, lon) around the depot"""
+    lat = DEPOT['lat'] + np.degrees(dy / EARTH_RADIUS_KM)
+    lon = DEPOT['lon'] + np.degrees(dx / (EARTH_RADIUS_KM * np.cos(np.radians(DEPOT['lat']))))
+    return lat, lon
+
+
+def _uniform(rng, n):
+    """Uniform over a disc around the depot"""
+    r = RADIUS_KM * np.sqrt(rng.random(n))
+    angle = rng.uniform(0, 2 * np.pi, n)
+    return r * np.cos(angle), r * np.sin(angle)
+
+
+def _clustered(rng, n):
+    """Neighbourhoods: stops gathered around ~sqrt(n)/2 centres, plus 10% scattered"""
+    centres = max(3, int(np.sqrt(n) / 2))
+    cx, cy = _uniform(rng, centres)
+    spread = rng.uniform(0.5, 2.0, centres)
+    which = rng.integers(0, centres, n)
+    x = cx[which] + rng.normal(0, spread[which])
+    y = cy[which] + rng.normal(0, spread[which])
+    scattered = rng.random(n) < 0.1
+    x[scattered], y[scattered] = _uniform(rng, int(scattered.sum()))
+    return x, y
+
+
+def _corridor(rng, n):
+    """Stops strung along 3-5 arterial roads leaving the depot, 0.4 km either side"""
+    roads = int(rng.integers(3, 6))
+    bearing = rng.uniform(0, 2 * np.pi, roads)[rng.integers(0, roads, n)]
+    along = rng.uniform(0.5, RADIUS_KM, n)
+    across = rng.normal(0, 0.4, n)
+    return (along * np.cos(bearing) - across * np.sin(bearing),
+            along * np.sin(bearing) + across * np.cos(bearing))
+
+
+LAYOUTS = {'uniform': _uniform, 'clustered': _clustered, 'corridor': _corridor}
+
+
+def _windows(rng, n):
+    """Window start/end minutes drawn from ``WINDOW_TYPES``, starts on the half hour"""
+    shares = np.array([t[0] for t in WINDOW_TYPES])
+    kind = rng.choice(len(WINDOW_TYPES), n, p=shares / shares.sum())
+    first = np.array([t[1] for t in WINDOW_TYPES])[kind]
+    last = np.array([t[2] for t in WINDOW_TYPES])[kind]
+    start = first * 60 + 30 * rng.integers(0, (last - first) * 2 + 1)
+    return start, start + np.array([t[3] for t in WINDOW_TYPES])[kind] * 60
+
+
+def generate_fleet(parcels, rng):
+    """Mixed vehicles (see ``VEHICLE_TYPES``) until their capacity covers the parcels with margin"""
+    shares = np.array([t[0] for t in VEHICLE_TYPES])
+    vehicles = []
+    capacity = 0
+    while capacity < parcels * FLEET_MARGIN or not vehicles:
+        _, cap, fuel, cost = VEHICLE_TYPES[rng.choice(len(VEHICLE_TYPES), p=shares / shares.sum())]
+        vehicles.append({'id': f'V{len(vehicles) + 1}', 'capacity': cap, 'fuel_efficiency': fuel,
+                         'cost_per_km': cost})
+        capacity += cap
+    return vehicles
+
+
+def generate_instance(n, shape='uniform', seed=0):
+    """``n`` points (depot included) laid out by ``shape``, with a fleet sized to them.
+
+    Parcels per stop are log-normal (median 10, long tail, 1-60) and
+    windows mix business hours, half days and two-hour slots. Returns
+    ``(points, vehicles)``.
+    """
+    rng = np.random.default_rng([seed, n, SHAPES.index(shape)])
+    stops = max(n - 1, 0)
+    x, y = LAYOUTS[shape](rng, stops)
+    lat, lon = _km_to_degrees(x, y)
+    parcels = np.clip(np.rint(rng.lognormal(np.log(10), 0.6, stops)), 1, 60).astype(np.int32)
+    start, end = _windows(rng, stops)
+
+    points = PointTable(
+        np.concatenate([[DEPOT['name']], [f'Stop {i}' for i in range(1, stops + 1)]]).astype(object),
+        np.concatenate([[DEPOT['lat']], lat]), np.concatenate([[DEPOT['lon']], lon]),
+        np.concatenate([[0], parcels]), np.concatenate([[DEPOT['window'][0]], start]),
+        np.concatenate([[DEPOT['window'][1]], end])
+    )
+    return points, generate_fleet(int(parcels.sum()), rng)
@@ -0,0 +1,116 @@
+"""Load test for the HTTP routing service: concurrent /solve requests, latency percentiles and throughput.
+
+Run from the quickdeliver-routing folder:
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --requests 200 --concurrency 16 --distinct 4 --stops 200
+    python benchmarks/load_test.py --url http://127.0.0.1:8765
+
+Without ``--url`` a service is started in this process on a free
+localhost port (``--workers``, ``--max-queue``). Requests are spread over
+``--distinct`` seeded instances (see instances.py), so with fewer distinct
+instances than requests most of them are answered by joining a solve in
+flight or from the result cache - the report splits requests by that
+source. Rejected requests (503) are counted, not retried.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from instances import generate_instance  # noqa: E402
+from quickdeliver.service import RoutingService, make_server  # noqa: E402
+
+PERCENTILES = (50, 90, 99)
+
+
+def payload(stops, seed, time_budget):
+    """/solve body for one seeded uniform instance"""
+    points, vehicles = generate_instance(stops, 'uniform', seed)
+    frame = points.to_frame()
+    frame['lat'] = frame['lat'].round(6)
+    frame['lon'] = frame['lon'].round(6)
+    body = {
+        'points': json.loads(frame.to_json(orient='records')),
+        'vehicles': vehicles,
+        'options': {'time_budget': time_budget},
+    }
+    return json.dumps(body).encode('utf-8')
+
+
+def post(url, body, timeout):
+    """``(status, seconds, source)`` of one /solve request"""
+    request = urllib.request.Request(f"{url}/solve", data=body, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            answer = json.load(response)
+            return response.status, time.perf_counter() - start, answer['request']['source']
+    except urllib.error.HTTPError as e:
+        return e.code, time.perf_counter() - start, None
+    except (urllib.error.URLError, TimeoutError):
+        return 0, time.perf_counter() - start, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='service to test (default: start one in this process)')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8, help='requests in flight at once')
+    parser.add_argument('--distinct', type=int, default=8, help='different instances among the requests')
+    parser.add_argument('--stops', type=int, default=100, help='points per instance, depot included')
+    parser.add_argument('--time-budget', type=float, default=0.5, help='local search seconds per solve')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, help='solver processes of the in-process service')
+    parser.add_argument('--max-queue', type=int, help='distinct solves in flight before the service answers 503')
+    parser.add_argument('--timeout', type=float, default=300.0, help='client timeout per request, seconds')
+    args = parser.parse_args()
+
+    server = service = None
+    url = args.url
+    if url is None:
+        service = RoutingService(args.workers, args.max_queue)
+        server = make_server(service, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+    url = url.rstrip('/')
+
+    bodies = [payload(args.stops, args.seed + i, args.time_budget) for i in range(args.distinct)]
+    print(f"{args.requests} requests, {args.concurrency} concurrent, {args.distinct} distinct "
+          f"{args.stops}-point instances -> {url}", flush=True)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(lambda i: post(url, bodies[i % len(bodies)], args.timeout), range(args.requests)))
+    wall = time.perf_counter() - start
+
+    statuses = Counter(status for status, _, _ in results)
+    sources = Counter(source for status, _, source in results if status == 200)
+    latencies = np.array([seconds for status, seconds, _ in results if status == 200])
+    print("status: " + ', '.join(f"{status or 'no answer'} x{n}" for status, n in sorted(statuses.items())))
+    if len(latencies):
+        print("latency (s): " + ', '.join(f"p{q} {np.percentile(latencies, q):.3f}" for q in PERCENTILES)
+              + f", max {latencies.max():.3f}")
+        print(f"throughput: {len(latencies) / wall:.1f} solved requests/s over {wall:.2f}s")
+        print(f"answered by: {', '.join(f'{source} x{n}' for source, n in sorted(sources.items()))}")
+    with urllib.request.urlopen(f"{url}/health", timeout=args.timeout) as response:
+        print(f"service: {json.load(response)}")
+
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""QuickDeliver routing engine - optimization code shared by the Streamlit app and scripts"""
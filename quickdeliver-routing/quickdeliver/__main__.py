@@ -0,0 +1,3 @@
+from quickdeliver.cli import main
+
+raise SystemExit(main())
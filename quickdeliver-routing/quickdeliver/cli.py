@@ -0,0 +1,153 @@
+"""Headless batch routing: CSVs in, routes CSV/JSON out - no Streamlit needed.
+
+    python -m quickdeliver --points sample_collection_points.csv --vehicles sample_vehicles.csv
+    python -m quickdeliver --points depots/*.csv --vehicles fleet.csv --output-dir out --json
+    python -m quickdeliver --points day.csv --vehicles fleet.csv --parquet --geojson
+    python -m quickdeliver --points day.csv --vehicles fleet.csv --roads harare.npz
+    python -m quickdeliver --points metro.csv --vehicles fleet.csv --decompose --workers 8
+    python -m quickdeliver --points hubs.csv --vehicles fleet.csv --workers 3    # rows with depot=yes
+    python -m quickdeliver --points day.csv --vehicles fleet.csv --perf --profile
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from quickdeliver import instrument
+from quickdeliver.data import (
+    load_csv_data, routes_geojson, solution_to_dict, write_routes_csv, write_routes_parquet
+)
+from quickdeliver.decompose import CLUSTERINGS, DEFAULT_CLUSTER_SIZE, decompose_solve, multi_depot_solve
+from quickdeliver.distance import build_distance_matrix
+from quickdeliver.local_search import DEFAULT_TIME_BUDGET
+from quickdeliver.matrix_store import DEFAULT_STORE_DIR, MatrixStore
+from quickdeliver.model import depot_rows
+from quickdeliver.multistart import multistart_solve
+from quickdeliver.roads import RoadNetwork
+from quickdeliver.solver import CONSTRUCTORS, solve
+from quickdeliver.time_windows import DEFAULT_WINDOW_MODE, SERVICE_MINUTES, WINDOW_MODES
+from quickdeliver.traffic import DEFAULT_SEED, TrafficModel
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m quickdeliver',
+        description='Optimize collection routes from points/vehicles CSVs without the web app'
+    )
+    parser.add_argument('--points', nargs='+', required=True,
+                        help="collection points CSV(s); the first row of each is the depot, "
+                             "rows with depot=yes are further depots")
+    parser.add_argument('--vehicles', required=True, help='vehicles CSV, shared by every points file')
+    parser.add_argument('--day', help="only the rows of this day from a points file with a 'day' column")
+    parser.add_argument('--output-dir', default='.', help='where to write <points name>_routes.csv/.json/...')
+    parser.add_argument('--json', action='store_true', help='also write the solution as JSON')
+    parser.add_argument('--parquet', action='store_true', help='also write the stop rows as Parquet (needs pyarrow)')
+    parser.add_argument('--geojson', action='store_true', help='also write one GeoJSON LineString per route')
+    parser.add_argument('--algorithm', choices=sorted(CONSTRUCTORS), default='nearest_neighbor')
+    parser.add_argument('--no-local-search', action='store_true', help='skip the improvement stage')
+    parser.add_argument('--time-budget', type=float, default=DEFAULT_TIME_BUDGET,
+                        help='improvement time budget per file, seconds (default: %(default)s)')
+    parser.add_argument('--time-windows', choices=WINDOW_MODES, default=DEFAULT_WINDOW_MODE)
+    parser.add_argument('--service-minutes', type=float, default=SERVICE_MINUTES)
+    parser.add_argument('--traffic-seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--roads', help='road graph (.npz from python -m quickdeliver.roads) or OSM XML extract '
+                                        'for road distances; straight-line estimates without it')
+    parser.add_argument('--matrix-cache', nargs='?', const=DEFAULT_STORE_DIR, metavar='DIR',
+                        help='keep distance matrices on disk between runs and compute only changed points '
+                             '(default folder: %(const)s)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='multi-start (or, with --decompose, cluster; with several depots, depot) '
+                             'worker processes (default: 1)')
+    parser.add_argument('--decompose', type=int, nargs='?', const=DEFAULT_CLUSTER_SIZE, metavar='STOPS',
+                        help='for very large files: split the stops into clusters of at most STOPS '
+                             '(default: %(const)s), solve them separately and repair the borders; '
+                             'no full distance matrix is built')
+    parser.add_argument('--cluster-method', choices=sorted(CLUSTERINGS), default='kmeans')
+    parser.add_argument('--perf', action='store_true',
+                        help='write stage times and work counters to <points name>_routes.perf.json')
+    parser.add_argument('--profile', action='store_true',
+                        help='also run under cProfile: top functions in the .perf.json, full stats in .prof')
+    return parser
+
+
+def output_stem(points_path, args):
+    """Output path without extension for a points file"""
+    return os.path.join(args.output_dir, os.path.splitext(os.path.basename(points_path))[0] + '_routes')
+
+
+def run_file(points_path, vehicles_path, args, roads=None):
+    """Optimize one points file and write its outputs; returns the solution"""
+    with instrument.stage('load'):
+        points, vehicles, error = load_csv_data(points_path, vehicles_path, day=args.day)
+    if error:
+        raise ValueError(f"{points_path}: {error}")
+
+    if args.decompose:
+        # Each cluster builds its own matrix; legs in the outputs are left blank
+        dist = None
+    elif args.matrix_cache:
+        dist, _ = MatrixStore(args.matrix_cache).matrix(points, TrafficModel(args.traffic_seed), roads=roads)
+    else:
+        dist = build_distance_matrix(points, TrafficModel(args.traffic_seed), roads=roads)
+    options = {
+        'algorithm': args.algorithm,
+        'stages': () if args.no_local_search else ('local_search',),
+        'time_budget': args.time_budget,
+        'window_mode': args.time_windows,
+        'service_minutes': args.service_minutes,
+    }
+    if len(depot_rows(points)) > 1:
+        solution = multi_depot_solve(points, vehicles, dist, workers=args.workers,
+                                     traffic=TrafficModel(args.traffic_seed), roads=roads, **options)
+    elif args.decompose:
+        solution = decompose_solve(points, vehicles, workers=args.workers, cluster_size=args.decompose,
+                                   method=args.cluster_method, traffic=TrafficModel(args.traffic_seed),
+                                   roads=roads, **options)
+    elif args.workers > 1:
+        solution = multistart_solve(points, vehicles, dist, workers=args.workers, **options)
+    else:
+        solution = solve(points, vehicles, dist, **options)
+
+    stem = output_stem(points_path, args)
+    with instrument.stage('export'):
+        write_routes_csv(stem + '.csv', solution['routes'], points, solution['unassigned'], dist)
+        if args.parquet:
+            write_routes_parquet(stem + '.parquet', solution['routes'], points, solution['unassigned'], dist)
+        if args.geojson:
+            with open(stem + '.geojson', 'w', encoding='utf-8') as f:
+                json.dump(routes_geojson(solution['routes'], points), f)
+        if args.json:
+            with open(stem + '.json', 'w', encoding='utf-8') as f:
+                json.dump(solution_to_dict(solution, points), f, indent=2)
+    return solution
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+    roads = None
+    if args.roads:
+        try:
+            roads = RoadNetwork.load(args.roads)
+        except (OSError, ValueError) as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 1
+    failed = 0
+    for points_path in args.points:
+        start = time.perf_counter()
+        try:
+            with instrument.recording(profile=args.profile) as run:
+                solution = run_file(points_path, args.vehicles, args, roads)
+        except (OSError, ValueError, ImportError) as e:
+            print(f"error: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        if args.perf or args.profile:
+            stem = output_stem(points_path, args)
+            instrument.write_report(stem + '.perf.json', run.report())
+            if run.profiler is not None:
+                run.profiler.dump_stats(stem + '.prof')
+        print(f"{points_path}: {len(solution['routes'])} routes, {solution['final_distance']:.2f} km, "
+              f"{len(solution['unassigned'])} unassigned ({time.perf_counter() - start:.2f}s)")
+    return 1 if failed else 0
@@ -0,0 +1,316 @@
+"""Loading collection points and vehicles, sample data and route export - no UI dependencies"""
+import hashlib
+import json
+import random
+
+import numpy as np
+import pandas as pd
+
+from quickdeliver.ingest import check_vehicle_depots, read_points, read_vehicles
+from quickdeliver.model import PointTable, point_column
+from quickdeliver.routes import route_label, route_points
+from quickdeliver.time_windows import parse_windows
+from quickdeliver.traffic import format_hhmm, format_hhmm_array
+
+# Decimal places kept in exported coordinates (1e-5 degrees is about 1 m)
+COORDINATE_DECIMALS = 5
+
+
+def generate_sample_data():
+    """Generate realistic sample data for the metropolitan area"""
+    depot = {'name': 'Central Depot', 'lat': -17.8252, 'lon': 31.0335, 'parcels': 0, 'time_start': '06:00', 'time_end': '20:00'}
+
+    locations = [
+        'Harare CBD Store', 'Avondale Shopping Center', 'Borrowdale Outlet',
+        'Eastgate Mall', 'Westgate Store', 'Sam Levy Village',
+        'Newlands Depot', 'Mbare Collection Point', 'Chitungwiza Branch',
+        'Budiriro Outlet', 'Mount Pleasant Store', 'Glen Norah Collection',
+        'Hatfield Branch', 'Belvedere Outlet', 'Waterfalls Store'
+    ]
+
+    collection_points = [depot]
+    for i, location in enumerate(locations):
+        lat = depot['lat'] + random.uniform(-0.15, 0.15)
+        lon = depot['lon'] + random.uniform(-0.15, 0.15)
+        parcels = random.randint(15, 32)
+        hour_start = random.randint(7, 9)
+        hour_end = random.randint(16, 18)
+        time_start = f"{hour_start:02d}:{random.choice(['00', '30'])}"
+        time_end = f"{hour_end:02d}:{random.choice(['00', '30'])}"
+
+        collection_points.append({
+            'name': location,
+            'lat': lat,
+            'lon': lon,
+            'parcels': parcels,
+            'time_start': time_start,
+            'time_end': time_end
+        })
+
+    vehicles = [
+        {'id': 'V1', 'capacity': 100, 'fuel_efficiency': 8.5, 'cost_per_km': 2.5},
+        {'id': 'V2', 'capacity': 80, 'fuel_efficiency': 9.2, 'cost_per_km': 2.0},
+        {'id': 'V3', 'capacity': 120, 'fuel_efficiency': 7.8, 'cost_per_km': 3.0},
+    ]
+
+    return collection_points, vehicles
+
+
+def load_csv_data(points_file, vehicles_file, day=None):
+    """Load data from CSV files.
+
+    Points come back as a columnar ``PointTable`` (see ``ingest.read_points``;
+    ``day`` picks one day of a multi-day file) and vehicles as dicts. Schema
+    problems are returned as the error message, naming the offending lines.
+    """
+    try:
+        collection_points = read_points(points_file, day=day)
+        vehicles = read_vehicles(vehicles_file)
+        check_vehicle_depots(collection_points, vehicles)
+        return collection_points, vehicles, None
+    except Exception as e:
+        return None, None, str(e)
+
+
+# Routes per block when writing exports incrementally
+EXPORT_CHUNK_ROUTES = 500
+
+EXPORT_COLUMNS = ('Vehicle_ID', 'Depot', 'Trip', 'Stop_Number', 'Location', 'Latitude', 'Longitude', 'Parcels',
+                  'Time_Window', 'Arrival', 'Departure', 'Leg_km', 'Unassigned_Reason')
+
+
+def _point_arrays(collection_points):
+    """Columns the export reads, indexed by point: names, coordinates, parcels, window text"""
+    start, end = parse_windows(collection_points)
+    return {
+        'name': point_column(collection_points, 'name'),
+        'lat': point_column(collection_points, 'lat', np.float64),
+        'lon': point_column(collection_points, 'lon', np.float64),
+        'parcels': point_column(collection_points, 'parcels'),
+        'window': format_hhmm_array(start) + '-' + format_hhmm_array(end),
+    }
+
+
+def _route_rows(routes, columns, dist):
+    """Export rows for ``routes`` as a DataFrame, built column by column from the stop arrays"""
+    stops = [route['stops'] for route in routes]
+    lengths = np.array([len(s) for s in stops], dtype=np.int64)
+    if not len(lengths):
+        return pd.DataFrame(columns=EXPORT_COLUMNS)
+    index = np.concatenate(stops)
+    first = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+    legs = np.zeros(len(index))
+    if dist is not None:
+        legs[1:] = dist[index[:-1], index[1:]]
+        legs[first] = 0.0
+    return pd.DataFrame({
+        'Vehicle_ID': np.repeat(np.array([route['vehicle_id'] for route in routes], dtype=object), lengths),
+        'Depot': np.repeat(columns['name'][index[first]], lengths),
+        'Trip': np.repeat([route['trip'] for route in routes], lengths),
+        'Stop_Number': np.arange(len(index)) - np.repeat(first, lengths),
+        'Location': columns['name'][index],
+        'Latitude': columns['lat'][index],
+        'Longitude': columns['lon'][index],
+        'Parcels': columns['parcels'][index],
+        'Time_Window': columns['window'][index],
+        'Arrival': format_hhmm_array(np.concatenate([route['arrival'] for route in routes])),
+        'Departure': format_hhmm_array(np.concatenate([route['departure'] for route in routes])),
+        'Leg_km': np.round(legs, 3) if dist is not None else np.nan,
+        'Unassigned_Reason': '',
+    })
+
+
+def _unassigned_rows(unassigned, columns):
+    """Export rows for stops no route serves"""
+    index = np.array([stop['index'] for stop in unassigned], dtype=np.int64)
+    missing = pd.array([pd.NA] * len(index), dtype='Int64')
+    return pd.DataFrame({
+        'Vehicle_ID': 'UNASSIGNED',
+        # The depot a multi-depot plan assigned the stop to
+        'Depot': [columns['name'][stop['depot']] if 'depot' in stop else '' for stop in unassigned],
+        'Trip': missing,
+        'Stop_Number': missing,
+        'Location': columns['name'][index],
+        'Latitude': columns['lat'][index],
+        'Longitude': columns['lon'][index],
+        'Parcels': columns['parcels'][index],
+        'Time_Window': columns['window'][index],
+        'Arrival': '',
+        'Departure': '',
+        'Leg_km': np.nan,
+        'Unassigned_Reason': [stop['reason'] for stop in unassigned],
+    }, index=pd.RangeIndex(len(index)))
+
+
+def export_blocks(routes, collection_points, unassigned=(), dist=None, chunk_routes=EXPORT_CHUNK_ROUTES):
+    """Export rows as a sequence of DataFrames, ``chunk_routes`` routes at a time, unassigned stops last.
+
+    Each stop row has its arrival and departure time and, given the
+    distance matrix, the length of the leg into it (``Leg_km``).
+    """
+    columns = _point_arrays(collection_points)
+    for lo in range(0, len(routes), chunk_routes):
+        yield _route_rows([routes[r] for r in range(lo, min(lo + chunk_routes, len(routes)))], columns, dist)
+    if len(unassigned):
+        yield _unassigned_rows(unassigned, columns)
+
+
+def export_routes_to_csv(routes, collection_points, unassigned=(), dist=None):
+    """Export optimized routes as one DataFrame, with unassigned stops listed at the end"""
+    blocks = list(export_blocks(routes, collection_points, unassigned, dist))
+    if not blocks:
+        return pd.DataFrame(columns=EXPORT_COLUMNS)
+    return pd.concat(blocks, ignore_index=True)
+
+
+def write_routes_csv(path, routes, collection_points, unassigned=(), dist=None):
+    """Stream the export to a CSV file block by block instead of building one big DataFrame"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        header = True
+        for block in export_blocks(routes, collection_points, unassigned, dist):
+            block.to_csv(f, index=False, header=header)
+            header = False
+        if header:
+            pd.DataFrame(columns=EXPORT_COLUMNS).to_csv(f, index=False)
+
+
+def write_routes_parquet(path, routes, collection_points, unassigned=(), dist=None):
+    """Stream the export to a Parquet file (``path`` or a binary file object); needs pyarrow"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow (pip install pyarrow)") from None
+
+    schema = pa.schema([
+        ('Vehicle_ID', pa.string()), ('Depot', pa.string()), ('Trip', pa.int32()), ('Stop_Number', pa.int32()),
+        ('Location', pa.string()), ('Latitude', pa.float64()), ('Longitude', pa.float64()),
+        ('Parcels', pa.int32()), ('Time_Window', pa.string()), ('Arrival', pa.string()),
+        ('Departure', pa.string()), ('Leg_km', pa.float64()), ('Unassigned_Reason', pa.string()),
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for block in export_blocks(routes, collection_points, unassigned, dist):
+            writer.write_table(pa.Table.from_pandas(block, schema=schema, preserve_index=False))
+
+
+def routes_geojson(routes, collection_points):
+    """GeoJSON FeatureCollection with one LineString per route (depot to depot) and its totals"""
+    lon = np.round(point_column(collection_points, 'lon', np.float64), COORDINATE_DECIMALS)
+    lat = np.round(point_column(collection_points, 'lat', np.float64), COORDINATE_DECIMALS)
+    features = []
+    for route in routes:
+        stops = route['stops']
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'LineString', 'coordinates': np.column_stack([lon[stops], lat[stops]]).tolist()},
+            'properties': {
+                'route': route_label(route),
+                'vehicle_id': route['vehicle_id'],
+                'depot': str(collection_points[stops[0]]['name']),
+                'trip': route['trip'],
+                'stops': len(stops) - 2,
+                'parcels': route['total_parcels'],
+                'distance_km': round(route['total_distance'], 3),
+                'start_time': format_hhmm(route['start_time']),
+                'end_time': format_hhmm(route['end_time'])
+            }
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def content_hash(*parts):
+    """Stable hex digest of points, vehicles and settings, for caching results.
+
+    Each part is serialized as JSON with sorted keys; values JSON can't
+    represent (NumPy scalars, NaN) fall back to their string form. A
+    ``PointTable`` is hashed from its column arrays' bytes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, PointTable):
+            for array in part.arrays():
+                digest.update(array.tobytes())
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _lon_lat(point):
+    """GeoJSON position, rounded to about a metre to keep payloads small"""
+    return [round(float(point['lon']), COORDINATE_DECIMALS), round(float(point['lat']), COORDINATE_DECIMALS)]
+
+
+def route_feature_collection(route, collection_points):
+    """GeoJSON FeatureCollection for one route: its path as a LineString plus a Point per stop.
+
+    Every feature carries the same property keys (name, stop, parcels,
+    time_window, arrival, vehicle) so popups and tooltips can be built from
+    them in the browser.
+    """
+    label = route_label(route)
+    points = route_points(route, collection_points)
+    features = [{
+        'type': 'Feature',
+        'geometry': {'type': 'LineString', 'coordinates': [_lon_lat(p) for p in points]},
+        'properties': {
+            'name': label,
+            'stop': '',
+            'parcels': route['total_parcels'],
+            'time_window': f"{format_hhmm(route['start_time'])}-{format_hhmm(route['end_time'])}",
+            'arrival': '',
+            'vehicle': label
+        }
+    }]
+    for order, (point, arrival) in enumerate(zip(points[1:-1], route['arrival'][1:-1]), 1):
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': _lon_lat(point)},
+            'properties': {
+                'name': point['name'],
+                'stop': order,
+                'parcels': point['parcels'],
+                'time_window': f"{point['time_start']}-{point['time_end']}",
+                'arrival': format_hhmm(arrival),
+                'vehicle': label
+            }
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def solution_to_dict(solution, collection_points):
+    """JSON-ready summary of a solution: routes with stop names and times, unassigned stops"""
+    routes = []
+    for route in solution['routes']:
+        points = route_points(route, collection_points)
+        routes.append({
+            'route': route_label(route),
+            'vehicle_id': route['vehicle_id'],
+            'depot': points[0]['name'],
+            'trip': route['trip'],
+            'start_time': format_hhmm(route['start_time']),
+            'end_time': format_hhmm(route['end_time']),
+            'parcels': route['total_parcels'],
+            'capacity': route['capacity'],
+            'distance_km': round(route['total_distance'], 3),
+            'cost': round(route['total_cost'], 2),
+            'fuel_l': round(route['fuel_used'], 3),
+            'stops': [
+                {'name': point['name'], 'parcels': point['parcels'], 'arrival': format_hhmm(arrival)}
+                for point, arrival in zip(points, route['arrival'])
+            ]
+        })
+    return {
+        'algorithm': solution['algorithm'],
+        'total_distance_km': round(solution['final_distance'], 3),
+        'total_cost': round(sum(r['total_cost'] for r in solution['routes']), 2),
+        'greedy_distance_km': round(solution['greedy_distance'], 3),
+        'time_windows': solution['time_windows'],
+        'routes': routes,
+        'unassigned': [
+            {'name': u['name'], 'parcels': u['parcels'], 'reason': u['reason'],
+             **({'depot': collection_points[u['depot']]['name']} if 'depot' in u else {})}
+            for u in solution['unassigned']
+        ]
+    }
@@ -0,0 +1,628 @@
+"""Cluster-first, route-second decomposition for very large instances.
+
+The stops are split into geographic clusters of at most ``cluster_size``
+stops, every cluster gets its own share of the fleet and is solved on its
+own (in parallel processes), and the stops along the borders between
+neighbouring clusters are then repaired by a local search over the
+vehicles serving both sides. Each cluster is a small problem of bounded
+size, so the run time grows about linearly with the number of stops, and
+no distance matrix over all points is ever needed.
+
+Instances with several depots (``depot_rows``) are split the same way,
+one sub-problem per depot: ``multi_depot_solve`` assigns every stop to a
+depot (``assign_depots``) and solves the depots in parallel.
+"""
+import heapq
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from quickdeliver import instrument
+from quickdeliver.distance import (
+    CHUNK_ELEMENTS, EARTH_RADIUS_KM, build_distance_matrix, departure_bucket, point_coordinates
+)
+from quickdeliver.incremental import insert_stop
+from quickdeliver.local_search import DEFAULT_TIME_BUDGET, improve_routes
+from quickdeliver.model import PointTable, depot_rows, point_column
+from quickdeliver.multistart import default_workers
+from quickdeliver.routes import point_parcels
+from quickdeliver.solver import time_window_summary, total_cost, total_distance, solve
+from quickdeliver.time_windows import DEFAULT_WINDOW_MODE, SERVICE_MINUTES, TimeWindows
+from quickdeliver.trips import schedule_trips
+
+# Most stops per cluster; a cluster this size solves in a fraction of a second
+DEFAULT_CLUSTER_SIZE = 400
+# Lloyd iterations refining each two-way split
+SPLIT_ITERATIONS = 8
+# A split giving either side less of the parcels than this falls back to the weighted median
+MIN_SPLIT_SHARE = 0.3
+# A stop is on a border when another cluster's centre is at most this much farther than its own
+BORDER_MARGIN = 0.25
+# Part of the time budget kept for the border repair
+REPAIR_SHARE = 0.2
+# Parcels a depot may take beyond its share of the fleet capacity before stops move to another depot
+DEPOT_SLACK = 0.1
+
+# Per-process state set up once by the pool initializer
+_worker = {}
+
+
+def _project(lats, lons):
+    """Equirectangular projection to kilometres, as the grid index uses"""
+    cos_lat = np.cos(np.radians(lats.mean())) if len(lats) else 1.0
+    return EARTH_RADIUS_KM * np.radians(lons) * cos_lat, EARTH_RADIUS_KM * np.radians(lats)
+
+
+def _split(x, y, w):
+    """Two-way split of points into a boolean side mask: 2-means started from the weighted median.
+
+    The first cut is at the parcel-weighted median along the points'
+    principal axis, then Lloyd iterations move it to the nearest-centre
+    boundary. If that leaves one side with too small a share of the
+    parcels, the balanced median cut is kept instead.
+    """
+    dx, dy = x - np.average(x, weights=w), y - np.average(y, weights=w)
+    cov = np.cov(np.vstack([dx, dy]), aweights=w) if len(x) > 1 else np.eye(2)
+    axis = np.linalg.eigh(cov)[1][:, -1]
+    t = dx * axis[0] + dy * axis[1]
+    order = np.argsort(t, kind='stable')
+    cut = np.searchsorted(np.cumsum(w[order]), w.sum() / 2)
+    median = np.zeros(len(x), dtype=bool)
+    median[order[cut + 1:]] = True
+    if median.all() or not median.any():
+        median[order[len(order) // 2:]] = True
+
+    side = median
+    for _ in range(SPLIT_ITERATIONS):
+        if side.all() or not side.any():
+            break
+        c0 = np.average(x[~side], weights=w[~side]), np.average(y[~side], weights=w[~side])
+        c1 = np.average(x[side], weights=w[side]), np.average(y[side], weights=w[side])
+        moved = (x - c1[0]) ** 2 + (y - c1[1]) ** 2 < (x - c0[0]) ** 2 + (y - c0[1]) ** 2
+        if np.array_equal(moved, side):
+            break
+        side = moved
+    share = w[side].sum() / w.sum()
+    return side if MIN_SPLIT_SHARE <= share <= 1 - MIN_SPLIT_SHARE else median
+
+
+def kmeans_clusters(x, y, weights, cluster_size, max_clusters):
+    """Bisecting k-means: split the largest cluster in two until every one has at most ``cluster_size`` points.
+
+    Splits are weighted by ``weights`` (parcels), so the two halves carry
+    similar loads; at most ``max_clusters`` clusters are made. Returns a
+    list of index arrays into ``x``/``y``. Each point takes part in about
+    log2(clusters) splits, so this is O(N log K).
+    """
+    clusters = [np.arange(len(x))]
+    heap = [(-len(x), 0)]
+    while heap and -heap[0][0] > cluster_size and len(clusters) < max_clusters:
+        _, c = heapq.heappop(heap)
+        idx = clusters[c]
+        side = _split(x[idx], y[idx], weights[idx])
+        clusters[c], right = idx[~side], idx[side]
+        clusters.append(right)
+        heapq.heappush(heap, (-len(clusters[c]), c))
+        heapq.heappush(heap, (-len(right), len(clusters) - 1))
+    return clusters
+
+
+def sweep_clusters(x, y, weights, cluster_size, max_clusters):
+    """Sweep clustering: stops sorted by bearing from the depot (the origin), cut into sectors of equal parcels"""
+    k = min(max(1, -(-len(x) // cluster_size)), max_clusters)
+    order = np.argsort(np.arctan2(y, x), kind='stable')
+    cum = np.cumsum(weights[order])
+    cuts = np.searchsorted(cum, cum[-1] * np.arange(1, k) / k)
+    return [part for part in np.split(order, cuts) if len(part)]
+
+
+# Clustering methods by name: (x, y, weights, cluster_size, max_clusters) -> list of index arrays;
+# coordinates are projected km with the depot at the origin
+CLUSTERINGS = {
+    'kmeans': kmeans_clusters,
+    'sweep': sweep_clusters,
+}
+
+
+def allot_vehicles(cluster_demand, capacities, given=None):
+    """Give every cluster whole vehicles, in proportion to its demand.
+
+    Vehicles go largest first to the cluster furthest below its share of
+    the fleet capacity; every cluster gets one vehicle before any gets a
+    second (needs ``len(capacities) >= len(cluster_demand)``). ``given``
+    is capacity the clusters already have (vehicles fixed to them), counted
+    in their share. Returns each vehicle's cluster, -1 for all of them
+    when there are no clusters.
+    """
+    demand = np.asarray(cluster_demand, dtype=np.float64)
+    if not len(demand):
+        return np.full(len(capacities), -1, dtype=np.int64)
+    given = np.zeros(len(demand)) if given is None else np.asarray(given, dtype=np.float64).copy()
+    target = demand / max(demand.sum(), 1) * (capacities.sum() + given.sum())
+    served = given > 0
+    cluster_of = np.zeros(len(capacities), dtype=np.int64)
+    for v in np.argsort(-capacities, kind='stable'):
+        if served.all():
+            c = int(np.argmax(target - given))
+        else:
+            c = int(np.flatnonzero(~served)[np.argmax(demand[~served])])
+        cluster_of[v] = c
+        given[c] += capacities[v]
+        served[c] = True
+    return cluster_of
+
+
+def _subset(points, idx):
+    """The points at ``idx`` (depot first), as the same kind of collection"""
+    if isinstance(points, PointTable):
+        return points.take(idx)
+    return [points[i] for i in idx]
+
+
+def _init_worker(traffic, bucket, roads, options):
+    """Keep the distance settings and solve options for later tasks"""
+    _worker.update(traffic=traffic, bucket=bucket, roads=roads, options=options)
+
+
+def _solve_cluster(points, vehicles, dist, time_budget, on_progress=None):
+    """Solve one cluster; its distance matrix is built here unless given"""
+    if dist is None:
+        dist = build_distance_matrix(points, _worker['traffic'], _worker['bucket'], roads=_worker['roads'])
+    return solve(points, vehicles, dist, time_budget=time_budget, on_progress=on_progress, **_worker['options'])
+
+
+class _Parts:
+    """The instance, and sub-problems of it over chosen points and vehicles"""
+
+    def __init__(self, points, vehicles, dist, traffic, roads, options):
+        self.points = points
+        self.vehicles = vehicles
+        self.dist = dist
+        self.traffic = traffic
+        self.bucket = departure_bucket(points)
+        self.roads = roads
+        self.options = options
+
+    def problem(self, stops, vehicle_rows, depot=0):
+        """``(idx, points, vehicles, dist)`` for ``depot`` plus ``stops``; ``dist`` is None unless sliceable"""
+        idx = np.concatenate([[depot], np.sort(stops)]).astype(np.int64)
+        dist = None if self.dist is None else np.asarray(self.dist[np.ix_(idx, idx)])
+        return idx, _subset(self.points, idx), [self.vehicles[v] for v in vehicle_rows], dist
+
+    def matrix(self, points, dist):
+        return dist if dist is not None else build_distance_matrix(points, self.traffic, self.bucket,
+                                                                   roads=self.roads)
+
+
+def _solve_parts(parts, tasks, workers, time_budget, on_progress, noun):
+    """Solve ``(vehicle_rows, idx, points, vehicles, dist)`` sub-problems, on ``workers`` processes if more than one.
+
+    Returns their solutions in the full instance's indices, in task order.
+    ``noun`` names a sub-problem in progress phases ('cluster', 'depot').
+    """
+    solutions = []
+    if workers == 1 or len(tasks) < 2:
+        _init_worker(parts.traffic, parts.bucket, parts.roads, parts.options)
+        for c, (vehicle_rows, idx, sub_points, sub_vehicles, sub_dist) in enumerate(tasks):
+            part_progress = None
+            if on_progress is not None:
+                def part_progress(phase, routes=None, label=f"{noun} {c + 1}/{len(tasks)}"):
+                    return on_progress(f"{label}: {phase}")
+            solution = _solve_cluster(sub_points, sub_vehicles, sub_dist, time_budget, part_progress)
+            solutions.append(_to_global(solution, idx, vehicle_rows))
+        return solutions
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(parts.traffic, parts.bucket, parts.roads, parts.options)) as pool, \
+            instrument.stage(f'solve_{noun}s'):
+        futures = [(pool.submit(_solve_cluster, sub_points, sub_vehicles, sub_dist, time_budget), idx, vehicle_rows)
+                   for vehicle_rows, idx, sub_points, sub_vehicles, sub_dist in tasks]
+        try:
+            for future, idx, vehicle_rows in futures:
+                solutions.append(_to_global(future.result(), idx, vehicle_rows))
+                if on_progress is not None:
+                    on_progress(f"{len(solutions)}/{len(tasks)} {noun}s")
+        finally:
+            for future, _, _ in futures:
+                future.cancel()
+    return solutions
+
+
+def _to_global(solution, idx, vehicle_rows):
+    """Routes and unassigned stops of a sub-problem solution, in the full instance's indices"""
+    for route in solution['routes']:
+        route['stops'] = idx[route['stops']].astype(np.int32)
+        route['vehicle_index'] = int(vehicle_rows[route['vehicle_index']])
+    for stop in solution['unassigned']:
+        stop['index'] = int(idx[stop['index']])
+    return solution
+
+
+def _border_pairs(x, y, labels, centres):
+    """Border stops grouped by the pair of clusters they lie between: ``{(a, b): stops}``"""
+    stops = np.flatnonzero(labels >= 0)
+    other = np.empty(len(stops), dtype=np.int64)
+    border = np.zeros(len(stops), dtype=bool)
+    step = max(1, CHUNK_ELEMENTS // max(len(centres), 1))
+    for start in range(0, len(stops), step):
+        rows = stops[start:start + step]
+        d = np.hypot(x[rows, None] - centres[None, :, 0], y[rows, None] - centres[None, :, 1])
+        own = d[np.arange(len(rows)), labels[rows]].copy()
+        d[np.arange(len(rows)), labels[rows]] = np.inf
+        nearest = np.argmin(d, axis=1)
+        other[start:start + step] = nearest
+        border[start:start + step] = d[np.arange(len(rows)), nearest] <= own * (1 + BORDER_MARGIN)
+    pairs = {}
+    for stop, a, b in zip(stops[border], labels[stops[border]], other[border]):
+        pairs.setdefault((min(a, b), max(a, b)), []).append(int(stop))
+    return pairs
+
+
+def _repair(parts, routes, unassigned, pairs, deadline, window_mode, service_minutes):
+    """Repair each border between two clusters; returns the routes, unassigned stops and counts.
+
+    A border's sub-problem is every trip of the vehicles serving its
+    border stops, from both clusters, with a distance matrix over just
+    their stops. Border stops left unassigned are inserted where they fit
+    (``insert_stop``), then local search lets stops move across.
+    """
+    owner = np.full(len(parts.points), -1, dtype=np.int64)
+    for route in routes:
+        owner[route['stops'][1:-1]] = route['vehicle_index']
+    pending = {stop['index'] for stop in unassigned}
+    moves = repaired = 0
+    ordered = sorted(pairs.values(), key=len, reverse=True)
+    for p, stops in enumerate(ordered):
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        rows = sorted(set(owner[stops][owner[stops] >= 0].tolist()))
+        extra = [stop for stop in stops if stop in pending]
+        if not rows or (len(rows) < 2 and not extra):
+            continue
+        mine = [route for route in routes if route['vehicle_index'] in rows]
+        rest = [route for route in routes if route['vehicle_index'] not in rows]
+        idx, points, vehicles, dist = parts.problem(
+            np.concatenate([r['stops'][1:-1] for r in mine] + [np.array(extra, dtype=np.int64)]), rows)
+        dist = parts.matrix(points, dist)
+        local = [{**route, 'stops': np.searchsorted(idx, route['stops']).astype(np.int32),
+                  'vehicle_index': rows.index(route['vehicle_index'])} for route in mine]
+        if extra:
+            solution = {'routes': local, 'unassigned': [], 'window_mode': window_mode,
+                        'service_minutes': service_minutes}
+            for stop in extra:
+                solution = insert_stop(solution, points, vehicles, dist, int(np.searchsorted(idx, stop)),
+                                       repair_budget=0)
+                if solution['incremental']['inserted']:
+                    pending.discard(stop)
+            local = solution['routes']
+        windows = TimeWindows(points, window_mode, service_minutes)
+        improved, stats = improve_routes(local, points, dist, remaining / (len(ordered) - p), windows=windows)
+        improved = schedule_trips(improved, points, dist, windows)
+        for route in improved:
+            route['stops'] = idx[route['stops']].astype(np.int32)
+            route['vehicle_index'] = rows[route['vehicle_index']]
+            owner[route['stops'][1:-1]] = route['vehicle_index']
+        routes = rest + improved
+        moves += sum(stats['moves'].values())
+        repaired += 1
+    inserted = len(unassigned) - len(pending)
+    return routes, [stop for stop in unassigned if stop['index'] in pending], moves, repaired, inserted
+
+
+def _merge_stages(solutions):
+    """One stats entry per improvement stage, summed over the cluster solutions"""
+    merged = {}
+    for solution in solutions:
+        for stats in solution['stages']:
+            total = merged.setdefault(stats['name'], {
+                'name': stats['name'], 'distance_before': 0.0, 'distance_after': 0.0, 'cost_before': 0.0,
+                'cost_after': 0.0, 'moves': {}, 'passes': 0, 'seconds': 0.0, 'timed_out': False,
+            })
+            for key in ('distance_before', 'distance_after', 'cost_before', 'cost_after', 'seconds'):
+                total[key] += stats[key]
+            for op, count in stats['moves'].items():
+                total['moves'][op] = total['moves'].get(op, 0) + count
+            total['passes'] = max(total['passes'], stats['passes'])
+            total['timed_out'] |= stats['timed_out']
+    for total in merged.values():
+        before = total['distance_before']
+        total['improvement_pct'] = (before - total['distance_after']) / before * 100 if before else 0.0
+    return list(merged.values())
+
+
+def _merge_solutions(solutions, routes, unassigned, options):
+    """One solution dict like ``solve``'s from the sub-problem solutions and the final routes"""
+    routes.sort(key=lambda route: (route['vehicle_index'], route['trip']))
+    greedy_distance = sum(solution['greedy_distance'] for solution in solutions)
+    final_distance = total_distance(routes)
+    return {
+        'routes': routes,
+        'unassigned': sorted(unassigned, key=lambda stop: stop['index']),
+        'algorithm': options.get('algorithm', 'nearest_neighbor'),
+        'construction_seconds': sum(solution['construction_seconds'] for solution in solutions),
+        'greedy_distance': greedy_distance,
+        'greedy_cost': sum(solution['greedy_cost'] for solution in solutions),
+        'final_distance': final_distance,
+        'final_cost': total_cost(routes),
+        'improvement_pct': (greedy_distance - final_distance) / greedy_distance * 100 if greedy_distance else 0.0,
+        'stages': _merge_stages(solutions),
+        'window_mode': options['window_mode'],
+        'service_minutes': options['service_minutes'],
+        'time_windows': time_window_summary(routes),
+    }
+
+
+def decompose_solve(points, vehicles, dist=None, workers=None, cluster_size=DEFAULT_CLUSTER_SIZE,
+                    method='kmeans', time_budget=DEFAULT_TIME_BUDGET, traffic=None, roads=None,
+                    window_mode=DEFAULT_WINDOW_MODE, service_minutes=SERVICE_MINUTES, on_progress=None, **options):
+    """Solve a large instance cluster by cluster and repair the borders between them.
+
+    Stops are split by ``method`` (see ``CLUSTERINGS``) into clusters of at
+    most ``cluster_size`` stops - never more clusters than vehicles - and
+    the fleet is divided between them in proportion to their parcels and
+    distance from the depot (``allot_vehicles``). Clusters are solved with ``solve`` (``options``
+    passed on) on a ``ProcessPoolExecutor`` of ``workers`` processes; each
+    builds the distance matrix of its own stops (with ``traffic`` and
+    ``roads``) unless ``dist`` is given to slice from. Stops a cluster
+    can't serve are retried with the vehicles no cluster used, then border
+    stops are repaired by local search. ``time_budget`` is shared by the
+    clusters' local search and the repair (``REPAIR_SHARE``).
+    ``on_progress`` is as for ``solve``, told of each cluster (routes so
+    far aren't passed: a cluster's routes don't cover the instance); with
+    one worker, once it returns True the clusters still to come skip their
+    local search.
+    Returns a solution dict like ``solve`` with a ``decomposition`` stats entry.
+    """
+    begin = time.perf_counter()
+    workers = max(1, workers or default_workers())
+    options = {**options, 'window_mode': window_mode, 'service_minutes': service_minutes}
+    parts = _Parts(points, vehicles, dist, traffic, roads, options)
+    parcels = point_parcels(points).astype(np.float64)
+    lats, lons = point_coordinates(points)
+    x, y = _project(lats, lons)
+    x, y = x - x[0], y - y[0]
+    stops = np.arange(1, len(points))
+
+    clusters = []
+    if len(stops):
+        # Without vehicles the clusters only serve to report every stop as unassigned
+        with instrument.stage('cluster'):
+            clusters = [stops[c] for c in CLUSTERINGS[method](x[1:], y[1:], parcels[1:] + 1,
+                                                              cluster_size, len(vehicles) or len(stops))]
+    # A cluster's demand: its parcels, each weighted by how far it is carried from the depot
+    reach = np.hypot(x, y)
+    demand = [(parcels[c] * (reach[c] + reach[stops].mean())).sum() for c in clusters]
+    cluster_of = allot_vehicles(demand, np.array([v['capacity'] for v in vehicles], dtype=np.float64))
+    cluster_seconds = time.perf_counter() - begin
+
+    tasks = []
+    for c, cluster in enumerate(clusters):
+        vehicle_rows = np.flatnonzero(cluster_of == c)
+        tasks.append((vehicle_rows,) + parts.problem(cluster, vehicle_rows))
+    solve_budget = time_budget * (1 - REPAIR_SHARE) * min(workers, max(len(tasks), 1)) / max(len(tasks), 1)
+
+    solutions = _solve_parts(parts, tasks, workers, solve_budget, on_progress, 'cluster')
+    solve_seconds = time.perf_counter() - begin - cluster_seconds
+
+    routes = [route for solution in solutions for route in solution['routes']]
+    unassigned = [stop for solution in solutions for stop in solution['unassigned']]
+
+    # Stops a cluster couldn't serve get one more chance with the vehicles no cluster used
+    idle = sorted(set(range(len(vehicles))) - {route['vehicle_index'] for route in routes})
+    rescued = 0
+    if unassigned and idle:
+        idx, sub_points, sub_vehicles, sub_dist = parts.problem(
+            np.array([stop['index'] for stop in unassigned]), idle)
+        sub_dist = parts.matrix(sub_points, sub_dist)
+        rescue = _to_global(solve(sub_points, sub_vehicles, sub_dist, time_budget=0, stages=(), **{
+            key: value for key, value in options.items() if key != 'stages'
+        }), idx, np.array(idle))
+        rescued = len(unassigned) - len(rescue['unassigned'])
+        routes += rescue['routes']
+        unassigned = rescue['unassigned']
+
+    labels = np.full(len(points), -1, dtype=np.int64)
+    for c, cluster in enumerate(clusters):
+        labels[cluster] = c
+    pairs = {}
+    moves = repaired = inserted = 0
+    repair_start = time.perf_counter()
+    if len(clusters) > 1 and options.get('stages', ('local_search',)):
+        centres = np.array([[np.average(x[c], weights=parcels[c] + 1), np.average(y[c], weights=parcels[c] + 1)]
+                            for c in clusters])
+        pairs = _border_pairs(x, y, labels, centres)
+        if on_progress is not None:
+            on_progress('border repair')
+        with instrument.stage('repair'):
+            routes, unassigned, moves, repaired, inserted = _repair(
+                parts, routes, unassigned, pairs, repair_start + time_budget * REPAIR_SHARE, window_mode,
+                service_minutes)
+
+    solution = _merge_solutions(solutions, routes, unassigned, options)
+    solution['decomposition'] = {
+        'method': method,
+        'clusters': len(clusters),
+        'largest_cluster': max((len(c) for c in clusters), default=0),
+        'workers': workers,
+        'rescued': rescued,
+        'border_stops': sum(len(stops) for stops in pairs.values()),
+        'repaired_borders': repaired,
+        'repair_moves': moves,
+        'border_inserted': inserted,
+        'seconds': {
+            'clustering': cluster_seconds,
+            'solving': solve_seconds,
+            'repair': time.perf_counter() - repair_start,
+            'total': time.perf_counter() - begin,
+        },
+    }
+    return solution
+
+
+def assign_depots(reach, parcels, capacity, slack=DEPOT_SLACK):
+    """Depot of every stop: its nearest, unless that depot has more parcels than its fleet can take.
+
+    ``reach`` is a stops x depots array of distances and ``capacity`` each
+    depot's fleet capacity. A depot can take its share of the parcels by
+    capacity, ``slack`` over; a depot above that hands the stops with the
+    smallest detour per parcel to their nearest depot with room left.
+    Every step is vectorized over the stops - the loops only run over
+    depots. Returns each stop's depot (column of ``reach``).
+    """
+    depot_of = np.argmin(reach, axis=1)
+    k = reach.shape[1]
+    if k < 2 or capacity.sum() <= 0:
+        return depot_of
+    limit = capacity / capacity.sum() * parcels.sum() * (1 + slack)
+    load = np.bincount(depot_of, weights=parcels, minlength=k)
+    for d in np.argsort(limit - load, kind='stable'):
+        open_depots = limit - load > 0
+        open_depots[d] = False
+        while load[d] > limit[d] and open_depots.any():
+            mine = np.flatnonzero(depot_of == d)
+            options = np.where(open_depots, reach[mine], np.inf)
+            alt = np.argmin(options, axis=1)
+            detour = options[np.arange(len(mine)), alt] - reach[mine, d]
+            order = np.argsort(detour / np.maximum(parcels[mine], 1), kind='stable')
+            mine, alt = mine[order], alt[order]
+            fits = np.zeros(len(mine), dtype=bool)
+            for a in np.flatnonzero(open_depots):
+                to_a = alt == a
+                fits[to_a] = np.cumsum(parcels[mine[to_a]]) <= limit[a] - load[a]
+            moving, to = mine[fits], alt[fits]
+            cut = np.searchsorted(np.cumsum(parcels[moving]), load[d] - limit[d]) + 1
+            depot_of[moving[:cut]] = to[:cut]
+            load = np.bincount(depot_of, weights=parcels, minlength=k)
+            # A depot that couldn't take every stop headed its way is full
+            open_depots[np.unique(alt[~fits])] = False
+    return depot_of
+
+
+def multi_depot_solve(points, vehicles, dist=None, workers=None, time_budget=DEFAULT_TIME_BUDGET, traffic=None,
+                      roads=None, window_mode=DEFAULT_WINDOW_MODE, service_minutes=SERVICE_MINUTES,
+                      on_progress=None, **options):
+    """Solve an instance with several depots as one sub-problem per depot.
+
+    The depots are row 0 and the rows flagged ``depot`` (``depot_rows``);
+    each depot's time window is its opening hours. A vehicle whose
+    ``depot`` names one of them runs all its trips from there; the others
+    are shared out between the depots in proportion to the parcels nearest
+    to each (``allot_vehicles``). Every stop then goes to its nearest
+    depot with room for it (``assign_depots``) - by ``dist`` when given,
+    else straight-line - and each depot's stops and vehicles are solved
+    with ``solve`` (``options`` passed on) on a ``ProcessPoolExecutor`` of
+    ``workers`` processes, sharing ``time_budget`` like decomposition
+    clusters. Returns a solution dict like ``solve``, routes starting and
+    ending at their depot's row, with a ``multi_depot`` stats entry.
+    Raises ValueError for a vehicle whose ``depot`` is not a depot's name.
+    """
+    begin = time.perf_counter()
+    workers = max(1, workers or default_workers())
+    options = {**options, 'window_mode': window_mode, 'service_minutes': service_minutes}
+    parts = _Parts(points, vehicles, dist, traffic, roads, options)
+    hubs = depot_rows(points)
+    names = point_column(points, 'name')
+    position = {str(names[hub]).strip(): k for k, hub in enumerate(hubs)}
+    home = np.full(len(vehicles), -1, dtype=np.int64)
+    for v, vehicle in enumerate(vehicles):
+        name = vehicle.get('depot')
+        if isinstance(name, str) and name.strip():
+            if name.strip() not in position:
+                raise ValueError(f"vehicle {vehicle['id']}: no depot named '{name.strip()}'")
+            home[v] = position[name.strip()]
+
+    stops = np.setdiff1d(np.arange(len(points)), hubs)
+    parcels = point_parcels(points).astype(np.float64)
+    capacities = np.array([v['capacity'] for v in vehicles], dtype=np.float64)
+    with instrument.stage('assign'):
+        if dist is not None:
+            # Out and back, as traffic can make the two directions differ
+            reach = (np.asarray(dist[np.ix_(hubs, stops)], dtype=np.float64).T
+                     + np.asarray(dist[np.ix_(stops, hubs)], dtype=np.float64)) / 2
+        else:
+            x, y = _project(*point_coordinates(points))
+            reach = np.hypot(x[stops, None] - x[hubs], y[stops, None] - y[hubs])
+        nearest = np.argmin(reach, axis=1)
+        # A depot's demand: the parcels nearest to it, each weighted by how far it is carried
+        carried = reach[np.arange(len(stops)), nearest] + (reach.mean() if reach.size else 0.0)
+        demand = np.bincount(nearest, weights=(parcels[stops] + 1) * carried, minlength=len(hubs))
+        depot_of_vehicle = home.copy()
+        free = np.flatnonzero(home < 0)
+        active = np.flatnonzero(demand > 0)
+        if len(free) and len(active):
+            fixed = np.bincount(home[home >= 0], weights=capacities[home >= 0], minlength=len(hubs))
+            depot_of_vehicle[free] = active[allot_vehicles(demand[active], capacities[free], fixed[active])]
+        placed = depot_of_vehicle >= 0
+        capacity = np.bincount(depot_of_vehicle[placed], weights=capacities[placed], minlength=len(hubs))
+        depot_of = assign_depots(reach, parcels[stops], capacity)
+    assign_seconds = time.perf_counter() - begin
+
+    tasks, solved = [], []
+    for k, hub in enumerate(hubs):
+        if (depot_of == k).any():
+            vehicle_rows = np.flatnonzero(depot_of_vehicle == k)
+            tasks.append((vehicle_rows,) + parts.problem(stops[depot_of == k], vehicle_rows, hub))
+            solved.append(k)
+    solve_budget = time_budget * min(workers, max(len(tasks), 1)) / max(len(tasks), 1)
+    solutions = _solve_parts(parts, tasks, workers, solve_budget, on_progress, 'depot')
+    for k, solution in zip(solved, solutions):
+        for stop in solution['unassigned']:
+            stop['depot'] = int(hubs[k])
+    routes = [route for solution in solutions for route in solution['routes']]
+    unassigned = [stop for solution in solutions for stop in solution['unassigned']]
+
+    # Stops a depot couldn't serve get one more chance from the nearest depot with vehicles no route used
+    used = {route['vehicle_index'] for route in routes}
+    idle = np.array([v not in used and depot_of_vehicle[v] >= 0 for v in range(len(vehicles))], dtype=bool)
+    rescued = 0
+    if unassigned and idle.any():
+        left = np.array([stop['index'] for stop in unassigned])
+        open_depots = np.bincount(depot_of_vehicle[idle], minlength=len(hubs)) > 0
+        rows = np.searchsorted(stops, left)
+        nearest_open = np.argmin(np.where(open_depots, reach[rows], np.inf), axis=1)
+        still = []
+        for k in np.unique(nearest_open):
+            vehicle_rows = np.flatnonzero(idle & (depot_of_vehicle == k))
+            idx, sub_points, sub_vehicles, sub_dist = parts.problem(left[nearest_open == k], vehicle_rows, hubs[k])
+            sub_dist = parts.matrix(sub_points, sub_dist)
+            rescue = _to_global(solve(sub_points, sub_vehicles, sub_dist, time_budget=0, stages=(), **{
+                key: value for key, value in options.items() if key != 'stages'
+            }), idx, vehicle_rows)
+            for stop in rescue['unassigned']:
+                stop['depot'] = int(hubs[k])
+            routes += rescue['routes']
+            still += rescue['unassigned']
+        rescued = len(unassigned) - len(still)
+        unassigned = still
+
+    summary = []
+    for k, hub in enumerate(hubs):
+        served = [route for route in routes if route['stops'][0] == hub]
+        summary.append({
+            'index': int(hub),
+            'name': str(names[hub]),
+            'stops': int((depot_of == k).sum()),
+            # Stops served from here although another depot is nearer (capacity-aware assignment)
+            'reassigned': int(((depot_of == k) & (nearest != k)).sum()),
+            'parcels': int(parcels[stops[depot_of == k]].sum()),
+            'vehicles': int((depot_of_vehicle == k).sum()),
+            'capacity': int(capacity[k]),
+            'routes': len(served),
+            'distance': total_distance(served),
+            'cost': total_cost(served),
+            'unassigned': sum(stop['depot'] == hub for stop in unassigned),
+        })
+    solution = _merge_solutions(solutions, routes, unassigned, options)
+    solution['multi_depot'] = {
+        'depots': summary,
+        'workers': workers,
+        'reassigned': int((depot_of != nearest).sum()),
+        'rescued': rescued,
+        'seconds': {
+            'assignment': assign_seconds,
+            'solving': time.perf_counter() - begin - assign_seconds,
+            'total': time.perf_counter() - begin,
+        },
+    }
+    return solution
@@ -0,0 +1,162 @@
+"""Distance calculations - scalar Haversine and the vectorized distance matrix"""
+import numpy as np
+
+from quickdeliver import instrument
+from quickdeliver.model import point_column
+from quickdeliver.traffic import TrafficModel, parse_hhmm, point_keys, time_bucket
+
+EARTH_RADIUS_KM = 6371
+AVERAGE_SPEED_KMH = 40
+
+# Upper bound on elements per temporary block while building a matrix
+# (2M float64 values = 16 MB per temporary), so memory stays bounded for large N
+CHUNK_ELEMENTS = 2_000_000
+
+
+def calculate_distance(lat1, lon1, lat2, lon2, traffic_factor=1.0):
+    """Calculate distance between two points using Haversine formula"""
+    R = EARTH_RADIUS_KM
+
+    lat1_rad = np.radians(lat1)
+    lat2_rad = np.radians(lat2)
+    delta_lat = np.radians(lat2 - lat1)
+    delta_lon = np.radians(lon2 - lon1)
+
+    a = np.sin(delta_lat/2)**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(delta_lon/2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+    distance = R * c * traffic_factor
+
+    return distance
+
+
+def travel_minutes(distance_km, speed_kmh=AVERAGE_SPEED_KMH):
+    """Driving time in minutes for a distance (scalar or array)"""
+    return distance_km / speed_kmh * 60
+
+
+def haversine_matrix(lats, lons, chunk_rows=None, dtype=np.float32):
+    """Great-circle distance (km) between every pair of coordinates.
+
+    Rows are computed in blocks of ``chunk_rows`` with one broadcasted NumPy
+    pass per block, so temporaries never exceed ``chunk_rows x N`` values.
+    """
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    n = len(lat)
+    if chunk_rows is None:
+        chunk_rows = max(1, CHUNK_ELEMENTS // max(n, 1))
+
+    cos_lat = np.cos(lat)
+    matrix = np.empty((n, n), dtype=dtype)
+    for start in range(0, n, chunk_rows):
+        stop = min(start + chunk_rows, n)
+        matrix[start:stop] = _haversine_rows(lat, lon, cos_lat, slice(start, stop))
+    return matrix
+
+
+def _haversine_rows(lat, lon, cos_lat, rows):
+    """Great-circle km from the points in ``rows`` to every point (coordinates in radians)"""
+    half_dlat = np.sin((lat[rows, None] - lat[None, :]) / 2)
+    half_dlon = np.sin((lon[rows, None] - lon[None, :]) / 2)
+    a = half_dlat**2 + cos_lat[rows, None] * cos_lat[None, :] * half_dlon**2
+    np.clip(a, 0, 1, out=a)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def point_coordinates(points):
+    """Latitude and longitude arrays for a PointTable or a list of point dicts"""
+    return point_column(points, 'lat', np.float64), point_column(points, 'lon', np.float64)
+
+
+def departure_bucket(points):
+    """Time-of-day bucket for leaving the depot (its opening time, else 08:00)"""
+    try:
+        return time_bucket(parse_hhmm(points[0]['time_start']))
+    except (KeyError, IndexError, ValueError):
+        return time_bucket(8 * 60)
+
+
+def build_distance_matrix(points, traffic=None, bucket=None, chunk_rows=None, roads=None):
+    """Road-distance estimate between all collection points, including traffic.
+
+    Entry ``[i, j]`` is the distance from ``points[i]`` to ``points[j]``; the
+    optimizer, route details and analytics all look legs up here by index.
+    Traffic factors come from ``traffic`` (a seeded ``TrafficModel``) for the
+    given time-of-day ``bucket``, so the same inputs always give the same matrix.
+    With ``roads`` (a ``RoadNetwork``) the base distances are shortest paths
+    over the road graph instead of great-circle distances.
+    """
+    if traffic is None:
+        traffic = TrafficModel()
+    if bucket is None:
+        bucket = departure_bucket(points)
+
+    with instrument.stage('distance'):
+        lats, lons = point_coordinates(points)
+        keys = point_keys(points)
+        if roads is not None:
+            matrix = roads.matrix(lats, lons).astype(np.float32)
+        else:
+            matrix = haversine_matrix(lats, lons, chunk_rows=chunk_rows)
+
+        n = len(matrix)
+        rows = chunk_rows or max(1, CHUNK_ELEMENTS // max(n, 1))
+        for start in range(0, n, rows):
+            stop = min(start + rows, n)
+            matrix[start:stop] *= traffic.factors(keys[start:stop, None], keys[None, :], bucket)
+    instrument.count('distance_evaluations', n * n)
+    return matrix
+
+
+def extend_distance_matrix(dist, points, traffic=None, bucket=None, roads=None):
+    """Matrix for ``points`` when ``dist`` already covers all but the last few.
+
+    Only the rows and columns of the new points are computed - O(N) work
+    per added point instead of rebuilding the O(N^2) matrix - and the
+    result is identical to ``build_distance_matrix(points, traffic)``
+    (great-circle distances and traffic factors are both symmetric). Road
+    distances aren't symmetric, so with ``roads`` the new columns get their
+    own searches (on the reversed graph).
+    """
+    if traffic is None:
+        traffic = TrafficModel()
+    if bucket is None:
+        bucket = departure_bucket(points)
+    old, n = len(dist), len(points)
+    if n <= old:
+        return dist
+
+    with instrument.stage('distance'):
+        lats, lons = point_coordinates(points)
+        rows, columns = distance_rows(lats, lons, point_keys(points), np.arange(old, n), traffic, bucket,
+                                      dist.dtype, roads)
+        matrix = np.empty((n, n), dtype=dist.dtype)
+        matrix[:old, :old] = dist
+        matrix[:, old:] = columns
+        matrix[old:] = rows
+    return matrix
+
+
+def distance_rows(lats, lons, keys, rows, traffic, bucket, dtype=np.float32, roads=None):
+    """Matrix rows and columns of the points at indices ``rows``, as ``build_distance_matrix`` fills them.
+
+    Returns ``(rows, columns)``: the distances from each of those points to
+    every point (``len(rows) x N``) and from every point to each of them
+    (``N x len(rows)``). ``keys`` are the ``point_keys`` for the traffic
+    factors; with ``roads`` both directions are searched on the road graph.
+    """
+    factors = traffic.factors(keys[rows, None], keys[None, :], bucket)
+    if roads is not None:
+        out = roads.distances(lats[rows], lons[rows], lats, lons)
+        out[np.arange(len(rows)), rows] = 0
+        into = roads.distances(lats, lons, lats[rows], lons[rows])
+        into[rows, np.arange(len(rows))] = 0
+        into = into.astype(dtype)
+        into *= factors.T
+    else:
+        lat, lon = np.radians(lats), np.radians(lons)
+        out = _haversine_rows(lat, lon, np.cos(lat), rows)
+    out = out.astype(dtype)
+    out *= factors
+    instrument.count('distance_evaluations', out.size + (into.size if roads is not None else 0))
+    return out, (into if roads is not None else out.T)
@@ -0,0 +1,226 @@
+"""Incremental re-optimization - add a stop or a vehicle to a solved plan without re-solving it"""
+import time
+
+import numpy as np
+
+from quickdeliver.local_search import NEIGHBOR_COUNT, improve_routes
+from quickdeliver.model import RouteTable
+from quickdeliver.routes import make_route, point_parcels, rebuild_route
+from quickdeliver.solver import time_window_summary, total_cost, total_distance
+from quickdeliver.time_windows import DEFAULT_WINDOW_MODE, SERVICE_MINUTES, TimeWindows
+from quickdeliver.trips import depot_hours, find_unassigned, prepare_fleet, schedule_trips, schedule_vehicle
+
+# Local search time after each edit, seconds
+REPAIR_TIME_BUDGET = 0.03
+
+
+class _Plan:
+    """Solved routes plus lazily built per-vehicle schedules, for insertion checks"""
+
+    def __init__(self, solution, points, vehicles, dist):
+        routes = solution['routes']
+        self.routes = routes.to_routes() if isinstance(routes, RouteTable) else [dict(r) for r in routes]
+        self.points = points
+        self.dist = dist
+        self.parcels = point_parcels(points)
+        self.windows = TimeWindows(points, solution.get('window_mode', DEFAULT_WINDOW_MODE),
+                                   solution.get('service_minutes', SERVICE_MINUTES))
+        self.fleet = prepare_fleet(vehicles, points)
+        self.shift_start = depot_hours(points)[0]
+        self.schedules = {}
+        # Vehicles whose routes changed and need re-timing
+        self.changed = set()
+
+    def trips(self, v):
+        """Indices of vehicle ``v``'s routes in trip order"""
+        return sorted((r for r, route in enumerate(self.routes) if route['vehicle_index'] == v),
+                      key=lambda r: self.routes[r].get('trip', 1))
+
+    def shift_end(self, v):
+        return self.shift_start + self.fleet[v]['shift_minutes']
+
+    def fits(self, v, trip_stops):
+        """Whether vehicle ``v`` can run ``trip_stops`` back-to-back within windows and shift"""
+        _, _, feasible = schedule_vehicle(trip_stops, self.shift_start, self.shift_end(v), self.dist, self.windows)
+        return feasible
+
+    def schedule(self, r):
+        """``RouteSchedule`` of route ``r``, built for its whole vehicle on first use"""
+        if r not in self.schedules:
+            v = self.routes[r]['vehicle_index']
+            trips = self.trips(v)
+            _, schedules, _ = schedule_vehicle([self.routes[t]['stops'] for t in trips], self.shift_start,
+                                               self.shift_end(v), self.dist, self.windows)
+            self.schedules.update(zip(trips, schedules))
+        return self.schedules[r]
+
+    def insert(self, k):
+        """Put stop ``k`` where it adds the least distance and still fits; returns the vehicle or None.
+
+        Every gap of every route and a fresh depot trip for every vehicle are
+        costed in one vectorized pass; candidates are then tried cheapest
+        first, screened by capacity and the O(1) ``RouteSchedule`` check
+        before the vehicle is re-timed exactly.
+        """
+        dist, demand = self.dist, self.parcels[k]
+        seqs = [np.asarray(route['stops']) for route in self.routes]
+        lengths = np.array([len(s) - 1 for s in seqs], dtype=np.int64)
+        route_of = np.repeat(np.arange(len(seqs)), lengths)
+        loads = np.array([route['total_parcels'] for route in self.routes], dtype=np.int64)
+        caps = np.array([route['capacity'] for route in self.routes], dtype=np.int64)
+        if len(seqs):
+            prev = np.concatenate([s[:-1] for s in seqs])
+            nxt = np.concatenate([s[1:] for s in seqs])
+            positions = np.arange(len(prev)) - np.repeat(np.cumsum(lengths) - lengths, lengths) + 1
+            added = (dist[prev, k].astype(np.float64) + dist[k, nxt] - dist[prev, nxt])
+            ok = loads[route_of] + demand <= caps[route_of]
+        else:
+            positions = added = ok = np.empty(0)
+
+        # Fresh depot trips go after the gaps, tagged with route -1 and the vehicle in ``positions``
+        round_trip = float(dist[0, k]) + float(dist[k, 0])
+        capacities = np.array([v['capacity'] for v in self.fleet], dtype=np.int64)
+        route_of = np.concatenate([route_of, np.full(len(self.fleet), -1)])
+        positions = np.concatenate([positions, np.arange(len(self.fleet))]).astype(np.int64)
+        added = np.concatenate([added, np.full(len(self.fleet), round_trip)])
+        ok = np.concatenate([ok, demand <= capacities]).astype(bool)
+
+        for c in np.flatnonzero(ok)[np.argsort(added[ok], kind='stable')]:
+            r, pos = int(route_of[c]), int(positions[c])
+            if r < 0:
+                v = pos
+                trips = [self.routes[t]['stops'] for t in self.trips(v)]
+                if self.fits(v, trips + [[0, k, 0]]):
+                    self.routes.append(make_route(self.fleet[v], [0, k, 0], dist, self.parcels))
+                    self.routes[-1]['trip'] = len(trips) + 1
+                    self.schedules = {}
+                    self.changed.add(v)
+                    return v
+                continue
+            if not self.schedule(r).can_insert(pos, k):
+                continue
+            route = self.routes[r]
+            v = route['vehicle_index']
+            stops = np.insert(np.asarray(route['stops']), pos, k)
+            if self.fits(v, [stops if t == r else self.routes[t]['stops'] for t in self.trips(v)]):
+                self.routes[r] = {**rebuild_route(route, stops, dist, self.parcels), 'trip': route.get('trip', 1)}
+                self.schedules = {}
+                self.changed.add(v)
+                return v
+        return None
+
+    def nearby_vehicles(self, k):
+        """Vehicles serving the routed stops closest to ``k``"""
+        owner = np.full(len(self.dist), -1, dtype=np.int64)
+        for route in self.routes:
+            owner[np.asarray(route['stops'][1:-1])] = route['vehicle_index']
+        routed = np.flatnonzero(owner >= 0)
+        routed = routed[routed != k]
+        if not len(routed):
+            return set()
+        closest = routed[np.argsort(self.dist[k, routed], kind='stable')[:NEIGHBOR_COUNT]]
+        return {int(v) for v in owner[closest]}
+
+    def repair(self, vehicles, time_budget):
+        """Short local search over the routes of ``vehicles``; the rest of the plan is untouched"""
+        touched = [r for r, route in enumerate(self.routes) if route['vehicle_index'] in vehicles]
+        if not touched:
+            return None
+        routes = [self.routes[r] for r in touched]
+        stops = np.unique(np.concatenate([np.asarray(route['stops'][1:-1]) for route in routes]))
+        improved, stats = improve_routes(routes, self.points, self.dist, time_budget,
+                                         neighbors=_local_neighbors(self.dist, stops), windows=self.windows)
+        improved = schedule_trips(improved, self.points, self.dist, self.windows)
+        touched = set(touched)
+        kept = [route for r, route in enumerate(self.routes) if r not in touched]
+        self.routes = sorted(kept + improved, key=lambda route: (route['vehicle_index'], route['trip']))
+        self.schedules = {}
+        self.changed -= vehicles
+        return stats
+
+    def solution(self, base, vehicles, edit):
+        """Solution dict like ``solve`` returns, from ``base`` with the edited routes"""
+        if self.changed:
+            # Only the edited vehicles need new times; the others keep theirs
+            kept = [route for route in self.routes if route['vehicle_index'] not in self.changed]
+            changed = [route for route in self.routes if route['vehicle_index'] in self.changed]
+            changed = schedule_trips(changed, self.points, self.dist, self.windows)
+            self.routes = sorted(kept + changed, key=lambda route: (route['vehicle_index'], route['trip']))
+            self.changed = set()
+        return {
+            **base,
+            'routes': self.routes,
+            'unassigned': find_unassigned(self.points, vehicles, self.routes, self.dist, self.parcels, self.windows),
+            'final_distance': total_distance(self.routes),
+            'final_cost': total_cost(self.routes),
+            'time_windows': time_window_summary(self.routes),
+            'incremental': edit,
+        }
+
+
+def _local_neighbors(dist, stops, k=NEIGHBOR_COUNT):
+    """Neighbour lists (as ``neighbor_lists`` gives) filled in only for ``stops``, among ``stops``"""
+    neighbors = np.zeros((len(dist), max(0, min(k, len(stops) - 1))), dtype=np.int32)
+    if neighbors.shape[1] == 0:
+        return neighbors
+    block = np.array(dist[np.ix_(stops, stops)], dtype=np.float64)
+    np.fill_diagonal(block, np.inf)
+    neighbors[stops] = stops[np.argsort(block, axis=1, kind='stable')[:, :neighbors.shape[1]]]
+    return neighbors
+
+
+def insert_stop(solution, points, vehicles, dist, stop=None, repair_budget=REPAIR_TIME_BUDGET):
+    """Add collection point ``stop`` (default: the last point) to a solved plan.
+
+    ``points`` and ``dist`` already include the new point (see
+    ``extend_distance_matrix``). The stop goes where it adds the least
+    distance while keeping capacity, time windows and shifts, or on a new
+    depot trip; then a short local search runs over the routes of the
+    vehicles nearby. Stops that fit nowhere are listed as unassigned.
+    Returns a new solution dict with an ``incremental`` stats entry; the
+    input solution is not modified.
+    """
+    start = time.perf_counter()
+    stop = len(points) - 1 if stop is None else stop
+    plan = _Plan(solution, points, vehicles, dist)
+    distance_before = total_distance(plan.routes)
+    vehicle = plan.insert(stop)
+    repair = None
+    if vehicle is not None:
+        repair = plan.repair(plan.nearby_vehicles(stop) | {vehicle}, repair_budget)
+    return plan.solution(solution, vehicles, {
+        'action': 'add_stop',
+        'stop': stop,
+        'inserted': vehicle is not None,
+        'added_km': total_distance(plan.routes) - distance_before,
+        'repair_moves': sum(repair['moves'].values()) if repair else 0,
+        'seconds': time.perf_counter() - start,
+    })
+
+
+def add_vehicle(solution, points, vehicles, dist, repair_budget=REPAIR_TIME_BUDGET):
+    """Give a solved plan the last vehicle of ``vehicles`` and route unassigned stops with it.
+
+    Each unassigned stop (fewest parcels first) is inserted as in
+    ``insert_stop`` - into the new vehicle's trips or anywhere it is now
+    cheaper - followed by a short local search around the vehicles used.
+    """
+    start = time.perf_counter()
+    plan = _Plan(solution, points, vehicles, dist)
+    distance_before = total_distance(plan.routes)
+    pending = sorted(solution['unassigned'], key=lambda u: (u['parcels'], u['index']))
+    used, inserted = {len(vehicles) - 1}, 0
+    for stop in pending:
+        vehicle = plan.insert(stop['index'])
+        if vehicle is not None:
+            used.add(vehicle)
+            inserted += 1
+    repair = plan.repair(used, repair_budget) if inserted else None
+    return plan.solution(solution, vehicles, {
+        'action': 'add_vehicle',
+        'vehicle': vehicles[-1]['id'],
+        'inserted': inserted,
+        'added_km': total_distance(plan.routes) - distance_before,
+        'repair_moves': sum(repair['moves'].values()) if repair else 0,
+        'seconds': time.perf_counter() - start,
+    })
@@ -0,0 +1,252 @@
+"""Chunked CSV ingestion with vectorized schema validation.
+
+Points files are read ``CHUNK_ROWS`` rows at a time as strings, checked
+column by column with pandas/NumPy operations, and kept only as the typed
+column arrays of a ``PointTable`` - memory stays close to the size of the
+final arrays however long the file is.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from quickdeliver.model import DAY_MINUTES, PointTable, depot_rows, point_column
+from quickdeliver.traffic import parse_hhmm_array
+
+CHUNK_ROWS = 100_000
+# Invalid values listed in a ValidationError message; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+POINT_COLUMNS = ('name', 'lat', 'lon', 'parcels')
+VEHICLE_COLUMNS = ('id', 'capacity', 'fuel_efficiency', 'cost_per_km')
+# CSV line of the first data row (line 1 is the header)
+FIRST_LINE = 2
+# Values of the optional ``depot`` column marking a row as a depot; blank or these mean a stop
+DEPOT_YES = ('yes', 'y', 'true', '1', 'depot')
+DEPOT_NO = ('', 'no', 'n', 'false', '0')
+
+
+class ValidationError(ValueError):
+    """A CSV file that doesn't match the expected schema.
+
+    ``errors`` lists ``(line, column, message)`` for the first
+    ``MAX_REPORTED_ERRORS`` problems; ``count`` is the total found.
+    """
+
+    def __init__(self, source, errors, count=None):
+        self.errors = errors
+        self.count = len(errors) if count is None else count
+        listed = '; '.join(
+            f"line {line}, {column}: {message}" if line else f"{column}: {message}"
+            for line, column, message in errors
+        )
+        more = f" (+{self.count - len(errors)} more)" if self.count > len(errors) else ''
+        super().__init__(f"{source}: {listed}{more}")
+
+
+class _Errors:
+    """Collects (line, column, message) triples, keeping the first few"""
+
+    def __init__(self):
+        self.errors = []
+        self.count = 0
+
+    def add(self, lines, column, message):
+        """Record ``message`` for every line in ``lines``"""
+        self.count += len(lines)
+        room = MAX_REPORTED_ERRORS - len(self.errors)
+        self.errors.extend(
+            (None if line is None else int(line), column, message) for line in lines[:max(room, 0)]
+        )
+
+    def check(self, mask, lines, column, message):
+        """Record ``message`` for the lines where ``mask`` is True"""
+        if mask.any():
+            self.add(lines[mask], column, message)
+
+    def raise_if_any(self, source):
+        if self.count:
+            raise ValidationError(source, self.errors, self.count)
+
+
+def _source_name(source, default):
+    """Path or upload name of a CSV source, for error messages"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return getattr(source, 'name', None) or default
+
+
+def _read_chunks(source, name, chunk_rows):
+    """CSV chunks with every column as stripped text (blank cells as '')"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    try:
+        reader = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_rows,
+                             skipinitialspace=True)
+    except pd.errors.EmptyDataError:
+        raise ValidationError(name, [(None, 'file', 'no header row')])
+    with reader:
+        for chunk in reader:
+            chunk.columns = chunk.columns.str.strip()
+            yield chunk
+
+
+def _require_columns(chunk, required, errors):
+    missing = [c for c in required if c not in chunk.columns]
+    if missing:
+        errors.add([None], ', '.join(missing), 'missing column')
+    return not missing
+
+
+def _numbers(chunk, column, lines, errors):
+    """Column parsed as float64; unparsable values are recorded and come back as NaN"""
+    text = chunk[column].str.strip()
+    values = pd.to_numeric(text, errors='coerce').to_numpy(np.float64)
+    errors.check(np.isnan(values), lines, column, 'not a number')
+    return values
+
+
+def _windows(chunk, lines, errors):
+    """Window start/end minutes; blank cells mean the whole day"""
+    bounds = []
+    for column, default in (('time_start', 0), ('time_end', DAY_MINUTES)):
+        if column not in chunk.columns:
+            bounds.append(np.full(len(chunk), default, dtype=np.float64))
+            continue
+        text = chunk[column].str.strip()
+        minutes = parse_hhmm_array(text)
+        blank = (text == '').to_numpy()
+        errors.check(np.isnan(minutes) & ~blank, lines, column, "not an 'HH:MM' time")
+        bounds.append(np.where(blank | np.isnan(minutes), default, minutes))
+    start, end = bounds
+    errors.check(start > end, lines, 'time_end', 'before time_start')
+    return start, end
+
+
+def _depot_flags(chunk, lines, errors):
+    """Rows marked as depots in the optional ``depot`` column"""
+    text = chunk['depot'].str.strip().str.lower()
+    errors.check((~text.isin(DEPOT_YES + DEPOT_NO)).to_numpy(), lines, 'depot', "not 'yes' or blank")
+    return text.isin(DEPOT_YES).to_numpy()
+
+
+def read_points(source, day=None, chunk_rows=CHUNK_ROWS):
+    """Collection points CSV as a validated ``PointTable``.
+
+    ``source`` is a path or file-like object. Required columns are
+    name/lat/lon/parcels; ``time_start``/``time_end`` ('HH:MM', blank for
+    any time), ``day`` and ``depot`` are optional. The first data row is
+    the depot; ``depot`` = 'yes' marks more depots (hubs) among the rows.
+    With ``day`` set, only that day's rows are kept (depots always are),
+    so one day of a multi-day file costs no more memory than a single-day
+    file. Raises ``ValidationError`` listing every bad value by CSV line.
+    """
+    name = _source_name(source, 'points CSV')
+    errors = _Errors()
+    columns = {field: [] for field in ('name', 'lat', 'lon', 'parcels', 'start', 'end', 'day', 'depot')}
+    has_day = has_depot = None
+    offset = FIRST_LINE
+
+    for chunk in _read_chunks(source, name, chunk_rows):
+        if has_day is None:
+            if not _require_columns(chunk, POINT_COLUMNS, errors):
+                break
+            has_day = 'day' in chunk.columns
+            has_depot = 'depot' in chunk.columns
+            if day is not None and not has_day:
+                errors.add([None], 'day', f"no day column to select '{day}' from")
+                break
+        lines = np.arange(offset, offset + len(chunk))
+        offset += len(chunk)
+
+        names = chunk['name'].str.strip().to_numpy(object)
+        errors.check(names == '', lines, 'name', 'blank')
+        lat = _numbers(chunk, 'lat', lines, errors)
+        errors.check(np.abs(lat) > 90, lines, 'lat', 'outside -90..90')
+        lon = _numbers(chunk, 'lon', lines, errors)
+        errors.check(np.abs(lon) > 180, lines, 'lon', 'outside -180..180')
+        parcels = _numbers(chunk, 'parcels', lines, errors)
+        errors.check((parcels < 0) | (parcels % 1 > 0), lines, 'parcels',
+                     'not a whole number >= 0')
+        start, end = _windows(chunk, lines, errors)
+        days = chunk['day'].str.strip().to_numpy(object) if has_day else None
+        depots = _depot_flags(chunk, lines, errors) if has_depot else np.zeros(len(chunk), dtype=bool)
+
+        keep = slice(None)
+        if day is not None:
+            keep = days == str(day)
+            keep[(lines == FIRST_LINE) | depots] = True
+        columns['name'].append(names[keep])
+        columns['lat'].append(lat[keep])
+        columns['lon'].append(lon[keep])
+        columns['parcels'].append(np.nan_to_num(parcels[keep]).astype(np.int32))
+        columns['start'].append(start[keep].astype(np.int16))
+        columns['end'].append(end[keep].astype(np.int16))
+        if has_day:
+            columns['day'].append(days[keep])
+        if has_depot:
+            columns['depot'].append(depots[keep])
+
+    if offset == FIRST_LINE and not errors.count:
+        errors.add([None], 'file', 'no data rows')
+    errors.raise_if_any(name)
+
+    merged = {field: np.concatenate(arrays) for field, arrays in columns.items() if arrays}
+    return PointTable(merged['name'], merged['lat'], merged['lon'], merged['parcels'],
+                      merged['start'], merged['end'], merged.get('day'), merged.get('depot'))
+
+
+def read_vehicles(source):
+    """Vehicles CSV as a list of validated vehicle dicts.
+
+    Required columns are id/capacity/fuel_efficiency/cost_per_km;
+    ``shift_hours`` is optional (blank for the depot hours) and so is
+    ``depot``, the name of the vehicle's home depot (blank: any depot).
+    Other columns are kept as text.
+    """
+    name = _source_name(source, 'vehicles CSV')
+    errors = _Errors()
+    frames = []
+    for chunk in _read_chunks(source, name, CHUNK_ROWS):
+        if not frames and not _require_columns(chunk, VEHICLE_COLUMNS, errors):
+            break
+        frames.append(chunk)
+    if not frames and not errors.count:
+        errors.add([None], 'file', 'no data rows')
+    errors.raise_if_any(name)
+
+    df = pd.concat(frames, ignore_index=True)
+    lines = np.arange(FIRST_LINE, FIRST_LINE + len(df))
+    errors.check((df['id'].str.strip() == '').to_numpy(), lines, 'id', 'blank')
+    capacity = _numbers(df, 'capacity', lines, errors)
+    errors.check((capacity <= 0) | (capacity % 1 > 0), lines, 'capacity',
+                 'not a whole number > 0')
+    efficiency = _numbers(df, 'fuel_efficiency', lines, errors)
+    errors.check(efficiency <= 0, lines, 'fuel_efficiency', 'not > 0')
+    cost = _numbers(df, 'cost_per_km', lines, errors)
+    errors.check(cost < 0, lines, 'cost_per_km', 'negative')
+
+    df['id'] = df['id'].str.strip()
+    df['capacity'] = np.nan_to_num(capacity).astype(np.int64)
+    df['fuel_efficiency'] = efficiency
+    df['cost_per_km'] = cost
+    if 'shift_hours' in df.columns:
+        blank = (df['shift_hours'].str.strip() == '').to_numpy()
+        shift = pd.to_numeric(df['shift_hours'].str.strip(), errors='coerce').to_numpy(np.float64)
+        errors.check((np.isnan(shift) | (shift <= 0)) & ~blank, lines, 'shift_hours', 'not a number > 0')
+        df['shift_hours'] = shift
+    if 'depot' in df.columns:
+        df['depot'] = df['depot'].str.strip()
+    errors.raise_if_any(name)
+    return df.to_dict('records')
+
+
+def check_vehicle_depots(points, vehicles, source='vehicles CSV'):
+    """Raise ``ValidationError`` for vehicles whose ``depot`` names none of the points' depots"""
+    names = point_column(points, 'name')
+    depots = {str(names[row]).strip() for row in depot_rows(points)}
+    errors = _Errors()
+    for v, vehicle in enumerate(vehicles):
+        if vehicle.get('depot') and vehicle['depot'] not in depots:
+            errors.add([FIRST_LINE + v], 'depot', f"no depot named '{vehicle['depot']}'")
+    errors.raise_if_any(source)
@@ -0,0 +1,175 @@
+"""Run instrumentation - wall time per stage, work counters and an optional cProfile capture.
+
+    with instrument.recording(profile=True) as run:
+        solution = solve(points, vehicles)
+    print(instrument.format_report(run.report()))
+
+Library code marks its stages with ``stage(name)`` and its work with
+``count(name, n)``. Both do nothing unless a recording is active in the
+current thread (or context), so uninstrumented callers pay one lookup.
+Stage times are exclusive: while a nested stage runs, the enclosing one
+is paused, so the stages of a run add up to its total. Work done in
+worker processes (multi-start, parallel decomposition) is timed as a
+whole by the stage that waits for it, and its counters are not seen.
+"""
+import contextlib
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import time
+
+# Functions listed in a report's profile, by cumulative time
+PROFILE_TOP = 25
+# Name for the time of a run spent outside any stage, reported when it reaches MIN_UNSTAGED seconds
+UNSTAGED = 'other'
+MIN_UNSTAGED = 1e-3
+
+_active = contextvars.ContextVar('quickdeliver_run', default=None)
+
+
+class Run:
+    """Stage times, counters and (optionally) a cProfile of one recording"""
+
+    def __init__(self, profile=False):
+        self.seconds = {}
+        self.counters = {}
+        self.profiler = cProfile.Profile() if profile else None
+        self.started = time.perf_counter()
+        self.finished = None
+        self._open = []
+        self._mark = self.started
+
+    def _charge(self):
+        now = time.perf_counter()
+        if self._open:
+            name = self._open[-1]
+            self.seconds[name] = self.seconds.get(name, 0.0) + now - self._mark
+        self._mark = now
+
+    def enter(self, name):
+        self._charge()
+        self._open.append(name)
+
+    def leave(self):
+        self._charge()
+        self._open.pop()
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def absorb(self, other):
+        """Add a finished nested run's stage times and counters to this one"""
+        for name, seconds in other.seconds.items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        for name, n in other.counters.items():
+            self.count(name, n)
+        # The nested run's time is in its stages now, not in whatever stage of ours was open
+        self._mark = time.perf_counter()
+
+    @property
+    def total_seconds(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def report(self, top=PROFILE_TOP):
+        """JSON-ready summary: total and per-stage seconds, counters and the top profiled functions"""
+        stages = dict(sorted(self.seconds.items(), key=lambda item: -item[1]))
+        unstaged = self.total_seconds - sum(stages.values())
+        if unstaged >= MIN_UNSTAGED:
+            stages[UNSTAGED] = unstaged
+        return {
+            'total_seconds': self.total_seconds,
+            'stages': stages,
+            'counters': dict(sorted(self.counters.items())),
+            'profile': None if self.profiler is None else profile_rows(self.profiler, top),
+        }
+
+
+def profile_rows(profiler, top=PROFILE_TOP):
+    """The ``top`` functions of a cProfile by cumulative time, as dicts"""
+    rows = []
+    for (path, line, function), (_, calls, own, cumulative, _) in pstats.Stats(profiler).stats.items():
+        rows.append({
+            'function': f"{os.path.basename(path)}:{line}({function})" if line else function,
+            'calls': calls,
+            'own_seconds': own,
+            'cumulative_seconds': cumulative,
+        })
+    rows.sort(key=lambda row: -row['cumulative_seconds'])
+    return rows[:top]
+
+
+def current():
+    """The active ``Run``, or None"""
+    return _active.get()
+
+
+@contextlib.contextmanager
+def recording(profile=False):
+    """Record the stages and counters of the enclosed code; yields the ``Run``.
+
+    A recording inside another one adds its times and counts to the outer
+    run when it ends. With ``profile`` the code also runs under cProfile
+    (which slows pure-Python code down by about half).
+    """
+    run = Run(profile)
+    parent = _active.get()
+    token = _active.set(run)
+    if run.profiler is not None:
+        run.profiler.enable()
+    try:
+        yield run
+    finally:
+        if run.profiler is not None:
+            run.profiler.disable()
+        while run._open:
+            run.leave()
+        run.finished = time.perf_counter()
+        _active.reset(token)
+        if parent is not None:
+            parent.absorb(run)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time the enclosed code as stage ``name`` of the active run"""
+    run = _active.get()
+    if run is None:
+        yield
+        return
+    run.enter(name)
+    try:
+        yield
+    finally:
+        run.leave()
+
+
+def count(name, n=1):
+    """Add ``n`` to counter ``name`` of the active run"""
+    run = _active.get()
+    if run is not None:
+        run.count(name, n)
+
+
+def counter(name):
+    """Current value of counter ``name`` of the active run (0 without one)"""
+    run = _active.get()
+    return 0 if run is None else run.counters.get(name, 0)
+
+
+def format_report(report):
+    """Plain-text table of a ``Run.report()``: stages by time with their share, then counters"""
+    total = report['total_seconds'] or 1.0
+    lines = [f"{'stage':<20} {'seconds':>9} {'share':>7}"]
+    lines += [f"{name:<20} {seconds:>9.3f} {seconds / total:>7.1%}" for name, seconds in report['stages'].items()]
+    lines.append(f"{'total':<20} {report['total_seconds']:>9.3f}")
+    lines += [f"{name:<20} {n:>9,}" for name, n in report['counters'].items()]
+    for row in report['profile'] or ():
+        lines.append(f"{row['cumulative_seconds']:>9.3f}s {row['calls']:>9,}  {row['function']}")
+    return '\n'.join(lines)
+
+
+def write_report(path, report):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
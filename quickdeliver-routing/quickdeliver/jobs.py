@@ -0,0 +1,180 @@
+"""Background optimization jobs - one optimizer call on a worker thread, with progress, stop and cancel.
+
+    job = SolveJob(solve, points, vehicles, dist, time_budget=5.0).start()
+    while not job.finished:
+        print(job.status())
+        time.sleep(0.5)
+    solution = job.result
+
+The job hands its own ``on_progress`` to the optimizer (``solve``,
+``multistart_solve`` or ``decompose_solve``) and keeps the phase it last
+heard of and, at most every ``SNAPSHOT_SECONDS``, the best routes so far.
+``stop()`` makes the optimizer wrap up with the routes it has (stop at
+the time budget now); ``cancel()`` aborts it and drops the result. A
+thread can't be interrupted from outside, so both take effect at the
+optimizer's next progress call - between local search operators, every
+few regret insertions (a stop waits for the routes to be built), or once
+any other construction in progress is finished.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from quickdeliver import instrument
+from quickdeliver.local_search import DEFAULT_TIME_BUDGET
+from quickdeliver.solver import total_cost, total_distance
+
+# Least time between two snapshots of the best routes (rebuilding them is O(N))
+SNAPSHOT_SECONDS = 0.5
+
+# Job states
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+
+class Cancelled(Exception):
+    """Raised inside the optimizer at its next progress call once its job is cancelled"""
+
+
+def _served(routes):
+    return sum(len(route['stops']) - 2 for route in routes)
+
+
+class SolveJob:
+    """``optimize(*args, on_progress=..., **kwargs)`` run on a daemon thread; poll ``status()``.
+
+    Once finished, ``result`` holds the solution (``state`` 'done'),
+    ``error`` the exception it raised ('failed'), or neither
+    ('cancelled'); ``report`` is the run's ``instrument`` report either way.
+    """
+
+    def __init__(self, optimize, *args, profile=False, **kwargs):
+        self.time_budget = kwargs.get('time_budget', DEFAULT_TIME_BUDGET)
+        self.profile = profile
+        self.state = PENDING
+        self.phase = None
+        self.result = None
+        self.error = None
+        self.report = None
+        self.best_routes = None
+        self.started = None
+        self.ended = None
+        self._call = (optimize, args, kwargs)
+        self._best_key = None
+        self._snapshot_at = None
+        self._stop = threading.Event()
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='quickdeliver-job', daemon=True)
+
+    def start(self):
+        """Start the optimizer on the job's thread; returns the job"""
+        self.started = time.perf_counter()
+        self.state = RUNNING
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Finish early with the best routes so far, as if the time budget had run out"""
+        self._stop.set()
+
+    def cancel(self):
+        """Abort the run and drop its result"""
+        self._cancel.set()
+        self._stop.set()
+
+    @property
+    def finished(self):
+        return self.state in (DONE, CANCELLED, FAILED)
+
+    @property
+    def stopped_early(self):
+        """True if ``stop()`` (or ``cancel()``) was asked for, so the result may be short of the full budget"""
+        return self._stop.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job has finished or ``timeout`` seconds passed; True if finished"""
+        self._thread.join(timeout)
+        return self.finished
+
+    def status(self):
+        """Progress snapshot: state, phase, elapsed seconds, budget fraction used and the best plan so far"""
+        with self._lock:
+            best = self.best_routes
+            elapsed = ((self.ended or time.perf_counter()) - self.started) if self.started else 0.0
+            return {
+                'state': self.state,
+                'phase': self.phase,
+                'stopping': self._stop.is_set() and not self.finished,
+                'cancelling': self._cancel.is_set() and not self.finished,
+                'elapsed': elapsed,
+                'fraction': 1.0 if self.finished else min(elapsed / self.time_budget, 1.0) if self.time_budget else 0.0,
+                'best_routes': None if best is None else len(best),
+                'best_stops': None if best is None else _served(best),
+                'best_distance': None if best is None else total_distance(best),
+                'best_cost': None if best is None else total_cost(best),
+            }
+
+    def _progress(self, phase, routes=None):
+        """The ``on_progress`` given to the optimizer: raises once cancelled, True once stopped"""
+        if self._cancel.is_set():
+            raise Cancelled()
+        now = time.perf_counter()
+        snapshot = None
+        if routes is not None and (self._snapshot_at is None or now - self._snapshot_at >= SNAPSHOT_SECONDS):
+            self._snapshot_at = now
+            snapshot = routes()
+        with self._lock:
+            self.phase = phase
+            if snapshot is not None:
+                # Best = most stops served, then cheapest (a multi-start's later starts may do worse)
+                key = (-_served(snapshot), total_cost(snapshot))
+                if self._best_key is None or key < self._best_key:
+                    self._best_key, self.best_routes = key, snapshot
+        return self._stop.is_set()
+
+    def _run(self):
+        optimize, args, kwargs = self._call
+        with instrument.recording(self.profile) as run:
+            try:
+                result = optimize(*args, on_progress=self._progress, **kwargs)
+            except Cancelled:
+                state = CANCELLED
+            except Exception as e:
+                self.error = e
+                state = FAILED
+            else:
+                self.result = result
+                state = DONE
+        with self._lock:
+            self.report = run.report()
+            self.ended = time.perf_counter()
+            self.phase = None
+            self.state = state
+
+
+class ResultCache:
+    """Finished results by key, least recently used dropped beyond ``entries``; safe to share between threads"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The result stored under ``key``, or None"""
+        with self._lock:
+            if key not in self._results:
+                return None
+            self._results.move_to_end(key)
+            return self._results[key]
+
+    def put(self, key, result):
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.entries:
+                self._results.popitem(last=False)
@@ -0,0 +1,465 @@
+"""Local-search improvement of constructed routes - 2-opt, Or-opt, relocate, swap and trip exchange"""
+import math
+import time
+
+import numpy as np
+
+from quickdeliver import instrument
+from quickdeliver.distance import CHUNK_ELEMENTS, travel_minutes
+from quickdeliver.routes import make_route, point_parcels, rebuild_route
+from quickdeliver.time_windows import TimeWindows
+from quickdeliver.trips import depot_hours, prepare_fleet, schedule_vehicle, trip_overhead
+
+DEFAULT_TIME_BUDGET = 2.0  # seconds
+NEIGHBOR_COUNT = 10
+# Moves must save at least this much (km) to count, which avoids cycling on float noise
+MIN_GAIN = 1e-6
+
+
+def neighbor_lists(dist, k=NEIGHBOR_COUNT):
+    """The ``k`` closest stops to every point (depot excluded), nearest first.
+
+    Rows are processed in blocks so the temporary copy stays bounded.
+    """
+    n = len(dist)
+    k = max(0, min(k, n - 2))
+    neighbors = np.empty((n, k), dtype=np.int32)
+    if k == 0:
+        return neighbors
+    rows = max(1, CHUNK_ELEMENTS // n)
+    for start in range(0, n, rows):
+        stop = min(start + rows, n)
+        block = np.array(dist[start:stop], dtype=np.float64)
+        block[:, 0] = np.inf
+        block[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        part = np.argpartition(block, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(block, part, axis=1), axis=1)
+        neighbors[start:stop] = np.take_along_axis(part, order, axis=1)
+    return neighbors
+
+
+class _RouteSet:
+    """Mutable route sequences plus the position lookups the moves need"""
+
+    def __init__(self, routes, dist, parcels, neighbors, windows, shift_start):
+        self.dist = dist
+        self.parcels = parcels
+        self.neighbors = neighbors
+        self.seqs = [[int(i) for i in route['stops']] for route in routes]
+        self.caps = [route['capacity'] for route in routes]
+        # Cost per km of each route's vehicle relative to the fleet mean: moves
+        # between vehicles are weighed in money, and a uniform fleet is all 1.0
+        rates = np.array([route['cost_per_km'] for route in routes], dtype=np.float64)
+        self.rates = (rates / rates.mean()).tolist() if len(rates) and rates.mean() > 0 else [1.0] * len(routes)
+        self.loads = [parcels[seq[1:-1]].sum() for seq in self.seqs]
+        # Spare shift minutes per vehicle, shared by all of its trips
+        self.vehicle_of = [route.get('vehicle_index', r) for r, route in enumerate(routes)]
+        self.slack = {}
+        for r, route in enumerate(routes):
+            v = self.vehicle_of[r]
+            shift = route.get('shift_minutes')
+            spare = self.slack.get(v, math.inf if shift is None else shift)
+            self.slack[v] = spare - route['total_time'] - trip_overhead(route.get('trip', 1))
+        # Trips of each vehicle in running order, for re-timing after a move
+        self.windows = windows
+        self.shift_start = shift_start
+        self.trips_of = {}
+        for r, v in enumerate(self.vehicle_of):
+            self.trips_of.setdefault(v, []).append(r)
+        self.shift_end = {
+            v: shift_start + (routes[trips[0]].get('shift_minutes') or math.inf)
+            for v, trips in self.trips_of.items()
+        }
+        self.schedules = [None] * len(routes)
+        for v in self.trips_of:
+            self.schedules_for(v, {})
+        self.route_of = np.full(len(dist), -1, dtype=np.int64)
+        self.pos_of = np.zeros(len(dist), dtype=np.int64)
+        for r in range(len(self.seqs)):
+            self.reindex(r)
+        self.symmetric = _is_symmetric(dist)
+        # Moves whose change in cost was evaluated, for the instrumentation counters
+        self.candidates = 0
+
+    def reindex(self, r):
+        """Refresh position lookups after route ``r`` changed"""
+        seq = self.seqs[r]
+        customers = np.asarray(seq[1:-1], dtype=np.int64)
+        self.route_of[customers] = r
+        self.pos_of[customers] = np.arange(1, len(seq) - 1)
+
+    def fits_shift(self, changes):
+        """Whether changing route lengths by ``{route: delta_km}`` keeps every shift"""
+        extra = {}
+        for r, delta in changes.items():
+            v = self.vehicle_of[r]
+            extra[v] = extra.get(v, 0.0) + travel_minutes(delta)
+        return all(minutes <= self.slack[v] + 1e-9 for v, minutes in extra.items())
+
+    def spend(self, changes):
+        """Book route length changes ``{route: delta_km}`` against the shifts"""
+        for r, delta in changes.items():
+            self.slack[self.vehicle_of[r]] -= travel_minutes(delta)
+
+    def schedules_for(self, v, changes):
+        """Re-time vehicle ``v`` with ``{route: new_seq}`` applied.
+
+        Returns whether every enforced window and the shift end are still
+        met; the vehicle's trip schedules are stored when they are.
+        """
+        trips = [r for r in self.trips_of[v] if len(changes.get(r, self.seqs[r])) > 2]
+        _, schedules, feasible = schedule_vehicle(
+            [changes.get(r, self.seqs[r]) for r in trips],
+            self.shift_start, self.shift_end[v], self.dist, self.windows
+        )
+        if feasible or not changes:
+            for r in self.trips_of[v]:
+                self.schedules[r] = None
+            for r, schedule in zip(trips, schedules):
+                self.schedules[r] = schedule
+        return feasible
+
+    def retime(self, changes):
+        """Whether new sequences ``{route: new_seq}`` keep the time windows.
+
+        Only the vehicles owning the changed routes are re-simulated, and
+        only once a move is known to save distance, so the exact check stays
+        off the hot path of move evaluation.
+        """
+        vehicles = {self.vehicle_of[r] for r in changes}
+        if not all(self.schedules_for(v, changes) for v in vehicles):
+            for v in vehicles:
+                self.schedules_for(v, {})
+            return False
+        return True
+
+    def can_insert(self, r, at, node):
+        """O(1) time-window pre-check for putting ``node`` at position ``at`` of route ``r``"""
+        schedule = self.schedules[r]
+        return schedule is None or schedule.can_insert(at, node)
+
+    def d(self, a, b):
+        return float(self.dist[a, b])
+
+    def seq_distance(self, seq):
+        return float(self.dist[seq[:-1], seq[1:]].sum(dtype=np.float64))
+
+
+def _is_symmetric(dist, sample=200):
+    """Whether the matrix is symmetric, checked on its leading block"""
+    block = np.asarray(dist[:sample, :sample])
+    return bool(np.allclose(block, block.T))
+
+
+def two_opt(rs, deadline):
+    """Reverse route segments whenever that uncrosses two edges"""
+    moves = 0
+    for r, seq in enumerate(rs.seqs):
+        i = 0
+        while i < len(seq) - 2:
+            if time.perf_counter() > deadline:
+                return moves
+            a, na = seq[i], seq[i + 1]
+            for b in rs.neighbors[a]:
+                if rs.route_of[b] != r:
+                    continue
+                j = int(rs.pos_of[b])
+                if j <= i + 1:
+                    continue
+                nb = seq[j + 1]
+                rs.candidates += 1
+                delta = rs.d(a, b) + rs.d(na, nb) - rs.d(a, na) - rs.d(b, nb)
+                if not rs.symmetric:
+                    segment = seq[i + 1:j + 1]
+                    delta += rs.seq_distance(segment[::-1]) - rs.seq_distance(segment)
+                if delta < -MIN_GAIN and rs.retime({r: seq[:i + 1] + seq[i + 1:j + 1][::-1] + seq[j + 1:]}):
+                    seq[i + 1:j + 1] = seq[i + 1:j + 1][::-1]
+                    rs.reindex(r)
+                    rs.spend({r: delta})
+                    moves += 1
+                    break
+            else:
+                i += 1
+    return moves
+
+
+def or_opt(rs, deadline, max_segment=3):
+    """Move chains of 1-3 consecutive stops to a better place in the same route"""
+    moves = 0
+    for r, seq in enumerate(rs.seqs):
+        for length in range(1, max_segment + 1):
+            i = 1
+            while i + length < len(seq):
+                if time.perf_counter() > deadline:
+                    return moves
+                if _or_opt_at(rs, r, i, length):
+                    moves += 1
+                else:
+                    i += 1
+    return moves
+
+
+def _or_opt_at(rs, r, i, length):
+    """Try to move the chain starting at position ``i``; True if it moved"""
+    seq = rs.seqs[r]
+    first, last = seq[i], seq[i + length - 1]
+    prev, nxt = seq[i - 1], seq[i + length]
+    removal_gain = rs.d(prev, first) + rs.d(last, nxt) - rs.d(prev, nxt)
+    if removal_gain <= MIN_GAIN:
+        return False
+
+    def rest(k):
+        """Stop at position ``k`` of the route once the chain is taken out"""
+        return seq[k] if k < i else seq[k + length]
+
+    best = None
+    for c in np.concatenate([rs.neighbors[first], rs.neighbors[last]]):
+        if rs.route_of[c] != r:
+            continue
+        pc = int(rs.pos_of[c])
+        if i <= pc < i + length:
+            continue
+        pc = pc if pc < i else pc - length
+        # Gap after c and gap before c; gap i - 1 is where the chain came from
+        for gap in (pc, pc - 1):
+            if gap < 0 or gap >= len(seq) - length - 1 or gap == i - 1:
+                continue
+            left, right = rest(gap), rest(gap + 1)
+            options = [(rs.d(left, first) + rs.d(last, right), False)]
+            if rs.symmetric and length > 1:
+                options.append((rs.d(left, last) + rs.d(first, right), True))
+            rs.candidates += len(options)
+            for added, reverse in options:
+                delta = added - rs.d(left, right) - removal_gain
+                if delta < -MIN_GAIN and (best is None or delta < best[0]):
+                    best = (delta, gap + 1, reverse)
+
+    if best is None:
+        return False
+    delta, at, reverse = best
+    chain = seq[i:i + length]
+    if reverse:
+        chain = chain[::-1]
+    moved = seq[:i] + seq[i + length:]
+    moved[at:at] = chain
+    if not rs.retime({r: moved}):
+        return False
+    rs.seqs[r] = moved
+    rs.reindex(r)
+    rs.spend({r: delta})
+    return True
+
+
+def relocate(rs, deadline):
+    """Move single stops into another route where they cost less"""
+    moves = 0
+    empty = [b for b, seq in enumerate(rs.seqs) if len(seq) == 2]
+    for node in np.flatnonzero(rs.route_of >= 0):
+        if time.perf_counter() > deadline:
+            break
+        a = int(rs.route_of[node])
+        seq_a = rs.seqs[a]
+        pa = int(rs.pos_of[node])
+        prev, nxt = seq_a[pa - 1], seq_a[pa + 1]
+        removal_gain = rs.d(prev, node) + rs.d(node, nxt) - rs.d(prev, nxt)
+        demand = rs.parcels[node]
+
+        saved = removal_gain * rs.rates[a]
+
+        best = None
+        for v in rs.neighbors[node]:
+            b = int(rs.route_of[v])
+            if b < 0 or b == a or rs.loads[b] + demand > rs.caps[b]:
+                continue
+            seq_b = rs.seqs[b]
+            pv = int(rs.pos_of[v])
+            rs.candidates += 2
+            for at, left, right in ((pv + 1, v, seq_b[pv + 1]), (pv, seq_b[pv - 1], v)):
+                added = rs.d(left, node) + rs.d(node, right) - rs.d(left, right)
+                delta = added * rs.rates[b] - saved
+                if delta < -MIN_GAIN and (best is None or delta < best[0]):
+                    if rs.fits_shift({a: -removal_gain, b: added}) and rs.can_insert(b, at, node):
+                        best = (delta, b, at, added)
+        # An idle vehicle (the cheapest that can carry it) can take the stop on a fresh depot round trip
+        fits = [b for b in empty if demand <= rs.caps[b]]
+        if fits:
+            b = min(fits, key=rs.rates.__getitem__)
+            rs.candidates += 1
+            added = rs.d(0, node) + rs.d(node, 0)
+            delta = added * rs.rates[b] - saved
+            if delta < -MIN_GAIN and (best is None or delta < best[0]):
+                if rs.fits_shift({a: -removal_gain, b: added}):
+                    best = (delta, b, 1, added)
+
+        if best is not None:
+            _, b, at, added = best
+            seq_b = rs.seqs[b][:at] + [int(node)] + rs.seqs[b][at:]
+            if not rs.retime({a: seq_a[:pa] + seq_a[pa + 1:], b: seq_b}):
+                continue
+            rs.spend({a: -removal_gain, b: added})
+            del seq_a[pa]
+            rs.seqs[b].insert(at, int(node))
+            rs.loads[a] -= demand
+            rs.loads[b] += demand
+            rs.reindex(a)
+            rs.reindex(b)
+            if b in empty:
+                empty.remove(b)
+            if len(seq_a) == 2:
+                empty.append(a)
+            moves += 1
+    return moves
+
+
+def swap(rs, deadline):
+    """Exchange two stops between routes when that makes both routes cheaper overall"""
+    moves = 0
+    for u in np.flatnonzero(rs.route_of >= 0):
+        if time.perf_counter() > deadline:
+            break
+        a = int(rs.route_of[u])
+        for v in rs.neighbors[u]:
+            b = int(rs.route_of[v])
+            if b < 0 or b == a:
+                continue
+            du, dv = rs.parcels[u], rs.parcels[v]
+            if rs.loads[a] - du + dv > rs.caps[a] or rs.loads[b] - dv + du > rs.caps[b]:
+                continue
+            seq_a, seq_b = rs.seqs[a], rs.seqs[b]
+            pu, pv = int(rs.pos_of[u]), int(rs.pos_of[v])
+            rs.candidates += 1
+            ua, ub = seq_a[pu - 1], seq_a[pu + 1]
+            va, vb = seq_b[pv - 1], seq_b[pv + 1]
+            change_a = rs.d(ua, v) + rs.d(v, ub) - rs.d(ua, u) - rs.d(u, ub)
+            change_b = rs.d(va, u) + rs.d(u, vb) - rs.d(va, v) - rs.d(v, vb)
+            if (change_a * rs.rates[a] + change_b * rs.rates[b] < -MIN_GAIN
+                    and rs.fits_shift({a: change_a, b: change_b})):
+                new_a = seq_a[:pu] + [int(v)] + seq_a[pu + 1:]
+                new_b = seq_b[:pv] + [int(u)] + seq_b[pv + 1:]
+                if not rs.retime({a: new_a, b: new_b}):
+                    continue
+                rs.spend({a: change_a, b: change_b})
+                seq_a[pu], seq_b[pv] = int(v), int(u)
+                rs.loads[a] += dv - du
+                rs.loads[b] += du - dv
+                rs.reindex(a)
+                rs.reindex(b)
+                moves += 1
+                break
+    return moves
+
+
+def exchange(rs, deadline):
+    """Hand whole trips to cheaper vehicles: swap the stops of two routes whose vehicles cost differently.
+
+    Swapping trips of lengths ``d_a`` and ``d_b`` between vehicles with
+    rates ``c_a`` and ``c_b`` changes the cost by ``(d_a - d_b)(c_b - c_a)``,
+    so long trips move to cheap vehicles (idle ones included, as empty
+    routes). Does nothing on a fleet with a single cost per km.
+    """
+    moves = 0
+    lengths = [rs.seq_distance(seq) for seq in rs.seqs]
+    for a in sorted(range(len(rs.seqs)), key=lambda r: -lengths[r] * rs.rates[r]):
+        if time.perf_counter() > deadline:
+            break
+        best = None
+        for b in range(len(rs.seqs)):
+            if rs.rates[b] >= rs.rates[a] or rs.vehicle_of[b] == rs.vehicle_of[a]:
+                continue
+            rs.candidates += 1
+            delta = (lengths[a] - lengths[b]) * (rs.rates[b] - rs.rates[a])
+            if delta < -MIN_GAIN and (best is None or delta < best[0]):
+                if (rs.loads[a] <= rs.caps[b] and rs.loads[b] <= rs.caps[a]
+                        and rs.fits_shift({a: lengths[b] - lengths[a], b: lengths[a] - lengths[b]})):
+                    best = (delta, b)
+        if best is None:
+            continue
+        b = best[1]
+        if not rs.retime({a: rs.seqs[b], b: rs.seqs[a]}):
+            continue
+        rs.spend({a: lengths[b] - lengths[a], b: lengths[a] - lengths[b]})
+        rs.seqs[a], rs.seqs[b] = rs.seqs[b], rs.seqs[a]
+        rs.loads[a], rs.loads[b] = rs.loads[b], rs.loads[a]
+        lengths[a], lengths[b] = lengths[b], lengths[a]
+        rs.reindex(a)
+        rs.reindex(b)
+        moves += 1
+    return moves
+
+
+# Improvement operators by name, applied in this order on every pass
+OPERATORS = {
+    'two_opt': two_opt,
+    'or_opt': or_opt,
+    'relocate': relocate,
+    'swap': swap,
+    'exchange': exchange,
+}
+
+
+def improve_routes(routes, points, dist, time_budget=DEFAULT_TIME_BUDGET,
+                   operators=tuple(OPERATORS), neighbors=None, windows=None, vehicles=None, on_progress=None):
+    """Improve routes with local search until no move helps or time runs out.
+
+    Moves are evaluated by their change in cost - distance times the cost
+    per km of the vehicle driving it, which is plain distance on a uniform
+    fleet (delta evaluation) - and only against each stop's nearest
+    neighbours, so a pass costs O(N x NEIGHBOR_COUNT) rather than O(N^2).
+    Moves that pay off are then checked against the time ``windows`` by
+    re-timing the vehicles involved (relocations are pre-screened in O(1)
+    from each trip's time slack). Given the fleet (``vehicles``), vehicles
+    without a route join as empty routes that stops and trips can move to;
+    routes still empty afterwards are dropped by ``schedule_trips``.
+    ``on_progress(phase, routes)`` is called after every operator with a
+    function returning the routes so far; when it returns True the search
+    stops as if the time budget had run out. Returns the improved routes and a stats dict with distance and cost
+    before/after, move counts per operator and the number of candidate
+    moves evaluated.
+    """
+    start = time.perf_counter()
+    deadline = start + time_budget
+    parcels = point_parcels(points)
+    if neighbors is None:
+        neighbors = neighbor_lists(dist)
+    if windows is None:
+        windows = TimeWindows(points)
+    if vehicles is not None:
+        used = {route['vehicle_index'] for route in routes}
+        routes = list(routes) + [make_route(vehicle, [0, 0], dist, parcels)
+                                 for vehicle in prepare_fleet(vehicles, points) if vehicle['index'] not in used]
+
+    rs = _RouteSet(routes, dist, parcels, neighbors, windows, depot_hours(points)[0])
+    moves = dict.fromkeys(operators, 0)
+    passes = 0
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        passes += 1
+        for name in operators:
+            made = OPERATORS[name](rs, deadline)
+            moves[name] += made
+            improved = improved or made > 0
+            if on_progress is not None and on_progress(f"{name} (pass {passes})", lambda: [
+                    rebuild_route(route, list(seq), dist, parcels)
+                    for route, seq in zip(routes, rs.seqs) if len(seq) > 2]):
+                deadline = time.perf_counter()
+                break
+
+    improved_routes = [rebuild_route(route, seq, dist, parcels) for route, seq in zip(routes, rs.seqs)]
+    distance_before = sum(r['total_distance'] for r in routes)
+    distance_after = sum(r['total_distance'] for r in improved_routes)
+    stats = {
+        'distance_before': distance_before,
+        'distance_after': distance_after,
+        'cost_before': sum(r['total_cost'] for r in routes),
+        'cost_after': sum(r['total_cost'] for r in improved_routes),
+        'improvement_pct': (distance_before - distance_after) / distance_before * 100 if distance_before else 0.0,
+        'moves': moves,
+        'candidates': rs.candidates,
+        'passes': passes,
+        'seconds': time.perf_counter() - start,
+        'timed_out': time.perf_counter() >= deadline,
+    }
+    instrument.count('candidate_moves', rs.candidates)
+    instrument.count('moves', sum(moves.values()))
+    return improved_routes, stats
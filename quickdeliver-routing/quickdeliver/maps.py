@@ -0,0 +1,159 @@
+"""Interactive route maps (folium) - per-stop markers, or one GeoJSON layer for large plans"""
+import folium
+
+from quickdeliver.data import route_feature_collection
+from quickdeliver.model import RouteTable, depot_rows
+from quickdeliver.routes import route_label, route_points
+
+# Above this many stops the map switches to high-volume mode: all routes in
+# one GeoJSON layer with a handful of shared styles and popups built in the
+# browser from feature properties, instead of a marker with inline HTML per stop
+MAP_DETAIL_LIMIT = 300
+
+ROUTE_COLORS = ['#00f2fe', '#4facfe', '#00f260', '#0575e6', '#f093fb', '#f5576c', '#fa709a', '#fee140']
+# With several depots every depot gets a hue and its routes take turns through its shades
+DEPOT_PALETTES = [
+    ['#00f2fe', '#4facfe', '#0575e6', '#7ee8fa'],
+    ['#f5576c', '#f093fb', '#fa709a', '#c471f5'],
+    ['#00f260', '#96e6a1', '#0ba360', '#d4fc79'],
+    ['#fee140', '#fa8c3c', '#f7b733', '#ffd86f'],
+]
+
+
+def is_high_volume_map(routes):
+    """Whether the routes have too many stops for per-stop markers"""
+    return routes.totals['stops'] > MAP_DETAIL_LIMIT
+
+
+def route_colors(routes, depots):
+    """Colour of every route: the route colours in turn, or with several depots a shade of its depot's hue"""
+    if len(depots) < 2:
+        return [ROUTE_COLORS[idx % len(ROUTE_COLORS)] for idx in range(len(routes))]
+    starts = routes.column('depot') if isinstance(routes, RouteTable) else [route['stops'][0] for route in routes]
+    rank = {int(depot): k for k, depot in enumerate(depots)}
+    used = [0] * len(depots)
+    colors = []
+    for depot in starts:
+        k = rank[int(depot)]
+        palette = DEPOT_PALETTES[k % len(DEPOT_PALETTES)]
+        colors.append(palette[used[k] % len(palette)])
+        used[k] += 1
+    return colors
+
+
+def depot_color(k, depots):
+    """Marker colour of the ``k``-th depot"""
+    return '#00f2fe' if len(depots) < 2 else DEPOT_PALETTES[k % len(DEPOT_PALETTES)][0]
+
+
+def add_routes_layer(m, routes, collection_points, colors):
+    """High-volume rendering: every route's FeatureCollection merged into one GeoJSON layer; ``colors`` per route"""
+    features = []
+    for idx, route in enumerate(routes):
+        for feature in route_feature_collection(route, collection_points)['features']:
+            feature['id'] = len(features)
+            feature['properties']['color'] = colors[idx]
+            features.append(feature)
+    fields = ['name', 'stop', 'parcels', 'time_window', 'arrival', 'vehicle']
+    aliases = ['Location', 'Stop', 'Parcels', 'Time Window', 'Arrival', 'Vehicle']
+    folium.GeoJson(
+        {'type': 'FeatureCollection', 'features': features},
+        name="Routes",
+        style_function=lambda feature: {
+            'color': feature['properties']['color'], 'weight': 3, 'opacity': 0.9,
+            'fillColor': feature['properties']['color'], 'fillOpacity': 0.8
+        },
+        marker=folium.CircleMarker(radius=5, fill=True),
+        popup=folium.GeoJsonPopup(fields=fields, aliases=aliases),
+        tooltip=folium.GeoJsonTooltip(fields=['name', 'vehicle'], aliases=['Location', 'Vehicle'])
+    ).add_to(m)
+
+
+def create_route_map(routes, collection_points):
+    """Create an interactive map with optimized routes - DARK THEME"""
+    depots = depot_rows(collection_points)
+    depot = collection_points[0]
+    m = folium.Map(
+        location=[depot['lat'], depot['lon']], 
+        zoom_start=11,
+        tiles='CartoDB dark_matter'  # DARK MAP THEME
+    )
+    if len(depots) > 1:
+        m.fit_bounds([[collection_points[d]['lat'], collection_points[d]['lon']] for d in depots], padding=(40, 40))
+    
+    colors = route_colors(routes, depots)
+    
+    # Depot markers with HIGH CONTRAST popups, in their depot's colour
+    for k, row in enumerate(depots):
+        depot = collection_points[row]
+        accent = depot_color(k, depots)
+        label = 'Central Depot' if len(depots) < 2 else depot['name']
+        folium.Marker(
+            [depot['lat'], depot['lon']],
+            popup=folium.Popup(
+                f"""
+                <div style='font-family: Arial; padding: 10px; background-color: #1a1f2e; border: 2px solid {accent}; border-radius: 8px;'>
+                    <h4 style='color: {accent}; margin: 0 0 10px 0;'>{depot['name']}</h4>
+                    <p style='color: #ffffff; margin: 5px 0;'><b>Operating Hours:</b></p>
+                    <p style='color: #ffffff; margin: 0;'>{depot['time_start']} - {depot['time_end']}</p>
+                </div>
+                """,
+                max_width=300
+            ),
+            tooltip=folium.Tooltip(f'🏢 {label} (Start/End)', style=f'color: #000000; background-color: {accent}; font-weight: bold;'),
+            icon=folium.Icon(color='black', icon='home', prefix='fa')
+        ).add_to(m)
+    
+    if is_high_volume_map(routes):
+        add_routes_layer(m, routes, collection_points, colors)
+        return m
+    
+    for idx, route in enumerate(routes):
+        color = colors[idx]
+        points = route_points(route, collection_points)
+        depot_line = f"<p style='color: #ffffff; margin: 5px 0;'><b>Depot:</b> {points[0]['name']}</p>" if len(depots) > 1 else ''
+        
+        route_coords = [[p['lat'], p['lon']] for p in points]
+        
+        # Route line with HIGH CONTRAST tooltip
+        folium.PolyLine(
+            route_coords,
+            color=color,
+            weight=5,
+            opacity=0.9,
+            tooltip=folium.Tooltip(
+                f"<b>{route_label(route)}</b><br>Distance: {route['total_distance']:.2f} km<br>Parcels: {route['total_parcels']}<br>Cost: ${route['total_cost']:.2f}",
+                style='color: #000000; background-color: #ffffff; font-weight: bold; padding: 8px; border-radius: 5px;'
+            )
+        ).add_to(m)
+        
+        # Collection point markers with HIGH CONTRAST popups
+        for order, point in enumerate(points[1:-1], 1):
+            folium.CircleMarker(
+                [point['lat'], point['lon']],
+                radius=10,
+                popup=folium.Popup(
+                    f"""
+                    <div style='font-family: Arial; padding: 12px; background-color: #1a1f2e; border: 2px solid {color}; border-radius: 8px; min-width: 200px;'>
+                        <h4 style='color: {color}; margin: 0 0 10px 0; font-size: 16px;'>{point['name']}</h4>
+                        <p style='color: #ffffff; margin: 5px 0;'><b>Stop Number:</b> {order}</p>
+                        <p style='color: #ffffff; margin: 5px 0;'><b>Parcels:</b> {point['parcels']}</p>
+                        <p style='color: #ffffff; margin: 5px 0;'><b>Time Window:</b> {point['time_start']} - {point['time_end']}</p>
+                        <p style='color: {color}; margin: 5px 0;'><b>Vehicle:</b> {route_label(route)}</p>
+                        {depot_line}
+                    </div>
+                    """,
+                    max_width=300
+                ),
+                tooltip=folium.Tooltip(
+                    f"<b>Stop {order}:</b> {point['name']}",
+                    style='color: #000000; background-color: #ffffff; font-weight: bold; padding: 5px; border-radius: 3px;'
+                ),
+                color=color,
+                fill=True,
+                fillColor=color,
+                fillOpacity=0.8,
+                weight=3
+            ).add_to(m)
+    
+    return m
@@ -0,0 +1,160 @@
+"""Persistent distance matrices - memory-mapped .npy files keyed by stable point ids.
+
+Collection points change little from day to day, so the last matrix is
+kept on disk together with the ``point_keys`` of its rows. Loading today's
+points copies the rows of points that are still there, computes the rows
+and columns of new points only, and drops removed ones. When the points
+haven't changed at all, the stored file is returned memory-mapped as it
+is - nothing is computed or copied.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from quickdeliver import instrument
+from quickdeliver.distance import CHUNK_ELEMENTS, departure_bucket, distance_rows, point_coordinates
+from quickdeliver.traffic import TrafficModel, point_keys
+
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'quickdeliver', 'matrices')
+# Rows copied from the old matrix per block, bounding temporaries when points are reordered
+COPY_ROWS = 1024
+CURRENT = 'current.json'
+
+
+class MatrixStore:
+    """Distance matrices on disk under ``root``, one per traffic/road profile.
+
+    A profile folder holds the latest matrix (``<digest>.npy``, float32),
+    the keys of its rows (``<digest>.keys.npy``) and ``current.json``
+    naming both; the pointer file is replaced atomically, so readers always
+    see a matrix with its own keys.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+
+    def folder(self, traffic, bucket, roads=None):
+        """Profile folder: matrices are only reused for the same traffic seed, hour and road graph"""
+        profile = (f"seed={traffic.seed}|table={traffic.table_size}|bucket={bucket}|"
+                   f"roads={'none' if roads is None else roads.fingerprint}")
+        return os.path.join(self.root, hashlib.blake2b(profile.encode('utf-8'), digest_size=8).hexdigest())
+
+    def open(self, folder):
+        """``(keys, matrix)`` stored in ``folder``, the matrix memory-mapped read-only; ``(None, None)`` if absent"""
+        try:
+            with open(os.path.join(folder, CURRENT), encoding='utf-8') as f:
+                current = json.load(f)
+            keys = np.load(os.path.join(folder, current['keys']))
+            matrix = np.load(os.path.join(folder, current['matrix']), mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return None, None
+        if matrix.shape != (len(keys), len(keys)):
+            return None, None
+        return keys, matrix
+
+    def matrix(self, points, traffic=None, bucket=None, roads=None):
+        """Matrix for ``points`` as ``build_distance_matrix`` gives it, reusing the stored one.
+
+        Returns ``(matrix, stats)``: the matrix is a read-only memory map
+        of the stored file (a copy only if ``points`` repeats a point), and
+        ``stats`` counts the points ``reused``, ``computed`` and
+        ``removed``. The stored matrix is replaced by the new one.
+        """
+        with instrument.stage('distance'):
+            return self._matrix(points, traffic, bucket, roads)
+
+    def _matrix(self, points, traffic, bucket, roads):
+        if traffic is None:
+            traffic = TrafficModel()
+        if bucket is None:
+            bucket = departure_bucket(points)
+        keys = point_keys(points)
+        first = np.sort(np.unique(keys, return_index=True)[1])
+        distinct = keys[first]
+        folder = self.folder(traffic, bucket, roads)
+        stored_keys, stored = self.open(folder)
+
+        if stored is not None and np.array_equal(stored_keys, distinct):
+            matrix, reused, computed = stored, len(distinct), 0
+        else:
+            src = _lookup(stored_keys, distinct)
+            kept = np.flatnonzero(src >= 0)
+            new = np.flatnonzero(src < 0)
+            lats, lons = point_coordinates(points)
+            matrix = self._write(folder, distinct, stored, src, kept, new,
+                                 lambda rows: distance_rows(lats[first], lons[first], distinct, rows,
+                                                            traffic, bucket, np.float32, roads))
+            reused, computed = len(kept), len(new)
+
+        instrument.count('matrix_store_rows_reused', reused)
+        stats = {
+            'reused': reused,
+            'computed': computed,
+            'removed': 0 if stored_keys is None else len(stored_keys) - reused,
+        }
+        if len(first) < len(keys):
+            pos = np.searchsorted(distinct, keys, sorter=np.argsort(distinct))
+            rows = np.argsort(distinct)[pos]
+            matrix = np.asarray(matrix[np.ix_(rows, rows)])
+        return matrix, stats
+
+    def _write(self, folder, keys, stored, src, kept, new, compute):
+        """Write the matrix for ``keys`` and make it current; returns it memory-mapped.
+
+        Rows and columns ``kept`` are copied from ``stored`` (at rows
+        ``src``); those of ``new`` come from ``compute(rows)`` in blocks.
+        """
+        os.makedirs(folder, exist_ok=True)
+        digest = hashlib.blake2b(keys.tobytes(), digest_size=16).hexdigest()
+        names = {'matrix': f"{digest}.npy", 'keys': f"{digest}.keys.npy"}
+        partial = {field: os.path.join(folder, f"{name}.{os.getpid()}.tmp") for field, name in names.items()}
+
+        matrix = np.lib.format.open_memmap(partial['matrix'], mode='w+', dtype=np.float32,
+                                           shape=(len(keys), len(keys)))
+        for start in range(0, len(kept), COPY_ROWS):
+            block = kept[start:start + COPY_ROWS]
+            matrix[block[:, None], kept] = stored[src[block][:, None], src[kept]]
+        step = max(1, CHUNK_ELEMENTS // max(len(keys), 1))
+        for start in range(0, len(new), step):
+            block = new[start:start + step]
+            rows, columns = compute(block)
+            matrix[block] = rows
+            if len(kept):
+                matrix[kept[:, None], block] = columns[kept]
+        matrix.flush()
+        del matrix
+        with open(partial['keys'], 'wb') as f:
+            np.save(f, keys)
+
+        previous = self._current(folder)
+        for field, name in names.items():
+            os.replace(partial[field], os.path.join(folder, name))
+        pointer = os.path.join(folder, f"{CURRENT}.{os.getpid()}.tmp")
+        with open(pointer, 'w', encoding='utf-8') as f:
+            json.dump(names, f)
+        os.replace(pointer, os.path.join(folder, CURRENT))
+        for name in set(previous.values()) - set(names.values()):
+            try:
+                os.remove(os.path.join(folder, name))
+            except OSError:
+                pass  # still mapped elsewhere (Windows); left for the next write
+        return np.load(os.path.join(folder, names['matrix']), mmap_mode='r')
+
+    def _current(self, folder):
+        try:
+            with open(os.path.join(folder, CURRENT), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+def _lookup(stored_keys, keys):
+    """Row of each key in ``stored_keys``, -1 where it isn't stored"""
+    if stored_keys is None or not len(stored_keys):
+        return np.full(len(keys), -1, dtype=np.int64)
+    order = np.argsort(stored_keys)
+    at = np.minimum(np.searchsorted(stored_keys, keys, sorter=order), len(order) - 1)
+    rows = order[at]
+    return np.where(stored_keys[rows] == keys, rows, -1)
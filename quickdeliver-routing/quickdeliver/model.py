@@ -0,0 +1,328 @@
+"""Columnar data model - one NumPy array per field instead of a dict per point, vehicle or route"""
+import numpy as np
+import pandas as pd
+
+from quickdeliver.traffic import format_hhmm, parse_hhmm_array
+
+DAY_MINUTES = 24 * 60
+
+# Fields every point exposes, in display order
+POINT_FIELDS = ('name', 'lat', 'lon', 'parcels', 'time_start', 'time_end')
+
+
+class PointTable:
+    """Collection points stored as column arrays; row 0 is the depot.
+
+    Indexing (``table[i]``) and iteration give one point as a dict, so code
+    written for lists of point dicts keeps working, while the engine reads
+    whole columns with ``column()``. Time windows are kept as minutes after
+    midnight (``window_start``/``window_end``) and formatted on access.
+    ``depot``, when set, flags further depots among the rows (see ``depot_rows``).
+    """
+
+    def __init__(self, name, lat, lon, parcels, window_start, window_end, day=None, depot=None):
+        self.name = np.asarray(name, dtype=object)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.parcels = np.asarray(parcels, dtype=np.int32)
+        self.window_start = np.asarray(window_start, dtype=np.int16)
+        self.window_end = np.asarray(window_end, dtype=np.int16)
+        self.day = None if day is None else np.asarray(day, dtype=object)
+        self.depot = None if depot is None else np.asarray(depot, dtype=bool)
+
+    @classmethod
+    def from_records(cls, points):
+        """Table from a list of point dicts (time windows as 'HH:MM', ``depot`` optional)"""
+        start, end = window_minutes(points)
+        depot = [bool(p.get('depot')) for p in points]
+        return cls(
+            [p['name'] for p in points], [p['lat'] for p in points], [p['lon'] for p in points],
+            [p['parcels'] for p in points], start, end, depot=depot if any(depot[1:]) else None
+        )
+
+    def __len__(self):
+        return len(self.name)
+
+    def __getitem__(self, i):
+        point = {
+            'name': self.name[i],
+            'lat': float(self.lat[i]),
+            'lon': float(self.lon[i]),
+            'parcels': int(self.parcels[i]),
+            'time_start': format_hhmm(self.window_start[i]),
+            'time_end': format_hhmm(self.window_end[i])
+        }
+        if self.day is not None:
+            point['day'] = self.day[i]
+        if self.depot is not None:
+            point['depot'] = bool(self.depot[i])
+        return point
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def column(self, field):
+        """Values of one field for every point, as an array"""
+        if field == 'time_start':
+            return np.array([format_hhmm(m) for m in self.window_start], dtype=object)
+        if field == 'time_end':
+            return np.array([format_hhmm(m) for m in self.window_end], dtype=object)
+        return getattr(self, field)
+
+    def append(self, point):
+        """Add one point dict at the end (arrays are copied, so keep this for single edits)"""
+        (start,), (end,) = window_minutes([point])
+        self.name = np.append(self.name, np.array([point['name']], dtype=object))
+        self.lat = np.append(self.lat, point['lat'])
+        self.lon = np.append(self.lon, point['lon'])
+        self.parcels = np.append(self.parcels, np.int32(point['parcels']))
+        self.window_start = np.append(self.window_start, np.int16(start))
+        self.window_end = np.append(self.window_end, np.int16(end))
+        if self.day is not None:
+            self.day = np.append(self.day, np.array([point.get('day', '')], dtype=object))
+        if self.depot is not None:
+            self.depot = np.append(self.depot, bool(point.get('depot')))
+
+    def take(self, rows):
+        """Table of the points at ``rows`` (an index array), in that order"""
+        return PointTable(self.name[rows], self.lat[rows], self.lon[rows], self.parcels[rows],
+                          self.window_start[rows], self.window_end[rows],
+                          None if self.day is None else self.day[rows],
+                          None if self.depot is None else self.depot[rows])
+
+    def to_frame(self):
+        """DataFrame with the usual point columns, for display and export"""
+        fields = POINT_FIELDS + tuple(field for field in ('day', 'depot') if getattr(self, field) is not None)
+        return pd.DataFrame({field: self.column(field) for field in fields})
+
+    def arrays(self):
+        """Every stored column, for hashing and serialization"""
+        arrays = [self.name.astype(str), self.lat, self.lon, self.parcels, self.window_start, self.window_end]
+        if self.day is not None:
+            arrays.append(self.day.astype(str))
+        if self.depot is not None:
+            arrays.append(self.depot)
+        return arrays
+
+
+def window_minutes(points):
+    """Window start/end minutes of point dicts; missing or invalid means the whole day"""
+    start = parse_hhmm_array([p.get('time_start') for p in points])
+    end = parse_hhmm_array([p.get('time_end') for p in points])
+    return np.nan_to_num(start, nan=0), np.nan_to_num(end, nan=DAY_MINUTES)
+
+
+def depot_rows(points):
+    """Rows of the depots: row 0, plus any row flagged ``depot``"""
+    if isinstance(points, PointTable):
+        flags = np.zeros(len(points), dtype=bool) if points.depot is None else points.depot.copy()
+    else:
+        flags = np.array([bool(p.get('depot')) for p in points], dtype=bool)
+    if len(flags):
+        flags[0] = True
+    return np.flatnonzero(flags)
+
+
+def point_column(points, field, dtype=None):
+    """One field of every point as an array, from a PointTable or a list of point dicts"""
+    if isinstance(points, PointTable):
+        values = points.column(field)
+        return values if dtype is None else values.astype(dtype, copy=False)
+    return np.asarray([p[field] for p in points], dtype=dtype)
+
+
+class VehicleTable:
+    """Vehicles as column arrays; ``table[i]`` gives one vehicle as a dict"""
+
+    FIELDS = ('id', 'capacity', 'fuel_efficiency', 'cost_per_km', 'shift_minutes')
+
+    def __init__(self, id, capacity, fuel_efficiency, cost_per_km, shift_minutes=None):
+        self.id = np.asarray(id, dtype=object)
+        self.capacity = np.asarray(capacity, dtype=np.int32)
+        self.fuel_efficiency = np.asarray(fuel_efficiency, dtype=np.float64)
+        self.cost_per_km = np.asarray(cost_per_km, dtype=np.float64)
+        # NaN: no shift limit of its own
+        self.shift_minutes = (np.full(len(self.id), np.nan) if shift_minutes is None
+                              else np.asarray(shift_minutes, dtype=np.float64))
+
+    @classmethod
+    def from_records(cls, vehicles):
+        """Table from vehicle dicts (``shift_minutes`` optional)"""
+        shift = [v.get('shift_minutes') for v in vehicles]
+        return cls(
+            [v['id'] for v in vehicles], [v['capacity'] for v in vehicles],
+            [v['fuel_efficiency'] for v in vehicles], [v['cost_per_km'] for v in vehicles],
+            [np.nan if m is None else m for m in shift]
+        )
+
+    def __len__(self):
+        return len(self.id)
+
+    def __getitem__(self, i):
+        shift = float(self.shift_minutes[i])
+        return {
+            'id': self.id[i],
+            'capacity': int(self.capacity[i]),
+            'fuel_efficiency': float(self.fuel_efficiency[i]),
+            'cost_per_km': float(self.cost_per_km[i]),
+            'shift_minutes': None if np.isnan(shift) else shift
+        }
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class RouteView:
+    """One row of a ``RouteTable``, read like the route dict it was built from.
+
+    ``view['total_distance']``, ``view.get('trip')`` and
+    ``view.total_distance`` all work; nothing is copied until a field is
+    read, and the stop/time arrays are rebuilt with the route's depot at both ends.
+    """
+
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, key):
+        return self.table.value(self.row, key)
+
+    def __getattr__(self, key):
+        if key in RouteView.__slots__:
+            raise AttributeError(key)
+        try:
+            return self.table.value(self.row, key)
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def get(self, key, default=None):
+        try:
+            return self.table.value(self.row, key)
+        except KeyError:
+            return default
+
+    def keys(self):
+        return RouteTable.KEYS
+
+    def to_dict(self):
+        """Plain route dict, as the construction and improvement code builds them"""
+        return {key: self[key] for key in RouteTable.KEYS}
+
+
+class RouteTable:
+    """Solved routes as column arrays, iterated as ``RouteView`` rows.
+
+    Every route's stops (without its depot, which it starts and ends at
+    and which is kept per route in ``depot``) are concatenated into one int32 array addressed by
+    ``offsets``, and per-stop times into float arrays alongside it. The
+    per-route aggregates are one array per field, so totals and chart series
+    are plain array reads, and vehicle fields live once in a
+    ``VehicleTable`` instead of in every route.
+    """
+
+    # Per-route scalar columns and their dtypes
+    COLUMNS = {
+        'vehicle_index': np.int32, 'trip': np.int16,
+        'total_parcels': np.int64, 'total_distance': np.float64, 'total_time': np.float64,
+        'total_cost': np.float64, 'fuel_used': np.float64,
+        'start_time': np.float64, 'end_time': np.float64, 'wait_time': np.float64,
+        'late_stops': np.int32, 'late_minutes': np.float64, 'time_feasible': np.bool_,
+        'depot': np.int32,
+    }
+    VEHICLE_KEYS = {'vehicle_id': 'id', 'capacity': 'capacity', 'fuel_efficiency': 'fuel_efficiency',
+                    'cost_per_km': 'cost_per_km', 'shift_minutes': 'shift_minutes'}
+    STOP_KEYS = ('stops', 'arrival', 'wait', 'departure')
+    KEYS = tuple(COLUMNS) + tuple(VEHICLE_KEYS) + STOP_KEYS
+
+    def __init__(self, columns, vehicles, vehicle_rows, offsets, stops, arrival, wait, departure):
+        self.columns = columns
+        self.vehicles = vehicles
+        self.vehicle_rows = vehicle_rows
+        self.offsets = offsets
+        self.stops = stops
+        self.arrival = arrival
+        self.wait = wait
+        self.departure = departure
+        self.totals = {
+            'routes': len(self),
+            'stops': len(stops),
+            'distance': float(columns['total_distance'].sum()),
+            'cost': float(columns['total_cost'].sum()),
+            'time': float(columns['total_time'].sum()),
+            'fuel': float(columns['fuel_used'].sum()),
+            'parcels': int(columns['total_parcels'].sum()),
+        }
+
+    @classmethod
+    def from_routes(cls, routes):
+        """Pack scheduled route dicts (see ``schedule_trips``) into a table"""
+        columns = {
+            key: np.array([route['stops'][0] if key == 'depot' else route.get(key, 0) for route in routes],
+                          dtype=dtype)
+            for key, dtype in cls.COLUMNS.items()
+        }
+        fleet, first, vehicle_rows = np.unique(columns['vehicle_index'], return_index=True, return_inverse=True)
+        vehicles = VehicleTable.from_records([
+            {field: routes[r][key] for key, field in cls.VEHICLE_KEYS.items()} for r in first
+        ])
+        lengths = np.array([len(route['stops']) - 2 for route in routes], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+        def inner(key, dtype):
+            parts = [np.asarray(route[key][1:-1], dtype=dtype) for route in routes]
+            return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+        return cls(columns, vehicles, vehicle_rows.astype(np.int32), offsets,
+                   inner('stops', np.int32), inner('arrival', np.float64),
+                   inner('wait', np.float64), inner('departure', np.float64))
+
+    def __len__(self):
+        return len(self.vehicle_rows)
+
+    def __getitem__(self, row):
+        if not -len(self) <= row < len(self):
+            raise IndexError(row)
+        return RouteView(self, row % len(self))
+
+    def __iter__(self):
+        return (RouteView(self, row) for row in range(len(self)))
+
+    def column(self, key):
+        """One per-route field for every route, as an array"""
+        if key in self.COLUMNS:
+            return self.columns[key]
+        if key in self.VEHICLE_KEYS:
+            return getattr(self.vehicles, self.VEHICLE_KEYS[key])[self.vehicle_rows]
+        raise KeyError(key)
+
+    def value(self, row, key):
+        """One field of one route, in the form a route dict holds it"""
+        if key in self.COLUMNS:
+            return self.columns[key][row].item()
+        if key in self.VEHICLE_KEYS:
+            return self.vehicles[self.vehicle_rows[row]][self.VEHICLE_KEYS[key]]
+        if key in self.STOP_KEYS:
+            lo, hi = self.offsets[row], self.offsets[row + 1]
+            if key == 'stops':
+                depot = self.columns['depot'][row]
+                return np.concatenate([[depot], self.stops[lo:hi], [depot]]).astype(np.int32)
+            start, end = self.columns['start_time'][row], self.columns['end_time'][row]
+            if key == 'wait':
+                return np.concatenate([[0.0], self.wait[lo:hi], [0.0]])
+            return np.concatenate([[start], getattr(self, key)[lo:hi], [end]])
+        raise KeyError(key)
+
+    def to_routes(self):
+        """Route dicts again, e.g. to modify a solved plan"""
+        columns = {key: values.tolist() for key, values in self.columns.items()}
+        vehicles = list(self.vehicles)
+        routes = []
+        for row in range(len(self)):
+            vehicle = vehicles[self.vehicle_rows[row]]
+            route = {key: values[row] for key, values in columns.items()}
+            route.update((key, vehicle[field]) for key, field in self.VEHICLE_KEYS.items())
+            route.update((key, self.value(row, key)) for key in self.STOP_KEYS)
+            routes.append(route)
+        return routes
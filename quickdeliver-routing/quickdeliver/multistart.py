@@ -0,0 +1,132 @@
+"""Multi-start optimization - randomized constructions plus local search on several CPU cores"""
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from quickdeliver import instrument
+from quickdeliver.distance import build_distance_matrix
+from quickdeliver.local_search import DEFAULT_TIME_BUDGET
+from quickdeliver.solver import solve
+
+DEFAULT_STARTS_PER_WORKER = 2
+
+# Per-process state set up once by the pool initializer
+_worker = {}
+
+
+def default_workers():
+    """Number of CPU cores available to this process"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def solution_key(solution):
+    """Sort key for solutions: fewest unassigned stops, least lateness, lowest cost"""
+    return (len(solution['unassigned']), solution['time_windows']['late_minutes'], solution['final_cost'])
+
+
+def _vehicle_order(n, start, seed):
+    """Vehicle order for one start; start 0 keeps the order given"""
+    if start == 0:
+        return list(range(n))
+    return np.random.default_rng([seed, start]).permutation(n).tolist()
+
+
+def _solve_start(points, vehicles, dist, start, seed, time_budget, options):
+    """One start: permuted fleet, randomized construction (except start 0), local search"""
+    order = _vehicle_order(len(vehicles), start, seed)
+    solution = solve(points, [vehicles[v] for v in order], dist, time_budget=time_budget,
+                     seed=None if start == 0 else [seed, start], **options)
+    # Map vehicle positions in the permuted fleet back to the caller's list
+    for route in solution['routes']:
+        route['vehicle_index'] = order[route['vehicle_index']]
+    solution['routes'].sort(key=lambda r: (r['vehicle_index'], r['trip']))
+    solution['start'] = start
+    return solution
+
+
+def _init_worker(matrix_path, points, vehicles, options):
+    """Map the shared distance matrix read-only and keep the instance for later tasks"""
+    _worker.update(
+        dist=np.load(matrix_path, mmap_mode='r'),
+        points=points,
+        vehicles=vehicles,
+        options=options
+    )
+
+
+def _run_start(start, seed, time_budget):
+    return _solve_start(_worker['points'], _worker['vehicles'], _worker['dist'],
+                        start, seed, time_budget, _worker['options'])
+
+
+def multistart_solve(points, vehicles, dist=None, workers=None, starts=None,
+                     time_budget=DEFAULT_TIME_BUDGET, seed=0, on_progress=None, **options):
+    """Run several randomized starts in parallel and keep the best solution.
+
+    Start 0 is the plain deterministic run, so the result is never worse
+    than ``solve``; the others permute the fleet order and add noise to the
+    construction. Starts run on a ``ProcessPoolExecutor`` of ``workers``
+    processes, and the distance matrix is written once to a temporary .npy
+    file that every worker memory-maps read-only instead of receiving a
+    pickled copy per task. ``time_budget`` (seconds) is the wall-clock
+    budget: each start's local search gets an equal share of it, and starts
+    not yet running when it is spent are cancelled. ``options`` are passed
+    on to ``solve``. ``on_progress`` is as for ``solve``: with one worker it
+    follows each start, otherwise it hears of every finished start (with
+    the best routes so far), and returning True cancels the starts not yet
+    running. The best solution (see ``solution_key``) gets a
+    ``multistart`` stats entry.
+    """
+    if dist is None:
+        dist = build_distance_matrix(points)
+    workers = max(1, workers or default_workers())
+    starts = max(1, starts or workers * DEFAULT_STARTS_PER_WORKER)
+    begin = time.perf_counter()
+    deadline = begin + time_budget
+    start_budget = min(time_budget, time_budget * workers / starts)
+
+    solutions = []
+    if workers == 1:
+        for start in range(starts):
+            if start and (time.perf_counter() >= deadline
+                          or on_progress is not None and on_progress(f"start {start + 1}/{starts}")):
+                break
+            solutions.append(_solve_start(points, vehicles, dist, start, seed, start_budget,
+                                          {**options, 'on_progress': on_progress}))
+    else:
+        with tempfile.TemporaryDirectory(prefix='quickdeliver-') as tmp:
+            matrix_path = os.path.join(tmp, 'dist.npy')
+            np.save(matrix_path, dist)
+            with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                     initargs=(matrix_path, points, vehicles, options)) as pool, \
+                    instrument.stage('multistart'):
+                futures = [pool.submit(_run_start, start, seed, start_budget) for start in range(starts)]
+                try:
+                    for future in as_completed(futures):
+                        if future.cancelled():
+                            continue
+                        solutions.append(future.result())
+                        if (time.perf_counter() >= deadline or on_progress is not None and on_progress(
+                                f"{len(solutions)}/{starts} starts", lambda: min(solutions, key=solution_key)['routes'])):
+                            for pending in futures:
+                                pending.cancel()
+                finally:
+                    # Aborted (an error or a cancelled job): don't wait for starts that haven't begun
+                    for pending in futures:
+                        pending.cancel()
+
+    best = min(solutions, key=solution_key)
+    best['multistart'] = {
+        'workers': workers,
+        'starts': len(solutions),
+        'best_start': best['start'],
+        'distances': sorted(s['final_distance'] for s in solutions),
+        'seconds': time.perf_counter() - begin,
+    }
+    return best
@@ -0,0 +1,130 @@
+"""Route construction algorithms"""
+import numpy as np
+
+from quickdeliver.distance import build_distance_matrix, point_coordinates
+from quickdeliver.routes import make_route, point_parcels
+from quickdeliver.spatial_index import GridIndex
+from quickdeliver.time_windows import LATE_PENALTY_KM_PER_MINUTE, MINUTES_PER_KM, TimeWindows
+from quickdeliver.traffic import MIN_TRAFFIC_FACTOR
+from quickdeliver.trips import depot_hours, prepare_fleet, schedule_trips, trip_overhead
+
+# Randomized constructions (multi-start) scale each candidate's score by a
+# random factor in [1, 1 + RANDOMIZED_NOISE)
+RANDOMIZED_NOISE = 0.3
+
+
+def _nearest_feasible(index, dist, current, lats, lons, capacity_left, clock, shift_end, windows, rng=None):
+    """Closest unassigned stop (by matrix distance) that fits the vehicle now.
+
+    A candidate must fit the remaining capacity, be reached before its
+    window closes when leaving ``current`` at ``clock``, and leave time to
+    get back to the depot by ``shift_end``; the checks run vectorized over
+    each batch of candidates. With soft windows a late arrival counts as
+    extra distance. Walks the spatial index outward from the current stop
+    and stops once no unvisited ring can beat the best score found, since
+    a leg is never shorter than its great-circle distance times the
+    minimum traffic factor (random noise only makes scores larger, so this
+    still holds with ``rng``). Returns the stop and its leg distance.
+    """
+    nearest = None
+    leg = min_score = float('inf')
+    for bound, candidates in index.iter_nearest(lats[current], lons[current], capacity_left):
+        if bound * MIN_TRAFFIC_FACTOR >= min_score:
+            break
+        row = dist[current, candidates]
+        arrival = clock + row.astype(np.float64) * MINUTES_PER_KM
+        start = np.maximum(arrival, windows.earliest[candidates])
+        back = start + windows.service[candidates] + dist[candidates, 0].astype(np.float64) * MINUTES_PER_KM
+        late = np.maximum(arrival - windows.window_latest[candidates], 0)
+        score = np.where((arrival <= windows.latest[candidates]) & (back <= shift_end),
+                         row + late * LATE_PENALTY_KM_PER_MINUTE, np.inf)
+        if rng is not None:
+            score = score * (1 + RANDOMIZED_NOISE * rng.random(len(score)))
+        best = int(np.argmin(score))
+        if score[best] < min_score:
+            nearest = int(candidates[best])
+            min_score = float(score[best])
+            leg = float(row[best])
+    return nearest, leg
+
+
+def nearest_neighbor_algorithm(points, vehicles, dist=None, windows=None, rng=None):
+    """Nearest neighbor algorithm with capacity constraints and multi-trip vehicles.
+
+    ``dist`` is the matrix from ``build_distance_matrix(points)``; it is built
+    here when not supplied and reused for every trip. Stops are handled as
+    integer indices: unassigned stops are tracked in a boolean mask shared
+    with the spatial index, so candidates near the current stop are found
+    without scanning every remaining point and assigning a stop is O(1).
+
+    Vehicles go out in waves: every vehicle builds one trip per wave, and
+    keeps doing further depot round-trips while stops remain and its shift
+    has time left. Each trip keeps a running clock so stops are only taken
+    while their time window (``windows``, built from the points when not
+    supplied) can still be met. With a NumPy ``rng`` candidate scores get
+    random noise, giving a different construction per seed for multi-start.
+    """
+    if dist is None:
+        dist = build_distance_matrix(points)
+    if windows is None:
+        windows = TimeWindows(points)
+
+    parcels = point_parcels(points)
+    lats, lons = point_coordinates(points)
+    unassigned = np.ones(len(points), dtype=bool)
+    unassigned[0] = False
+    remaining = GridIndex(lats, lons, demands=parcels, alive=unassigned)
+    fleet = prepare_fleet(vehicles, points)
+    shift_start, _ = depot_hours(points)
+    ready = [float(shift_start)] * len(fleet)
+    trips = [0] * len(fleet)
+    routes = []
+
+    progress = True
+    while len(remaining) and progress:
+        progress = False
+        for v, vehicle in enumerate(fleet):
+            if not len(remaining):
+                break
+            shift_end = shift_start + vehicle['shift_minutes']
+            start = ready[v] + trip_overhead(trips[v] + 1)
+            stops, end = _build_trip(remaining, dist, lats, lons, parcels, vehicle['capacity'],
+                                     start, shift_end, windows, rng)
+            if len(stops) == 2:
+                continue
+
+            routes.append(make_route(vehicle, stops, dist, parcels))
+            trips[v] += 1
+            ready[v] = end
+            progress = True
+
+    return schedule_trips(routes, points, dist, windows)
+
+
+def _build_trip(remaining, dist, lats, lons, parcels, capacity, start, shift_end, windows, rng=None):
+    """One depot round trip: keep driving to the nearest stop that fits.
+
+    The vehicle is ready at the depot at ``start`` (minutes after midnight).
+    Ends when no stop fits the remaining capacity, its time window and the
+    return to the depot by ``shift_end``. Assigned stops are removed from
+    ``remaining``. Returns the stops and the time the vehicle is back.
+    """
+    stops = [0]
+    load = 0
+    current = 0
+    clock = start
+
+    while len(remaining) and load < capacity:
+        nearest, leg = _nearest_feasible(remaining, dist, current, lats, lons, capacity - load,
+                                         clock, shift_end, windows, rng)
+        if nearest is None:
+            break
+
+        clock = max(clock + leg * MINUTES_PER_KM, windows.earliest[nearest]) + windows.service[nearest]
+        stops.append(nearest)
+        load += parcels[nearest]
+        current = nearest
+        remaining.remove(nearest)
+
+    stops.append(0)
+    return stops, clock + float(dist[current, 0]) * MINUTES_PER_KM
@@ -0,0 +1,282 @@
+"""Fleet-aware regret insertion - routes built to minimize money across a mixed fleet"""
+import numpy as np
+
+from quickdeliver.distance import build_distance_matrix
+from quickdeliver.optimizer import RANDOMIZED_NOISE
+from quickdeliver.routes import make_route, point_parcels
+from quickdeliver.time_windows import LATE_PENALTY_KM_PER_MINUTE, MINUTES_PER_KM, TimeWindows
+from quickdeliver.trips import depot_hours, prepare_fleet, schedule_trips, schedule_vehicle, trip_overhead
+
+# Added to each vehicle's rate per litre it burns per km, so that between
+# vehicles with the same cost per km the more fuel-efficient one is chosen
+FUEL_TIEBREAK = 1e-3
+
+# Insertions between two progress calls
+PROGRESS_EVERY = 50
+
+
+def vehicle_rates(fleet):
+    """What driving one km costs with each vehicle: its cost_per_km, fuel use as tie-break"""
+    return np.array([v['cost_per_km'] + FUEL_TIEBREAK / v['fuel_efficiency'] for v in fleet], dtype=np.float64)
+
+
+class _Fleet:
+    """Every vehicle's trips plus the cheapest insertion of each pending stop into each vehicle.
+
+    ``cost[k, v]`` is what adding stop ``k`` to vehicle ``v`` costs (extra
+    km times the vehicle's rate) at its best feasible place - a gap of one
+    of its trips or a fresh trip after the last - recorded in
+    ``trip_at``/``pos_at``. Each stop also keeps its best and second-best
+    vehicle (``first``/``second``), so regrets need no pass over the matrix.
+
+    Inserting a stop only changes its own vehicle's column, and there a
+    stop's cost can only go up - fuller trips, later arrivals - except
+    through the two new gaps beside the inserted stop. So the column is
+    recomputed for the stops ranking that vehicle first or second and the
+    stops the new gaps could serve for less than their recorded cost; the
+    other entries are marked ``stale`` (a lower bound) and recomputed only
+    if they would enter a stop's top two. Unused vehicles of one kind have
+    equal columns, so only the first two of each kind are ranked.
+    """
+
+    def __init__(self, points, fleet, dist, windows, parcels):
+        self.fleet = fleet
+        self.dist = dist
+        self.windows = windows
+        self.parcels = parcels
+        self.shift_start = depot_hours(points)[0]
+        self.rates = vehicle_rates(fleet)
+        self.capacity = np.array([v['capacity'] for v in fleet], dtype=np.int64)
+        self.trips = [[] for _ in fleet]
+        self.loads = [[] for _ in fleet]
+        self.schedules = [[] for _ in fleet]
+        # When each vehicle is back from its last trip
+        self.ready = np.full(len(fleet), float(self.shift_start))
+        n = len(points)
+        self.pending = np.ones(n, dtype=bool)
+        self.pending[0] = False
+        self.cost = np.full((n, len(fleet)), np.inf)
+        self.trip_at = np.zeros((n, len(fleet)), dtype=np.int32)
+        self.pos_at = np.ones((n, len(fleet)), dtype=np.int32)
+        self.stale = np.zeros((n, len(fleet)), dtype=bool)
+        # Vehicle kinds: same rate, capacity and shift
+        _, self.kind = np.unique([(rate, v['capacity'], v['shift_minutes']) for rate, v in zip(self.rates, fleet)],
+                                 axis=0, return_inverse=True)
+        self.used = np.zeros(len(fleet), dtype=bool)
+        self.first = np.full(n, np.inf)
+        self.second = np.full(n, np.inf)
+        self.first_v = np.zeros(n, dtype=np.int64)
+        self.second_v = np.full(n, -1, dtype=np.int64)
+        for v in range(len(fleet)):
+            self._column(v, np.flatnonzero(self.pending))
+        self._rank(np.flatnonzero(self.pending))
+
+    def shift_end(self, v):
+        return self.shift_start + self.fleet[v]['shift_minutes']
+
+    def _column(self, v, ks):
+        """Recompute vehicle ``v``'s column for stops ``ks``, one vectorized pass per trip"""
+        if not len(ks):
+            return
+        dist, w = self.dist, self.windows
+        best = np.full(len(ks), np.inf)
+        trip = np.zeros(len(ks), dtype=np.int32)
+        pos = np.ones(len(ks), dtype=np.int32)
+        for t, (stops, load, schedule) in enumerate(zip(self.trips[v], self.loads[v], self.schedules[v])):
+            fit = np.flatnonzero(self.parcels[ks] <= self.capacity[v] - load)
+            if not len(fit):
+                continue
+            kk = ks[fit]
+            s = np.asarray(stops)
+            feasible, arrival = schedule.insertion_arrivals(kk)
+            added = (np.asarray(dist[np.ix_(s[:-1], kk)], dtype=np.float64).T + dist[np.ix_(kk, s[1:])]
+                     - dist[s[:-1], s[1:]])
+            added += np.maximum(arrival - w.window_latest[kk, None], 0) * LATE_PENALTY_KM_PER_MINUTE
+            added[~feasible] = np.inf
+            gap = np.argmin(added, axis=1)
+            km = added[np.arange(len(kk)), gap]
+            better = km < best[fit]
+            best[fit[better]] = km[better]
+            trip[fit[better]] = t
+            pos[fit[better]] = gap[better] + 1
+
+        km = self._fresh(v, ks)
+        better = km < best
+        best[better] = km[better]
+        trip[better] = len(self.trips[v])
+        pos[better] = 1
+
+        self.cost[ks, v] = best * self.rates[v]
+        self.trip_at[ks, v] = trip
+        self.pos_at[ks, v] = pos
+        self.stale[ks, v] = False
+
+    def _fresh(self, v, ks):
+        """Extra km of serving stops ``ks`` on a fresh trip of ``v`` after its last, leaving just in time"""
+        dist, w = self.dist, self.windows
+        out = dist[0, ks].astype(np.float64)
+        back = dist[ks, 0].astype(np.float64)
+        arrival = np.maximum(self.ready[v] + trip_overhead(len(self.trips[v]) + 1) + out * MINUTES_PER_KM,
+                             w.earliest[ks])
+        ok = ((arrival <= w.latest[ks]) & (self.parcels[ks] <= self.capacity[v])
+              & (arrival + w.service[ks] + back * MINUTES_PER_KM <= self.shift_end(v)))
+        return np.where(ok, out + back + np.maximum(arrival - w.window_latest[ks], 0) * LATE_PENALTY_KM_PER_MINUTE,
+                        np.inf)
+
+    def _idle(self):
+        """The unused vehicles that can be in a stop's top two: the first two of each kind"""
+        unused = np.flatnonzero(~self.used)
+        if not len(unused):
+            return unused
+        order = np.argsort(self.kind[unused], kind='stable')
+        kind = self.kind[unused[order]]
+        lead = np.r_[True, kind[1:] != kind[:-1]]
+        runner_up = np.r_[False, lead[:-1]] & ~lead
+        return np.sort(unused[order[lead | runner_up]])
+
+    def _two_best(self, ks, vs):
+        """Each stop's two cheapest vehicles among ``vs`` (-1 where there are fewer)"""
+        top = np.full((len(ks), 2), -1, dtype=np.int64)
+        if len(vs) > 1:
+            top[:] = vs[np.argpartition(self.cost[np.ix_(ks, vs)], 1, axis=1)[:, :2]]
+        elif len(vs):
+            top[:, 0] = vs[0]
+        return top
+
+    def _rank(self, ks):
+        """Find the best and second-best vehicle of stops ``ks`` from their rows"""
+        while len(ks):
+            # On equal cost an unused vehicle ranks first: its column won't change when the used one fills up
+            top = np.hstack([self._two_best(ks, self._idle()), self._two_best(ks, np.flatnonzero(self.used))])
+            costs = np.where(top >= 0, self.cost[ks[:, None], top], np.inf)
+            top = np.take_along_axis(top, np.argsort(costs, axis=1, kind='stable')[:, :2], axis=1)
+            stale = self.stale[ks[:, None], top] & (top >= 0)
+            done = ~stale.any(axis=1)
+            rows, first, second = ks[done], top[done, 0], top[done, 1]
+            self.first_v[rows], self.second_v[rows] = first, second
+            self.first[rows] = self.cost[rows, first]
+            self.second[rows] = np.where(second >= 0, self.cost[rows, second], np.inf)
+            # A stale entry in the top two is a lower bound only: recompute it and rank again
+            for v in np.unique(top[stale]):
+                self._column(v, ks[(stale & (top == v)).any(axis=1)])
+            ks = ks[~done]
+
+    def update(self, v, ks):
+        """Recompute vehicle ``v``'s column for stops ``ks`` and move them up or down its ranking"""
+        self._column(v, ks)
+        c = self.cost[ks, v]
+        first, second = self.first[ks], self.second[ks]
+        was_first, was_second = self.first_v[ks] == v, self.second_v[ks] == v
+        # Dearer than the runner-up: some other vehicle may now be in the top two
+        rerank = (was_first | was_second) & (c > second)
+        top = ~rerank & (c < first)
+        runner_up = ~rerank & ~top & ~was_first & (was_second | (c < second))
+        rows = ks[top]
+        self.second[rows] = np.where(was_first[top], second[top], first[top])
+        self.second_v[rows] = np.where(was_first[top], self.second_v[rows], self.first_v[rows])
+        self.first[rows], self.first_v[rows] = c[top], v
+        rows = ks[runner_up]
+        self.second[rows], self.second_v[rows] = c[runner_up], v
+        rows = ks[~rerank & was_first & ~top]
+        self.first[rows] = self.cost[rows, v]
+        self._rank(ks[rerank])
+
+    def cheapest(self, k):
+        """Stop ``k``'s best vehicle, the lowest-numbered one among equally cheap"""
+        tied = np.flatnonzero(self.cost[k] <= self.first[k])
+        for v in tied[self.stale[k, tied]]:
+            self._column(v, np.array([k]))
+        return int(tied[self.cost[k, tied] <= self.first[k]][0])
+
+    def insert(self, k, v):
+        """Put stop ``k`` at vehicle ``v``'s recorded best place; False if exact re-timing rejects it"""
+        t, pos = int(self.trip_at[k, v]), int(self.pos_at[k, v])
+        last = len(self.trips[v])
+        trips = list(self.trips[v])
+        loads = list(self.loads[v])
+        if t == len(trips):
+            trips.append([0, k, 0])
+            loads.append(0)
+        else:
+            trips[t] = trips[t][:pos] + [k] + trips[t][pos:]
+        times, schedules, feasible = schedule_vehicle(trips, self.shift_start, self.shift_end(v),
+                                                      self.dist, self.windows)
+        if not feasible:
+            self.cost[k, v if self.used[v] else (self.kind == self.kind[v]) & ~self.used] = np.inf
+            self._rank(np.array([k]))
+            return False
+        loads[t] += self.parcels[k]
+        self.trips[v], self.loads[v], self.schedules[v] = trips, loads, schedules
+        self.ready[v] = times[-1]['end']
+        self.used[v] = True
+        self.pending[k] = False
+        ks = np.flatnonzero(self.pending)
+        cost, at = self.cost[ks, v], self.trip_at[ks, v]
+        # Extra km of the two new gaps beside k: a bound on what they can offer the stops that fit
+        a, b = trips[t][pos - 1], trips[t][pos + 1]
+        dist = self.dist
+        to_k, from_k = np.asarray(dist[ks, k], dtype=np.float64), np.asarray(dist[k, ks], dtype=np.float64)
+        near = ((np.minimum(dist[a, ks] + to_k - dist[a, k], from_k + dist[ks, b] - dist[k, b]) * self.rates[v] <= cost)
+                & (self.parcels[ks] <= self.capacity[v] - loads[t]))
+        ranked = (self.first_v[ks] == v) | (self.second_v[ks] == v)
+        # Best place in an earlier trip, untouched: the cost stands
+        refresh = ~near & (at >= t)
+        self.stale[ks[refresh & ~ranked], v] = True
+        refresh &= ranked
+        # Best on a fresh trip, which only pays more if it now starts too late
+        fresh = np.flatnonzero(refresh & (at == last))
+        same = self._fresh(v, ks[fresh]) * self.rates[v] == cost[fresh]
+        self.trip_at[ks[fresh[same]], v] = len(trips)
+        refresh[fresh[same]] = False
+        self.update(v, ks[refresh | near])
+        return True
+
+
+def regret_insertion(points, vehicles, dist=None, windows=None, rng=None, on_progress=None):
+    """Regret-2 insertion over the whole fleet, minimizing cost rather than distance.
+
+    Every pending stop knows its cheapest insertion into each vehicle
+    (a vectorized per-vehicle cost matrix: extra km x cost per km, with
+    capacity, time ``windows`` and shifts checked for all gaps at once).
+    The stop with the largest regret - how much more its second-best
+    vehicle would cost - is inserted first, into its cheapest vehicle, so
+    stops that only one vehicle serves well are placed before that vehicle
+    fills up, and cheap vehicles are used before expensive ones. After an
+    insertion only that vehicle's costs are recomputed, and only for the
+    stops whose cost can change (see ``_Fleet``), which keeps it practical for
+    hundreds of vehicles. With a NumPy ``rng`` regrets get random noise,
+    giving a different construction per seed for multi-start.
+    ``on_progress(phase)`` is called every ``PROGRESS_EVERY`` insertions and
+    may raise to abort the run; a stop request takes effect once the routes
+    are built, as for the other constructors.
+    """
+    if dist is None:
+        dist = build_distance_matrix(points)
+    if windows is None:
+        windows = TimeWindows(points)
+    if not vehicles or len(points) < 2:
+        return []
+
+    parcels = point_parcels(points)
+    fleet = prepare_fleet(vehicles, points)
+    plan = _Fleet(points, fleet, dist, windows, parcels)
+    steps = 0
+    while plan.pending.any():
+        steps += 1
+        if on_progress is not None and steps % PROGRESS_EVERY == 0:
+            on_progress(f"construct: {len(points) - 1 - plan.pending.sum()}/{len(points) - 1} stops")
+        ks = np.flatnonzero(plan.pending)
+        first, second = plan.first[ks], plan.second[ks]
+        live = np.isfinite(first)
+        if not live.any():
+            break
+        ks, first, regret = ks[live], first[live], second[live] - first[live]
+        if rng is not None:
+            regret = regret * (1 + RANDOMIZED_NOISE * rng.random(len(regret)))
+        # Ties - mostly stops that only a fresh trip takes - go farthest first, seeding trips at the edges
+        k = int(ks[np.lexsort((-first, -regret))[0]])
+        plan.insert(k, plan.cheapest(k))
+
+    routes = [make_route(fleet[v], stops, dist, parcels)
+              for v in range(len(fleet)) for stops in plan.trips[v]]
+    return schedule_trips(routes, points, dist, windows)
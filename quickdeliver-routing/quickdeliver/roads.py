@@ -0,0 +1,413 @@
+"""Offline road-network distances - shortest paths over a local OpenStreetMap extract.
+
+An extract (``.osm`` / ``.osm.gz`` XML) is parsed once into a compact
+driving graph: only intersections and dead ends are kept as nodes, the
+shape points between them are folded into edge lengths, and one-way
+streets are directed. ``python -m quickdeliver.roads city.osm city.npz``
+saves that graph so later runs load it in a fraction of a second.
+
+Stops are snapped to their nearest graph node with the grid spatial index
+and pairwise distances come from one Dijkstra search per distinct node,
+cut off at ``SEARCH_LIMIT_FACTOR`` times the span of the nodes (plus
+``SEARCH_SLACK_KM``). Each search still covers most of a city graph, so a
+matrix costs stops x graph size: with SciPy installed the searches run in
+C, a batch of sources at a time (``scipy.sparse.csgraph.dijkstra``), about
+15s for 2,000 stops on a 45,000-intersection city; without it they run in
+pure Python, ten times slower - minutes at that size, fine for a few
+hundred stops (``benchmarks/bench_roads.py`` times both). There is no
+contraction hierarchy: matrices are cached on disk instead, keyed by the
+graph and the set of snapped nodes, so re-optimizing the same stops never
+repeats the searches. Stops too far from any road, and pairs with no
+connecting path within the cut-off, fall back to the great-circle distance
+times ``DETOUR_FACTOR``. Nothing here goes online.
+"""
+import gzip
+import hashlib
+import heapq
+import os
+import sys
+import xml.etree.ElementTree as ET
+from collections import Counter
+
+import numpy as np
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra
+except ImportError:  # optional: searches run in pure Python instead
+    dijkstra = None
+
+from quickdeliver import instrument
+from quickdeliver.distance import calculate_distance
+from quickdeliver.spatial_index import GridIndex
+
+# OSM highway types a delivery vehicle can drive on
+DRIVABLE_HIGHWAYS = frozenset({
+    'motorway', 'trunk', 'primary', 'secondary', 'tertiary', 'unclassified', 'residential',
+    'motorway_link', 'trunk_link', 'primary_link', 'secondary_link', 'tertiary_link',
+    'living_street', 'service', 'road',
+})
+# Highway types that are one-way unless tagged otherwise
+ONEWAY_HIGHWAYS = frozenset({'motorway', 'motorway_link'})
+
+# Stops further than this from the nearest road node use the fallback distance
+MAX_SNAP_KM = 2.0
+# Fallback: great-circle distance times this (typical urban detour)
+DETOUR_FACTOR = 1.3
+# Searches stop this far out: the span of the nodes involved times the
+# factor, plus the slack - longer road paths count as no path
+SEARCH_LIMIT_FACTOR = 3.0
+SEARCH_SLACK_KM = 5.0
+# Sources per SciPy batch are capped so a batch's rows hold this many km values
+SEARCH_BATCH_CELLS = 1 << 23
+
+
+class RoadNetwork:
+    """Directed driving graph in CSR form plus snapping and shortest-path matrices.
+
+    ``lat``/``lon`` hold the node coordinates; the edges leaving node ``u``
+    are ``indices[indptr[u]:indptr[u + 1]]`` with lengths (km) in
+    ``weights``. ``cache_dir`` is where computed matrices are kept (None:
+    no disk cache).
+    """
+
+    def __init__(self, lat, lon, indptr, indices, weights, cache_dir=None):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.cache_dir = cache_dir
+        self._index = None
+        self._adjacency = {}
+        self._fingerprint = None
+
+    @classmethod
+    def from_edges(cls, lat, lon, source, target, length, cache_dir=None):
+        """Network from edge lists; parallel edges keep the shortest"""
+        source = np.asarray(source, dtype=np.int64)
+        target = np.asarray(target, dtype=np.int64)
+        length = np.asarray(length, dtype=np.float64)
+        keep = source != target
+        source, target, length = source[keep], target[keep], length[keep]
+        order = np.lexsort((length, target, source))
+        source, target, length = source[order], target[order], length[order]
+        first = np.ones(len(source), dtype=bool)
+        first[1:] = (source[1:] != source[:-1]) | (target[1:] != target[:-1])
+        source, target, length = source[first], target[first], length[first]
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(source, minlength=len(lat)))])
+        return cls(lat, lon, indptr, target, length, cache_dir)
+
+    @classmethod
+    def from_osm(cls, source, cache_dir=None):
+        """Network from an OSM XML extract (path to ``.osm``/``.osm.gz`` or a binary file object)"""
+        opened = None
+        name = getattr(source, 'name', 'OSM extract')
+        if isinstance(source, (str, os.PathLike)):
+            name = os.fspath(source)
+            opened = source = gzip.open(name, 'rb') if name.endswith('.gz') else open(name, 'rb')
+        try:
+            coords, ways = _read_osm(source)
+        except ET.ParseError as e:
+            raise ValueError(f"{name}: not valid OSM XML ({e})") from None
+        finally:
+            if opened is not None:
+                opened.close()
+        return cls._from_ways(coords, ways, cache_dir)
+
+    @classmethod
+    def _from_ways(cls, coords, ways, cache_dir):
+        """Simplified graph: nodes are way ends and nodes shared by ways"""
+        uses = Counter(ref for refs, _ in ways for ref in refs)
+        ids = {}
+        source, target, length = [], [], []
+
+        def node(ref):
+            if ref not in ids:
+                ids[ref] = len(ids)
+            return ids[ref]
+
+        for refs, direction in ways:
+            lat = np.array([coords[ref][0] for ref in refs])
+            lon = np.array([coords[ref][1] for ref in refs])
+            along = np.concatenate([[0.0], np.cumsum(calculate_distance(lat[:-1], lon[:-1], lat[1:], lon[1:]))])
+            last = 0
+            for i in range(1, len(refs)):
+                if i < len(refs) - 1 and uses[refs[i]] < 2:
+                    continue
+                a, b, km = node(refs[last]), node(refs[i]), float(along[i] - along[last])
+                if direction >= 0:
+                    source.append(a), target.append(b), length.append(km)
+                if direction <= 0:
+                    source.append(b), target.append(a), length.append(km)
+                last = i
+
+        lat = np.empty(len(ids))
+        lon = np.empty(len(ids))
+        for ref, i in ids.items():
+            lat[i], lon[i] = coords[ref]
+        return cls.from_edges(lat, lon, source, target, length, cache_dir)
+
+    @classmethod
+    def load(cls, path, cache_dir=None):
+        """Network from a saved ``.npz`` graph or an OSM XML extract.
+
+        ``cache_dir`` defaults to a ``<file>.cache`` folder beside the graph.
+        PBF extracts aren't read directly; convert them to XML first
+        (``osmium cat city.osm.pbf -o city.osm``).
+        """
+        path = os.fspath(path)
+        if cache_dir is None:
+            cache_dir = path + '.cache'
+        if path.endswith('.npz'):
+            with np.load(path) as graph:
+                return cls(graph['lat'], graph['lon'], graph['indptr'], graph['indices'], graph['weights'],
+                           cache_dir)
+        if path.endswith('.pbf'):
+            raise ValueError(f"{path}: PBF isn't supported - convert it to .osm XML "
+                             f"(osmium cat {os.path.basename(path)} -o roads.osm)")
+        return cls.from_osm(path, cache_dir)
+
+    def save(self, path):
+        """Write the graph as ``.npz``, for fast loading with ``load``"""
+        np.savez(path, lat=self.lat, lon=self.lon, indptr=self.indptr, indices=self.indices,
+                 weights=self.weights)
+
+    def __len__(self):
+        return len(self.lat)
+
+    @property
+    def edge_count(self):
+        return len(self.indices)
+
+    @property
+    def fingerprint(self):
+        """Content hash of the graph, part of every matrix cache key"""
+        if self._fingerprint is None:
+            h = hashlib.blake2b(digest_size=16)
+            for array in (self.lat, self.lon, self.indptr, self.indices, self.weights):
+                h.update(np.ascontiguousarray(array).tobytes())
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    def snap(self, lats, lons):
+        """Nearest node and its distance (km) for each coordinate; node -1 beyond ``MAX_SNAP_KM``"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if self._index is None:
+            self._index = GridIndex(self.lat, self.lon)
+        nodes = np.array([self._index.nearest(lat, lon)[0] if len(self) else -1 for lat, lon in zip(lats, lons)],
+                         dtype=np.int64)
+        snap_km = np.full(len(nodes), np.inf)
+        found = nodes >= 0
+        snap_km[found] = calculate_distance(lats[found], lons[found], self.lat[nodes[found]], self.lon[nodes[found]])
+        nodes[snap_km > MAX_SNAP_KM] = -1
+        return nodes, snap_km
+
+    def _graph(self, reverse):
+        """CSR arrays forward or reversed: a SciPy matrix, or Python lists (fast inside the search loop)"""
+        if reverse not in self._adjacency:
+            indptr, indices, weights = self.indptr, self.indices, self.weights
+            if reverse:
+                source = np.repeat(np.arange(len(self)), np.diff(indptr))
+                order = np.argsort(indices, kind='stable')
+                indptr = np.concatenate([[0], np.cumsum(np.bincount(indices, minlength=len(self)))])
+                indices, weights = source[order], weights[order]
+            if dijkstra is not None:
+                self._adjacency[reverse] = csr_matrix((weights, indices, indptr), shape=(len(self), len(self)))
+            else:
+                self._adjacency[reverse] = (indptr.tolist(), indices.tolist(), weights.tolist())
+        return self._adjacency[reverse]
+
+    def _search_limit(self, nodes):
+        """How far the searches between ``nodes`` go, km"""
+        span = calculate_distance(self.lat[nodes].min(), self.lon[nodes].min(),
+                                  self.lat[nodes].max(), self.lon[nodes].max())
+        return float(span) * SEARCH_LIMIT_FACTOR + SEARCH_SLACK_KM
+
+    def node_distances(self, sources, targets, reverse=False):
+        """Shortest km from each node in ``sources`` to each in ``targets`` (inf: no path).
+
+        With ``reverse`` the searches run on the reversed graph, giving the
+        distances from each target to each source instead (same layout).
+        """
+        graph = self._graph(reverse)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        result = np.empty((len(sources), len(targets)))
+        if len(sources) and len(targets):
+            limit = self._search_limit(np.concatenate([sources, targets]))
+            if dijkstra is not None:
+                batch = max(1, SEARCH_BATCH_CELLS // max(len(self), 1))
+                for start in range(0, len(sources), batch):
+                    rows = dijkstra(graph, indices=sources[start:start + batch], limit=limit)
+                    result[start:start + batch] = rows[:, targets]
+            else:
+                targets = targets.tolist()
+                for row, source in enumerate(sources.tolist()):
+                    result[row] = _dijkstra(graph, source, targets, limit)
+        instrument.count('road_searches', len(sources))
+        return result
+
+    def _node_matrix(self, nodes):
+        """Node-to-node matrix for sorted distinct ``nodes``, through the disk cache"""
+        path = None
+        if self.cache_dir is not None:
+            key = hashlib.blake2b(self.fingerprint.encode() + nodes.tobytes(), digest_size=16).hexdigest()
+            path = os.path.join(self.cache_dir, f"{key}.npy")
+            if os.path.exists(path):
+                instrument.count('road_cache_hits')
+                return np.load(path)
+        matrix = self.node_distances(nodes, nodes)
+        if path is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            partial = f"{path}.{os.getpid()}.tmp"
+            with open(partial, 'wb') as f:
+                np.save(f, matrix)
+            os.replace(partial, path)
+        return matrix
+
+    def matrix(self, lats, lons):
+        """Road km between every pair of coordinates (entry ``[i, j]`` is from i to j)"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        nodes, snap_km = self.snap(lats, lons)
+        distinct = np.unique(nodes[nodes >= 0])
+        network = np.full((len(nodes), len(nodes)), np.inf)
+        if len(distinct):
+            snapped = np.flatnonzero(nodes >= 0)
+            pos = np.searchsorted(distinct, nodes[snapped])
+            network[np.ix_(snapped, snapped)] = self._node_matrix(distinct)[np.ix_(pos, pos)]
+        matrix = _with_fallback(network, snap_km, snap_km, lats, lons, lats, lons)
+        np.fill_diagonal(matrix, 0)
+        return matrix
+
+    def distances(self, src_lats, src_lons, dst_lats, dst_lons):
+        """Road km from each source coordinate to each destination coordinate.
+
+        Searches run from whichever side has fewer distinct nodes (the
+        reversed graph when that's the destinations), so adding a few
+        points to a large matrix costs a few searches either way.
+        """
+        src_lats, src_lons = np.asarray(src_lats, dtype=np.float64), np.asarray(src_lons, dtype=np.float64)
+        dst_lats, dst_lons = np.asarray(dst_lats, dtype=np.float64), np.asarray(dst_lons, dtype=np.float64)
+        src_nodes, src_snap = self.snap(src_lats, src_lons)
+        dst_nodes, dst_snap = self.snap(dst_lats, dst_lons)
+        src_distinct = np.unique(src_nodes[src_nodes >= 0])
+        dst_distinct = np.unique(dst_nodes[dst_nodes >= 0])
+        network = np.full((len(src_nodes), len(dst_nodes)), np.inf)
+        if len(src_distinct) and len(dst_distinct):
+            if len(src_distinct) <= len(dst_distinct):
+                block = self.node_distances(src_distinct, dst_distinct)
+            else:
+                block = self.node_distances(dst_distinct, src_distinct, reverse=True).T
+            src, dst = np.flatnonzero(src_nodes >= 0), np.flatnonzero(dst_nodes >= 0)
+            network[np.ix_(src, dst)] = block[np.ix_(np.searchsorted(src_distinct, src_nodes[src]),
+                                                     np.searchsorted(dst_distinct, dst_nodes[dst]))]
+        return _with_fallback(network, src_snap, dst_snap, src_lats, src_lons, dst_lats, dst_lons)
+
+
+def _with_fallback(network, src_snap, dst_snap, src_lats, src_lons, dst_lats, dst_lons):
+    """Snap legs added to node-to-node km; inf entries become the detour-scaled great-circle km"""
+    km = network + src_snap[:, None] + dst_snap[None, :]
+    missing = ~np.isfinite(km)
+    if missing.any():
+        straight = calculate_distance(src_lats[:, None], src_lons[:, None], dst_lats[None, :], dst_lons[None, :])
+        km[missing] = straight[missing] * DETOUR_FACTOR
+    return km
+
+
+def _dijkstra(graph, source, targets, limit):
+    """Shortest km from ``source`` to each of ``targets``; stops once all are settled or ``limit`` km out"""
+    indptr, indices, weights = graph
+    inf = float('inf')
+    best = [inf] * (len(indptr) - 1)
+    best[source] = 0.0
+    settled = bytearray(len(indptr) - 1)
+    remaining = len(set(targets))
+    wanted = bytearray(len(indptr) - 1)
+    for t in targets:
+        wanted[t] = 1
+    heap = [(0.0, source)]
+    pop, push = heapq.heappop, heapq.heappush
+    while heap and remaining:
+        d, u = pop(heap)
+        if d > limit:
+            break
+        if settled[u]:
+            continue
+        settled[u] = 1
+        remaining -= wanted[u]
+        for e in range(indptr[u], indptr[u + 1]):
+            v = indices[e]
+            nd = d + weights[e]
+            if nd < best[v]:
+                best[v] = nd
+                push(heap, (nd, v))
+    return [best[t] if settled[t] else inf for t in targets]
+
+
+def _read_osm(source):
+    """Node coordinates and drivable ways ``(node refs, direction)`` from OSM XML.
+
+    Direction is 1 for one-way along the node order, -1 against it, 0 for
+    two-way. Ways are split where they reference nodes missing from the
+    extract (clipped at its boundary).
+    """
+    coords = {}
+    ways = []
+    refs, tags = [], {}
+    for _, elem in ET.iterparse(source, events=('end',)):
+        if elem.tag == 'node':
+            coords[int(elem.get('id'))] = (float(elem.get('lat')), float(elem.get('lon')))
+            refs, tags = [], {}
+            elem.clear()
+        elif elem.tag == 'nd':
+            refs.append(int(elem.get('ref')))
+        elif elem.tag == 'tag':
+            tags[elem.get('k')] = elem.get('v')
+        elif elem.tag == 'way':
+            highway = tags.get('highway')
+            if highway in DRIVABLE_HIGHWAYS and tags.get('access') not in ('no', 'private'):
+                direction = _oneway(highway, tags)
+                piece = []
+                for ref in refs + [None]:
+                    if ref is not None and ref in coords:
+                        piece.append(ref)
+                        continue
+                    if len(piece) > 1:
+                        ways.append((piece, direction))
+                    piece = []
+            refs, tags = [], {}
+            elem.clear()
+        elif elem.tag == 'relation':
+            refs, tags = [], {}
+            elem.clear()
+    return coords, ways
+
+
+def _oneway(highway, tags):
+    oneway = tags.get('oneway', '')
+    if oneway in ('yes', 'true', '1'):
+        return 1
+    if oneway == '-1':
+        return -1
+    if oneway == 'no':
+        return 0
+    return 1 if highway in ONEWAY_HIGHWAYS or tags.get('junction') == 'roundabout' else 0
+
+
+def main(argv=None):
+    """``python -m quickdeliver.roads extract.osm graph.npz`` - preprocess an extract once"""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("usage: python -m quickdeliver.roads <extract.osm[.gz]> <graph.npz>", file=sys.stderr)
+        return 2
+    network = RoadNetwork.from_osm(argv[0])
+    network.save(argv[1])
+    print(f"{argv[1]}: {len(network)} nodes, {network.edge_count} edges")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
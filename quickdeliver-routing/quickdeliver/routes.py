@@ -0,0 +1,65 @@
+"""Route records - stops are stored as index arrays into the collection points"""
+import numpy as np
+
+from quickdeliver.distance import travel_minutes
+from quickdeliver.model import point_column
+
+
+def point_parcels(points):
+    """Parcel counts as an array aligned with the points"""
+    return np.asarray(point_column(points, 'parcels'))
+
+
+def make_route(vehicle, stops, dist, parcels):
+    """Route dict for ``vehicle`` visiting ``stops`` (depot index at both ends).
+
+    Totals are computed from the distance matrix and the parcels of the
+    stops between the depots; the stop sequence is an int32 array so no
+    point dicts are copied until the route is rendered.
+    """
+    stops = np.asarray(stops, dtype=np.int32)
+    total_distance = float(dist[stops[:-1], stops[1:]].sum(dtype=np.float64))
+    return {
+        'vehicle_id': vehicle['id'],
+        'vehicle_index': vehicle.get('index', 0),
+        'shift_minutes': vehicle.get('shift_minutes'),
+        'capacity': vehicle['capacity'],
+        'fuel_efficiency': vehicle['fuel_efficiency'],
+        'cost_per_km': vehicle['cost_per_km'],
+        'stops': stops,
+        'total_parcels': parcels[stops[1:-1]].sum().item(),
+        'total_distance': total_distance,
+        'total_time': travel_minutes(total_distance),
+        'total_cost': total_distance * vehicle['cost_per_km'],
+        'fuel_used': total_distance / vehicle['fuel_efficiency']
+    }
+
+
+def rebuild_route(route, stops, dist, parcels):
+    """Same vehicle as ``route`` with a new stop sequence and fresh totals"""
+    vehicle = {
+        'id': route['vehicle_id'],
+        'index': route['vehicle_index'],
+        'shift_minutes': route['shift_minutes'],
+        'capacity': route['capacity'],
+        'fuel_efficiency': route['fuel_efficiency'],
+        'cost_per_km': route['cost_per_km']
+    }
+    return make_route(vehicle, stops, dist, parcels)
+
+
+def route_label(route):
+    """Vehicle id, plus the trip number for vehicles doing several trips"""
+    trip = route.get('trip', 1)
+    return route['vehicle_id'] if trip == 1 else f"{route['vehicle_id']} #{trip}"
+
+
+def route_points(route, points):
+    """Point dicts in visiting order - only needed for display and export"""
+    return [points[i] for i in route['stops']]
+
+
+def route_legs(route, dist):
+    """Distance of each leg of the route, looked up in the matrix"""
+    stops = route['stops']
+    return dist[stops[:-1], stops[1:]]
@@ -0,0 +1,215 @@
+"""Clarke-Wright savings construction"""
+import bisect
+import heapq
+from collections import deque
+
+import numpy as np
+
+from quickdeliver.distance import CHUNK_ELEMENTS, build_distance_matrix
+from quickdeliver.local_search import neighbor_lists
+from quickdeliver.optimizer import RANDOMIZED_NOISE
+from quickdeliver.routes import make_route, point_parcels
+from quickdeliver.time_windows import TimeWindows, simulate_trip
+from quickdeliver.trips import depot_hours, prepare_fleet, schedule_trips, trip_overhead
+
+# Above this many points only savings between near neighbours are considered,
+# which keeps the savings list O(N x SAVINGS_NEIGHBORS) instead of O(N^2)
+DENSE_SAVINGS_LIMIT = 300
+SAVINGS_NEIGHBORS = 50
+
+
+def savings_list(dist, neighbors=None):
+    """Positive savings ``d(0,i) + d(0,j) - d(i,j)`` for customer pairs i < j.
+
+    Computed with broadcasted NumPy over row blocks of the matrix, or only
+    over ``neighbors`` (an N x k array) when given. Returns arrays
+    ``(i, j, saving)``.
+    """
+    depot_dist = np.asarray(dist[0], dtype=np.float64)
+    if neighbors is not None:
+        i = np.repeat(np.arange(len(dist)), neighbors.shape[1])
+        j = neighbors.ravel().astype(np.int64)
+        keep = (i > 0) & (j > 0) & (i != j)
+        i, j = np.minimum(i[keep], j[keep]), np.maximum(i[keep], j[keep])
+        pairs = np.unique(i * len(dist) + j)
+        i, j = pairs // len(dist), pairs % len(dist)
+        saving = depot_dist[i] + depot_dist[j] - dist[i, j]
+        keep = saving > 0
+        return i[keep], j[keep], saving[keep]
+
+    n = len(dist)
+    rows = max(1, CHUNK_ELEMENTS // max(n, 1))
+    found_i, found_j, found_s = [], [], []
+    for start in range(1, n, rows):
+        stop = min(start + rows, n)
+        block = depot_dist[start:stop, None] + depot_dist[None, :] - dist[start:stop]
+        bi, bj = np.nonzero(block > 0)
+        bi += start
+        upper = bj > bi
+        found_i.append(bi[upper])
+        found_j.append(bj[upper])
+        found_s.append(block[bi[upper] - start, bj[upper]])
+    if not found_i:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+    return np.concatenate(found_i), np.concatenate(found_j), np.concatenate(found_s)
+
+
+def _replace_load(sorted_loads, remove, add):
+    """Swap load values in an ascending list, keeping it sorted"""
+    for load in remove:
+        del sorted_loads[bisect.bisect_left(sorted_loads, load)]
+    for load in add:
+        bisect.insort(sorted_loads, load)
+
+
+def _merge_fits_fleet(sorted_loads, capacities, load_a, load_b):
+    """Whether merging two tours still lets every large tour get its own vehicle.
+
+    Each vehicle can carry one tour, so for any load level x above the
+    smallest vehicle, the number of tours heavier than x must not exceed
+    the number of vehicles bigger than x. A merge only adds one tour above
+    the larger of the two loads, so just the levels between that load and
+    the merged load, where the vehicle count drops, need checking.
+    ``sorted_loads`` and ``capacities`` are ascending.
+    """
+    merged = load_a + load_b
+    larger = max(load_a, load_b)
+    if merged > capacities[-1]:
+        return False
+    levels = [larger] + [c for c in set(capacities) if larger <= c < merged]
+    for level in levels:
+        if level < capacities[0]:
+            continue
+        tours_above = len(sorted_loads) - bisect.bisect_right(sorted_loads, level)
+        vehicles_above = len(capacities) - bisect.bisect_right(capacities, level)
+        if tours_above + 1 > vehicles_above:
+            return False
+    return True
+
+
+def _assign_trips(tour_stops, loads, fleet, dist, windows, shift_start):
+    """Give each tour to a vehicle as its next depot trip.
+
+    Heaviest tours go first, each to the vehicle with the fewest trips so
+    far (then the smallest capacity) that can carry it and, starting when
+    its previous trip is back, still meets the tour's time windows and gets
+    back within its shift. Returns ``(vehicle, tour)`` pairs; tours that fit
+    nowhere are left out.
+    """
+    trips = [0] * len(fleet)
+    ready = [float(shift_start)] * len(fleet)
+    queue = [(0, v['capacity'], v['index']) for v in fleet]
+    heapq.heapify(queue)
+    plan = []
+    for t in sorted(range(len(loads)), key=lambda t: -loads[t]):
+        skipped = []
+        while queue:
+            entry = heapq.heappop(queue)
+            v = entry[2]
+            vehicle = fleet[v]
+            if loads[t] <= vehicle['capacity']:
+                times = simulate_trip(tour_stops[t], ready[v] + trip_overhead(trips[v] + 1), dist, windows)
+                fits = times['feasible'] and times['end'] <= shift_start + vehicle['shift_minutes']
+            else:
+                fits = False
+            if fits:
+                trips[v] += 1
+                ready[v] = times['end']
+                plan.append((v, t))
+                heapq.heappush(queue, (trips[v], vehicle['capacity'], v))
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(queue, entry)
+    return plan
+
+
+def _tour_fits_time(tour, shift_start, shift_end, dist, windows):
+    """Whether a tour leaving at the depot opening meets its windows and shift"""
+    times = simulate_trip([0, *tour, 0], shift_start, dist, windows)
+    return times['feasible'] and times['end'] <= shift_end
+
+
+def clarke_wright_savings(points, vehicles, dist=None, windows=None, rng=None):
+    """Clarke-Wright savings algorithm with capacity constraints.
+
+    Starts from one depot round trip per stop and repeatedly merges the two
+    route ends with the largest saving (popped from a heap), as long as the
+    fleet could still carry every large tour on its own vehicle and the
+    merged tour can still meet its time ``windows`` on a first trip. Finished
+    tours are then handed out as trips: vehicles run several tours
+    back-to-back while their shift allows, and tours that fit no vehicle
+    are left unrouted. With a NumPy ``rng`` the savings are scaled by
+    random noise, giving a different merge order per seed for multi-start.
+    Savings assume a symmetric distance matrix, as ``build_distance_matrix``
+    gives without a road network; with one-way road distances the merge
+    order is approximate, but tours are still timed and costed on ``dist``.
+    """
+    if dist is None:
+        dist = build_distance_matrix(points)
+    if windows is None:
+        windows = TimeWindows(points)
+    if not vehicles or len(points) < 2:
+        return []
+
+    parcels = point_parcels(points)
+    n = len(points)
+    neighbors = neighbor_lists(dist, SAVINGS_NEIGHBORS) if n > DENSE_SAVINGS_LIMIT else None
+    si, sj, saving = savings_list(dist, neighbors)
+    if rng is not None:
+        saving = saving * (1 - RANDOMIZED_NOISE / 2 * rng.random(len(saving)))
+    heap = list(zip((-saving).tolist(), si.tolist(), sj.tolist()))
+    heapq.heapify(heap)
+
+    capacities = sorted(v['capacity'] for v in vehicles)
+    fleet = prepare_fleet(vehicles, points)
+    shift_start, _ = depot_hours(points)
+    shift_end = shift_start + max(v['shift_minutes'] for v in fleet)
+    tour_of = np.arange(n)
+    tours = {i: deque([i]) for i in range(1, n)}
+    loads = {i: parcels[i] for i in range(1, n)}
+    sorted_loads = sorted(load for load in loads.values() if load <= capacities[-1])
+
+    while heap:
+        _, i, j = heapq.heappop(heap)
+        a, b = tour_of[i], tour_of[j]
+        if a == b or loads[a] + loads[b] > capacities[-1]:
+            continue
+        tour_a, tour_b = tours[a], tours[b]
+        i_head, i_tail = tour_a[0] == i, tour_a[-1] == i
+        j_head, j_tail = tour_b[0] == j, tour_b[-1] == j
+        if not (i_head or i_tail) or not (j_head or j_tail):
+            continue
+
+        if not _merge_fits_fleet(sorted_loads, capacities, loads[a], loads[b]):
+            continue
+        # Always copy the shorter tour onto the matching end of the longer one
+        if len(tour_a) < len(tour_b):
+            tour_a, tour_b, a, b = tour_b, tour_a, b, a
+            i, j = j, i
+            i_tail, j_head = tour_a[-1] == i, tour_b[0] == j
+        if i_tail:
+            joined = [*tour_a, *(tour_b if j_head else reversed(tour_b))]
+        else:
+            joined = [*(reversed(tour_b) if j_head else tour_b), *tour_a]
+        if not _tour_fits_time(joined, shift_start, shift_end, dist, windows):
+            continue
+        _replace_load(sorted_loads, (loads[a], loads[b]), (loads[a] + loads[b],))
+        if i_tail:
+            tour_a.extend(tour_b if j_head else reversed(tour_b))
+        else:
+            tour_a.extendleft(tour_b if j_head else reversed(tour_b))
+
+        tour_of[list(tour_b)] = a
+        loads[a] += loads[b]
+        del tours[b], loads[b]
+
+    tour_stops = [[0, *tour, 0] for tour in tours.values()]
+    tour_loads = list(loads.values())
+
+    routes = [
+        make_route(fleet[v], tour_stops[t], dist, parcels)
+        for v, t in _assign_trips(tour_stops, tour_loads, fleet, dist, windows, shift_start)
+    ]
+    return schedule_trips(routes, points, dist, windows)
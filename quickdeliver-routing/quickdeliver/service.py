@@ -0,0 +1,341 @@
+"""Local HTTP/JSON routing service - solves on a bounded process pool, identical requests solved once.
+
+    python -m quickdeliver.service --port 8765 --workers 4
+    curl -X POST localhost:8765/solve -d '{"points": [...], "vehicles": [...], "options": {"time_budget": 1}}'
+
+``POST /solve`` takes ``points`` (objects with the points CSV columns,
+depot first, ``"depot": true`` for more depots) and ``vehicles`` (the vehicles CSV columns), validated like
+the CSV files, plus optional ``options`` (see ``OPTION_DEFAULTS``), and
+answers with the solution as ``python -m quickdeliver --json`` writes it.
+``GET /health`` reports the pool, queue and request counters.
+
+Requests are keyed by a content hash of their points, vehicles and
+options. A request whose key is already being solved waits for that
+solve instead of starting another, and recent results are answered from
+memory. At most ``max_queue`` distinct solves are in flight (running or
+waiting for a worker); beyond that requests are turned away with 503 and
+a Retry-After header rather than queued without bound. Built on the
+standard library only (``http.server``), for use on localhost or behind
+a proxy.
+"""
+import argparse
+import io
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from quickdeliver.data import content_hash, solution_to_dict
+from quickdeliver.decompose import multi_depot_solve
+from quickdeliver.distance import build_distance_matrix
+from quickdeliver.ingest import FIRST_LINE, ValidationError, check_vehicle_depots, read_points, read_vehicles
+from quickdeliver.jobs import ResultCache
+from quickdeliver.local_search import DEFAULT_TIME_BUDGET
+from quickdeliver.model import depot_rows
+from quickdeliver.multistart import default_workers
+from quickdeliver.roads import RoadNetwork
+from quickdeliver.solver import CONSTRUCTORS, solve
+from quickdeliver.time_windows import DEFAULT_WINDOW_MODE, SERVICE_MINUTES, WINDOW_MODES
+from quickdeliver.traffic import DEFAULT_SEED, TrafficModel
+
+DEFAULT_PORT = 8765
+# Distinct solves in flight per worker before requests are turned away
+QUEUE_PER_WORKER = 4
+# Largest request: body size and points per request (a 5k-point matrix is 100 MB per worker)
+MAX_BODY_BYTES = 20_000_000
+MAX_POINTS = 5_000
+# Longest local search a request may ask for, seconds
+MAX_TIME_BUDGET = 30.0
+# How long a request waits for its solve before 504 (the solve goes on and its result is kept)
+REQUEST_TIMEOUT = 300.0
+# Finished results answered from memory
+RESULT_ENTRIES = 64
+# Retry-After (seconds) sent with 503
+RETRY_AFTER = 1
+
+# Request options and their defaults
+OPTION_DEFAULTS = {
+    'algorithm': 'nearest_neighbor',
+    'local_search': True,
+    'time_budget': DEFAULT_TIME_BUDGET,
+    'window_mode': DEFAULT_WINDOW_MODE,
+    'service_minutes': SERVICE_MINUTES,
+    'traffic_seed': DEFAULT_SEED,
+}
+
+
+class Overloaded(Exception):
+    """Too many solves in flight to take another request"""
+
+
+def _invalid(name, error):
+    """ValueError for a ``ValidationError`` of the ``name`` list, naming items instead of CSV lines"""
+    listed = '; '.join(f"{name}[{line - FIRST_LINE}].{column}: {message}" if line else f"{name}: {column} {message}"
+                       for line, column, message in error.errors)
+    more = f" (+{error.count - len(error.errors)} more)" if error.count > len(error.errors) else ''
+    return ValueError(listed + more)
+
+
+def _rows(rows, name, reader):
+    """A list of row objects read by ``reader`` as if it were a CSV, errors naming the item"""
+    if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+        raise ValueError(f"'{name}' must be a non-empty list of objects")
+    text = io.StringIO(pd.DataFrame(rows).to_csv(index=False))
+    text.name = name
+    try:
+        return reader(text)
+    except ValidationError as e:
+        raise _invalid(name, e) from None
+
+
+def _options(given):
+    """Solve options from a request's ``options`` object, checked and with defaults filled in"""
+    if not isinstance(given, dict):
+        raise ValueError("'options' must be an object")
+    unknown = sorted(set(given) - set(OPTION_DEFAULTS))
+    if unknown:
+        raise ValueError(f"unknown options: {', '.join(unknown)}")
+    options = {**OPTION_DEFAULTS, **given}
+    if options['algorithm'] not in CONSTRUCTORS:
+        raise ValueError(f"algorithm must be one of {', '.join(sorted(CONSTRUCTORS))}")
+    if options['window_mode'] not in WINDOW_MODES:
+        raise ValueError(f"window_mode must be one of {', '.join(WINDOW_MODES)}")
+    if not isinstance(options['local_search'], bool):
+        raise ValueError("local_search must be true or false")
+    for field, low, high in (('time_budget', 0, MAX_TIME_BUDGET), ('service_minutes', 0, 24 * 60)):
+        value = options[field]
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+            raise ValueError(f"{field} must be a number from {low} to {high:g}")
+    if isinstance(options['traffic_seed'], bool) or not isinstance(options['traffic_seed'], int):
+        raise ValueError("traffic_seed must be an integer")
+    return options
+
+
+def parse_request(body, max_points=MAX_POINTS):
+    """``(points, vehicles, options)`` from a /solve body; ValueError says what's wrong with it"""
+    try:
+        payload = json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"invalid JSON: {e}") from None
+    if not isinstance(payload, dict):
+        raise ValueError("body must be a JSON object with 'points' and 'vehicles'")
+    if isinstance(payload.get('points'), list) and len(payload['points']) > max_points:
+        raise ValueError(f"at most {max_points} points per request")
+    points = _rows(payload.get('points'), 'points', read_points)
+    vehicles = _rows(payload.get('vehicles'), 'vehicles', read_vehicles)
+    try:
+        check_vehicle_depots(points, vehicles)
+    except ValidationError as e:
+        raise _invalid('vehicles', e) from None
+    return points, vehicles, _options(payload.get('options', {}))
+
+
+# Per-process state set up once by the pool initializer
+_worker = {}
+
+
+def _init_worker(roads_path):
+    """Load the road graph once per worker"""
+    _worker['roads'] = RoadNetwork.load(roads_path) if roads_path else None
+
+
+def _solve_request(points, vehicles, options):
+    """Solve one request in a worker; returns the JSON-ready solution"""
+    begin = time.perf_counter()
+    dist = build_distance_matrix(points, TrafficModel(options['traffic_seed']), roads=_worker.get('roads'))
+    # Several depots are solved one after another here: the pool already runs a request per worker
+    optimize = solve if len(depot_rows(points)) < 2 else partial(multi_depot_solve, workers=1)
+    solution = optimize(points, vehicles, dist, algorithm=options['algorithm'],
+                        stages=('local_search',) if options['local_search'] else (),
+                        time_budget=options['time_budget'], window_mode=options['window_mode'],
+                        service_minutes=options['service_minutes'])
+    result = solution_to_dict(solution, points)
+    result['solve_seconds'] = round(time.perf_counter() - begin, 4)
+    return result
+
+
+class RoutingService:
+    """The process pool plus admission control, in-flight deduplication and a result cache"""
+
+    def __init__(self, workers=None, max_queue=None, roads_path=None, request_timeout=REQUEST_TIMEOUT,
+                 max_points=MAX_POINTS, result_entries=RESULT_ENTRIES):
+        self.workers = max(1, workers or default_workers())
+        self.max_queue = max(1, max_queue or self.workers * QUEUE_PER_WORKER)
+        self.roads_path = roads_path
+        self.request_timeout = request_timeout
+        self.max_points = max_points
+        self.results = ResultCache(result_entries)
+        self.counters = Counter()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._pool = self._new_pool()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.roads_path,))
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def submit(self, points, vehicles, options):
+        """``(key, future, source)`` for a request; ``source`` is 'cached', 'joined' or 'solved'.
+
+        Raises ``Overloaded`` when ``max_queue`` distinct solves are already in flight.
+        """
+        key = content_hash(points, vehicles, options)
+        with self._lock:
+            result = self.results.get(key)
+            if result is not None:
+                self.counters['cached'] += 1
+                future = Future()
+                future.set_result(result)
+                return key, future, 'cached'
+            if key in self._in_flight:
+                self.counters['joined'] += 1
+                return key, self._in_flight[key], 'joined'
+            if len(self._in_flight) >= self.max_queue:
+                self.counters['rejected'] += 1
+                raise Overloaded(f"{len(self._in_flight)} solves in flight")
+            try:
+                future = self._pool.submit(_solve_request, points, vehicles, options)
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); start a fresh pool for this and later requests
+                self._pool = self._new_pool()
+                future = self._pool.submit(_solve_request, points, vehicles, options)
+            self._in_flight[key] = future
+            self.counters['solved'] += 1
+        future.add_done_callback(lambda done: self._finished(key, done))
+        return key, future, 'solved'
+
+    def _finished(self, key, future):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if not future.cancelled() and future.exception() is None:
+            self.results.put(key, future.result())
+
+    def health(self):
+        with self._lock:
+            return {
+                'status': 'ok',
+                'workers': self.workers,
+                'in_flight': len(self._in_flight),
+                'max_queue': self.max_queue,
+                **self.counters,
+            }
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'QuickDeliver/1.0'
+
+    def _send(self, status, payload, headers=()):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, self.server.service.health())
+        else:
+            self._send(404, {'error': f"no such endpoint: {self.path}"})
+
+    def do_POST(self):
+        service = self.server.service
+        if self.path != '/solve':
+            self._send(404, {'error': f"no such endpoint: {self.path}"})
+            return
+        service.count('requests')
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            self._send(411, {'error': 'Content-Length required'})
+            return
+        if int(length) > MAX_BODY_BYTES:
+            self._send(413, {'error': f"body larger than {MAX_BODY_BYTES} bytes"})
+            self.close_connection = True
+            return
+        start = time.perf_counter()
+        try:
+            points, vehicles, options = parse_request(self.rfile.read(int(length)), service.max_points)
+            key, future, source = service.submit(points, vehicles, options)
+        except ValueError as e:
+            service.count('invalid')
+            self._send(400, {'error': str(e)})
+            return
+        except Overloaded as e:
+            self._send(503, {'error': f"busy: {e}, try again shortly"}, [('Retry-After', str(RETRY_AFTER))])
+            return
+        try:
+            result = future.result(timeout=service.request_timeout)
+        except FutureTimeout:
+            service.count('timed_out')
+            self._send(504, {'error': f"not solved within {service.request_timeout:g}s; retry for the result",
+                             'key': key})
+            return
+        except Exception as e:
+            service.count('failed')
+            self._send(500, {'error': f"solve failed: {e!r}", 'key': key})
+            return
+        self._send(200, {**result, 'request': {'key': key, 'source': source,
+                                               'seconds': round(time.perf_counter() - start, 4)}})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Connections waiting to be accepted; admission control happens per request, above
+    request_queue_size = 128
+
+
+def make_server(service, host='127.0.0.1', port=DEFAULT_PORT, verbose=False):
+    """HTTP server for ``service``; call ``serve_forever()`` (port 0 picks a free one, see ``server_port``)"""
+    server = _Server((host, port), _Handler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m quickdeliver.service', description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, help='solver processes (default: one per CPU core)')
+    parser.add_argument('--max-queue', type=int,
+                        help=f'distinct solves in flight before 503 (default: {QUEUE_PER_WORKER} per worker)')
+    parser.add_argument('--max-points', type=int, default=MAX_POINTS)
+    parser.add_argument('--request-timeout', type=float, default=REQUEST_TIMEOUT)
+    parser.add_argument('--roads', help='road graph (.npz) or OSM XML extract for road distances')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+
+    service = RoutingService(args.workers, args.max_queue, args.roads, args.request_timeout, args.max_points)
+    server = make_server(service, args.host, args.port, args.verbose)
+    print(f"QuickDeliver routing service on http://{args.host}:{server.server_port} "
+          f"({service.workers} workers, up to {service.max_queue} solves in flight)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
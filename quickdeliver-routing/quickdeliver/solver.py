@@ -0,0 +1,125 @@
+"""Optimization pipeline - one construction algorithm followed by improvement stages"""
+import time
+
+import numpy as np
+
+from quickdeliver import instrument
+from quickdeliver.distance import build_distance_matrix
+from quickdeliver.local_search import DEFAULT_TIME_BUDGET, improve_routes
+from quickdeliver.optimizer import nearest_neighbor_algorithm
+from quickdeliver.regret import regret_insertion
+from quickdeliver.routes import point_parcels
+from quickdeliver.savings import clarke_wright_savings
+from quickdeliver.time_windows import DEFAULT_WINDOW_MODE, SERVICE_MINUTES, TimeWindows
+from quickdeliver.trips import find_unassigned, schedule_trips
+
+# Construction algorithms: (points, vehicles, dist, windows, rng=None) -> routes
+CONSTRUCTORS = {
+    'nearest_neighbor': nearest_neighbor_algorithm,
+    'savings': clarke_wright_savings,
+    'regret': regret_insertion,
+}
+
+# Display names for the algorithm selector
+ALGORITHM_LABELS = {
+    'nearest_neighbor': 'Nearest Neighbor',
+    'savings': 'Clarke-Wright Savings',
+    'regret': 'Regret Insertion (cost-aware)',
+}
+
+# Post-optimization stages: (routes, points, dist, time_budget, windows=..., vehicles=..., on_progress=...)
+# -> (routes, stats)
+IMPROVEMENT_STAGES = {
+    'local_search': improve_routes,
+}
+
+
+def total_distance(routes):
+    """Total distance (km) over all routes"""
+    return sum(r['total_distance'] for r in routes)
+
+
+def total_cost(routes):
+    """Total cost over all routes (each route's distance times its vehicle's cost per km)"""
+    return sum(r['total_cost'] for r in routes)
+
+
+def time_window_summary(routes):
+    """Stops served on time, stops served late, total lateness and waiting (minutes)"""
+    on_time = late = 0
+    for route in routes:
+        late += route.get('late_stops', 0)
+        on_time += len(route['stops']) - 2 - route.get('late_stops', 0)
+    return {
+        'on_time': on_time,
+        'late': late,
+        'late_minutes': sum(r.get('late_minutes', 0.0) for r in routes),
+        'wait_minutes': sum(r.get('wait_time', 0.0) for r in routes),
+    }
+
+
+def solve(points, vehicles, dist=None, algorithm='nearest_neighbor',
+          stages=('local_search',), time_budget=DEFAULT_TIME_BUDGET,
+          window_mode=DEFAULT_WINDOW_MODE, service_minutes=SERVICE_MINUTES, seed=None, on_progress=None):
+    """Construct routes and run the improvement stages in order.
+
+    ``time_budget`` (seconds) is shared by the improvement stages.
+    ``window_mode`` is 'hard' (no late arrivals), 'soft' (late arrivals
+    allowed and reported) or 'off'. A ``seed`` randomizes the construction
+    (used by multi-start); without one it is deterministic.
+    ``on_progress(phase, routes=None)`` is called as the run moves on -
+    ``routes``, when given, returns the current routes - and may raise to
+    abort the run or return True to stop improving and finish with the
+    routes so far (see ``jobs.SolveJob``). Returns a solution dict with the final
+    routes (one per vehicle trip), the stops left unassigned with their
+    reasons, the constructed ("greedy") distance, per-stage stats and a
+    time window compliance summary.
+    """
+    if dist is None:
+        dist = build_distance_matrix(points)
+    windows = TimeWindows(points, window_mode, service_minutes)
+
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed) if seed is not None else None
+    if on_progress is not None:
+        on_progress('construct')
+    with instrument.stage('construct'):
+        # Regret insertion is the one constructor slow enough to check for a cancel as it goes
+        progress = {'on_progress': on_progress} if algorithm == 'regret' else {}
+        routes = CONSTRUCTORS[algorithm](points, vehicles, dist, windows, rng=rng, **progress)
+    construction_seconds = time.perf_counter() - start
+    greedy_distance = total_distance(routes)
+    greedy_cost = total_cost(routes)
+
+    deadline = time.perf_counter() + time_budget
+    stage_stats = []
+    for name in stages:
+        if on_progress is not None and on_progress(name, lambda: routes):
+            break
+        with instrument.stage('improve'):
+            routes, stats = IMPROVEMENT_STAGES[name](routes, points, dist, max(deadline - time.perf_counter(), 0),
+                                                     windows=windows, vehicles=vehicles, on_progress=on_progress)
+        stats['name'] = name
+        stage_stats.append(stats)
+
+    if on_progress is not None:
+        on_progress('schedule')
+    with instrument.stage('schedule'):
+        routes = schedule_trips(routes, points, dist, windows)
+        unassigned = find_unassigned(points, vehicles, routes, dist, point_parcels(points), windows)
+    final_distance = total_distance(routes)
+    return {
+        'routes': routes,
+        'unassigned': unassigned,
+        'algorithm': algorithm,
+        'construction_seconds': construction_seconds,
+        'greedy_distance': greedy_distance,
+        'greedy_cost': greedy_cost,
+        'final_distance': final_distance,
+        'final_cost': total_cost(routes),
+        'improvement_pct': (greedy_distance - final_distance) / greedy_distance * 100 if greedy_distance else 0.0,
+        'stages': stage_stats,
+        'window_mode': window_mode,
+        'service_minutes': service_minutes,
+        'time_windows': time_window_summary(routes),
+    }
@@ -0,0 +1,148 @@
+"""Grid-bucket spatial index for nearest-stop queries during route construction"""
+import numpy as np
+
+from quickdeliver.distance import EARTH_RADIUS_KM
+
+# Target number of points per grid cell
+POINTS_PER_CELL = 2
+MIN_CELL_KM = 0.05
+# Rebuild over the survivors once this fraction of the indexed points is gone
+REBUILD_FRACTION = 0.5
+
+# Projected (equirectangular) distances are scaled by this before being used
+# as lower bounds, which covers the projection error at city scale
+PROJECTION_SLACK = 0.98
+
+
+class GridIndex:
+    """Uniform grid hash over projected lat/lon with O(1) deletion.
+
+    Points are bucketed into square cells of ``cell_km`` stored as a dense,
+    row-major grid (cell offsets into one sorted index array). Queries grow a
+    box of cells around the query location, doubling its radius each round,
+    so finding a nearby stop touches a handful of cells instead of every
+    remaining point. Removed points are filtered out by the ``alive`` mask
+    and the grid is rebuilt over the survivors as it empties.
+    """
+
+    def __init__(self, lats, lons, demands=None, cell_km=None, alive=None):
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        n = len(lats)
+        self._cos_lat = np.cos(np.radians(lats.mean())) if n else 1.0
+        self.x, self.y = self._project(lats, lons)
+        self.demands = np.zeros(n) if demands is None else np.asarray(demands, dtype=np.float64)
+        # ``alive`` may be the caller's own mask; it is updated in place
+        self.alive = np.ones(n, dtype=bool) if alive is None else alive
+        self._alive_count = int(self.alive.sum())
+        self._cx = np.zeros(n, dtype=np.int64)
+        self._cy = np.zeros(n, dtype=np.int64)
+        self._build(np.flatnonzero(self.alive), cell_km)
+
+    def _project(self, lats, lons):
+        """Equirectangular projection to kilometres"""
+        x = EARTH_RADIUS_KM * np.radians(lons) * self._cos_lat
+        y = EARTH_RADIUS_KM * np.radians(lats)
+        return x, y
+
+    def _build(self, idx, cell_km=None):
+        """Bucket points ``idx`` into the grid"""
+        x, y = self.x[idx], self.y[idx]
+        if len(idx) == 0:
+            x = y = np.zeros(1)
+        if cell_km is None:
+            area = max(np.ptp(x), MIN_CELL_KM) * max(np.ptp(y), MIN_CELL_KM)
+            cell_km = max(np.sqrt(area * POINTS_PER_CELL / max(len(idx), 1)), MIN_CELL_KM)
+        self.cell_km = float(cell_km)
+        self._x0, self._y0 = float(x.min()), float(y.min())
+
+        cx = ((self.x[idx] - self._x0) / self.cell_km).astype(np.int64)
+        cy = ((self.y[idx] - self._y0) / self.cell_km).astype(np.int64)
+        self._cx[idx], self._cy[idx] = cx, cy
+        self._width = int(cx.max()) + 1 if len(idx) else 1
+        self._height = int(cy.max()) + 1 if len(idx) else 1
+
+        cell_id = cy * self._width + cx
+        order = np.argsort(cell_id, kind='stable')
+        self._order = idx[order]
+        self._cell_start = np.searchsorted(cell_id[order], np.arange(self._width * self._height + 1))
+        self._built_count = len(idx)
+
+    def __len__(self):
+        return self._alive_count
+
+    def remove(self, i):
+        """Mark point ``i`` as assigned so queries skip it"""
+        if self.alive[i]:
+            self.alive[i] = False
+            self._alive_count -= 1
+
+    def _box(self, qx, qy, r):
+        """Indexed points in the cells within Chebyshev radius ``r`` of (qx, qy)"""
+        x0, x1 = max(qx - r, 0), min(qx + r, self._width - 1)
+        y0, y1 = max(qy - r, 0), min(qy + r, self._height - 1)
+        if x0 > x1 or y0 > y1:
+            return self._order[:0]
+        rows = np.arange(y0, y1 + 1) * self._width
+        starts = self._cell_start[rows + x0]
+        lengths = self._cell_start[rows + x1 + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return self._order[:0]
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return self._order[offsets + np.arange(total)]
+
+    def iter_nearest(self, lat, lon, max_demand=None):
+        """Yield ``(lower_bound_km, indices)`` batches in increasing distance order.
+
+        Every point in a batch, and in all later batches, is at least
+        ``lower_bound_km`` (great-circle) from the query point, so callers can
+        stop as soon as the bound exceeds their best candidate.
+        ``max_demand`` skips points whose demand exceeds the remaining capacity.
+        """
+        if self._alive_count == 0:
+            return
+        if self._alive_count < self._built_count * REBUILD_FRACTION:
+            self._build(np.flatnonzero(self.alive))
+
+        x, y = self._project(lat, lon)
+        qx = int(np.floor((x - self._x0) / self.cell_km))
+        qy = int(np.floor((y - self._y0) / self.cell_km))
+        max_r = max(qx, self._width - 1 - qx, qy, self._height - 1 - qy, 0)
+
+        prev = -1
+        r = 0
+        while prev < max_r:
+            if r >= max_r or (2 * r + 1) ** 2 >= self._width * self._height:
+                idx = self._order
+                last = True
+            else:
+                idx = self._box(qx, qy, r)
+                last = False
+            ring = np.maximum(np.abs(self._cx[idx] - qx), np.abs(self._cy[idx] - qy))
+            idx = idx[(ring > prev) & self.alive[idx]]
+            if max_demand is not None:
+                idx = idx[self.demands[idx] <= max_demand]
+            if idx.size:
+                yield max(prev, 0) * self.cell_km * PROJECTION_SLACK, idx
+            if last:
+                return
+            prev = r
+            r = max(1, 2 * r)
+
+    def nearest(self, lat, lon, k=1, max_demand=None):
+        """Indices of up to ``k`` live points nearest to (lat, lon), closest first"""
+        x, y = self._project(lat, lon)
+        found = []
+        found_dist = []
+        for bound, idx in self.iter_nearest(lat, lon, max_demand):
+            if len(found) and sum(map(len, found)) >= k:
+                if np.partition(np.concatenate(found_dist), k - 1)[k - 1] * PROJECTION_SLACK <= bound:
+                    break
+            found.append(idx)
+            found_dist.append(np.hypot(self.x[idx] - x, self.y[idx] - y))
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        idx = np.concatenate(found)
+        order = np.argsort(np.concatenate(found_dist), kind='stable')[:k]
+        return idx[order]
@@ -0,0 +1,156 @@
+"""Time windows (VRPTW) - arrival, wait and departure times and O(1) insertion checks"""
+import numpy as np
+
+from quickdeliver.distance import AVERAGE_SPEED_KMH
+from quickdeliver.model import PointTable, window_minutes
+
+# hard: late arrivals are not allowed; soft: allowed but reported; off: windows ignored
+WINDOW_MODES = ('hard', 'soft', 'off')
+DEFAULT_WINDOW_MODE = 'hard'
+# Minutes spent at each stop collecting parcels
+SERVICE_MINUTES = 5
+MINUTES_PER_KM = 60 / AVERAGE_SPEED_KMH
+# Soft windows: a minute late weighs as much as this many km of extra driving
+LATE_PENALTY_KM_PER_MINUTE = 0.5
+
+
+def parse_windows(points):
+    """Earliest and latest collection times (minutes after midnight) for every point.
+
+    A ``PointTable`` already holds them as arrays; 'HH:MM' strings in point
+    dicts are parsed in one vectorized pass, missing or invalid ones
+    meaning "any time".
+    """
+    if isinstance(points, PointTable):
+        earliest, latest = points.window_start, points.window_end
+    else:
+        earliest, latest = window_minutes(points)
+    return earliest.astype(np.float64), latest.astype(np.float64)
+
+
+class TimeWindows:
+    """Windows parsed once into arrays, plus the service time at each stop.
+
+    ``earliest``/``latest`` are the bounds the schedulers enforce for the
+    chosen mode; ``window_latest`` keeps the real closing times so lateness
+    can be reported in soft mode.
+    """
+
+    def __init__(self, points, mode=DEFAULT_WINDOW_MODE, service_minutes=SERVICE_MINUTES):
+        if mode not in WINDOW_MODES:
+            raise ValueError(f"Unknown time window mode: {mode}")
+        earliest, latest = parse_windows(points)
+        n = len(points)
+        self.mode = mode
+        self.window_latest = latest if mode != 'off' else np.full(n, np.inf)
+        self.earliest = earliest if mode != 'off' else np.full(n, -np.inf)
+        self.latest = latest if mode == 'hard' else np.full(n, np.inf)
+        self.service = np.full(n, float(service_minutes))
+        self.service[0] = 0.0
+
+
+def simulate_trip(stops, ready, dist, windows):
+    """Arrival, wait and departure time at every position of one depot trip.
+
+    The vehicle is ready at the depot at ``ready`` and leaves just in time
+    for the first stop's window rather than waiting there. Returns a dict of
+    arrays (``arrival``, ``wait``, ``departure``) and scalars ``start``
+    (depot departure), ``end`` (back at depot), ``late_stops``,
+    ``late_minutes`` and ``feasible`` (every enforced window met).
+    """
+    stops = np.asarray(stops)
+    n = len(stops)
+    travel = dist[stops[:-1], stops[1:]].astype(np.float64) * MINUTES_PER_KM
+    earliest = windows.earliest[stops]
+    service = windows.service[stops]
+
+    start = ready
+    if n > 2:
+        start = max(ready, earliest[1] - travel[0])
+    arrival = np.empty(n)
+    departure = np.empty(n)
+    arrival[0] = departure[0] = start
+    for p in range(1, n):
+        arrival[p] = departure[p - 1] + travel[p - 1]
+        departure[p] = max(arrival[p], earliest[p]) + service[p] if p < n - 1 else arrival[p]
+    wait = np.maximum(earliest - arrival, 0)
+    wait[0] = wait[-1] = 0
+
+    customers = stops[1:-1]
+    late = np.maximum(arrival[1:-1] - windows.window_latest[customers], 0)
+    return {
+        'arrival': arrival,
+        'wait': wait,
+        'departure': departure,
+        'start': float(start),
+        'end': float(arrival[-1]),
+        'late_stops': int(np.count_nonzero(late)),
+        'late_minutes': float(late.sum()),
+        'feasible': bool(np.all(arrival[1:-1] <= windows.latest[customers])),
+    }
+
+
+class RouteSchedule:
+    """Forward and backward time slack of one trip, for O(1) insertion checks.
+
+    Forward: when service can start at each position. Backward: the latest
+    start at each position that still lets every later stop meet its window
+    and the vehicle get back by ``end_limit``. Checking a new stop between
+    two positions then needs only the neighbours' values.
+    """
+
+    def __init__(self, stops, times, ready, dist, windows, end_limit):
+        self.stops = np.asarray(stops)
+        self.ready = ready
+        self.dist = dist
+        self.windows = windows
+        self.departure = times['departure']
+        n = len(self.stops)
+        latest_start = np.empty(n)
+        latest_start[-1] = end_limit
+        for p in range(n - 2, 0, -1):
+            here, nxt = self.stops[p], self.stops[p + 1]
+            latest_start[p] = min(
+                windows.latest[here],
+                latest_start[p + 1] - float(dist[here, nxt]) * MINUTES_PER_KM - windows.service[here]
+            )
+        if n > 1:
+            latest_start[0] = latest_start[1] - float(dist[self.stops[0], self.stops[1]]) * MINUTES_PER_KM
+        self.latest_start = latest_start
+
+    @property
+    def latest_departure(self):
+        """Latest the trip can leave the depot without breaking any window"""
+        return float(self.latest_start[0])
+
+    def can_insert(self, pos, k):
+        """Whether stop ``k`` fits between positions ``pos - 1`` and ``pos``"""
+        w = self.windows
+        prev, nxt = self.stops[pos - 1], self.stops[pos]
+        to_k = float(self.dist[prev, k]) * MINUTES_PER_KM
+        if pos == 1:
+            # The depot departure moves to suit whichever stop comes first
+            arrival = max(self.ready + to_k, w.earliest[k])
+        else:
+            arrival = self.departure[pos - 1] + to_k
+        if arrival > w.latest[k]:
+            return False
+        next_arrival = max(arrival, w.earliest[k]) + w.service[k] + float(self.dist[k, nxt]) * MINUTES_PER_KM
+        return next_arrival <= self.latest_start[pos]
+
+    def insertion_arrivals(self, ks):
+        """``can_insert`` for stops ``ks`` at every gap at once, plus the arrival times.
+
+        Returns ``(feasible, arrival)``, both shaped ``(len(ks), len(stops) - 1)``;
+        column ``g`` is the gap between positions ``g`` and ``g + 1``.
+        """
+        w = self.windows
+        ks = np.asarray(ks)
+        prev, nxt = self.stops[:-1], self.stops[1:]
+        to_k = np.asarray(self.dist[np.ix_(prev, ks)], dtype=np.float64).T * MINUTES_PER_KM
+        arrival = self.departure[None, :-1] + to_k
+        arrival[:, 0] = np.maximum(self.ready + to_k[:, 0], w.earliest[ks])
+        from_k = np.asarray(self.dist[np.ix_(ks, nxt)], dtype=np.float64) * MINUTES_PER_KM
+        next_arrival = np.maximum(arrival, w.earliest[ks, None]) + w.service[ks, None] + from_k
+        feasible = (arrival <= w.latest[ks, None]) & (next_arrival <= self.latest_start[None, 1:])
+        return feasible, arrival
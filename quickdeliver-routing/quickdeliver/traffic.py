@@ -0,0 +1,125 @@
+"""Deterministic traffic model - congestion factors per leg and time of day"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SEED = 42
+BUCKET_MINUTES = 60
+N_BUCKETS = 24 * 60 // BUCKET_MINUTES
+TABLE_SIZE = 4096
+
+# Congestion multiplier for each hour of the day (morning and evening rush hours)
+HOURLY_PROFILE = np.array([
+    0.95, 0.95, 0.95, 0.95, 0.95, 0.97,   # 00:00 - 05:59
+    1.02, 1.12, 1.15, 1.08, 1.02, 1.02,   # 06:00 - 11:59
+    1.05, 1.05, 1.02, 1.05, 1.12, 1.15,   # 12:00 - 17:59
+    1.10, 1.02, 1.00, 0.97, 0.95, 0.95,   # 18:00 - 23:59
+])
+
+# Smallest factor the model can produce; road distances never drop below
+# great-circle distance times this, which makes it usable as a search bound
+MIN_TRAFFIC_FACTOR = 0.95 * float(HOURLY_PROFILE.min())
+
+_MIX_1 = np.uint64(0xbf58476d1ce4e5b9)
+_MIX_2 = np.uint64(0x94d049bb133111eb)
+_GOLDEN = np.uint64(0x9e3779b97f4a7c15)
+
+
+def parse_hhmm(value):
+    """Minutes after midnight for an 'HH:MM' string"""
+    hours, minutes = str(value).strip().split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def parse_hhmm_array(values):
+    """Vectorized ``parse_hhmm``: minutes per value, NaN where it isn't a valid 'HH:MM'.
+
+    Only distinct values are parsed - a day has at most 1441 of them, however
+    many rows share them.
+    """
+    codes, distinct = pd.factorize(pd.Series(values, dtype=object).astype(str))
+    parts = pd.Series(distinct, dtype=object).str.extract(r'^\s*(\d{1,2}):(\d{2})(?::\d{2})?\s*$')
+    hours = parts[0].astype(float).to_numpy()
+    minutes = parts[1].astype(float).to_numpy()
+    total = hours * 60 + minutes
+    parsed = np.where((minutes < 60) & (total <= 24 * 60), total, np.nan)
+    return parsed[codes] if len(codes) else np.empty(0)
+
+
+def format_hhmm(minutes):
+    """'HH:MM' string for a time given in minutes after midnight"""
+    minutes = int(round(minutes))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def format_hhmm_array(minutes):
+    """Vectorized ``format_hhmm``: an object array of 'HH:MM' strings.
+
+    Each distinct minute is formatted once, through a lookup table.
+    """
+    minutes = np.maximum(np.rint(np.asarray(minutes, dtype=np.float64)), 0).astype(np.int64)
+    if not len(minutes):
+        return np.empty(0, dtype=object)
+    table = np.array([format_hhmm(m) for m in range(int(minutes.max()) + 1)], dtype=object)
+    return table[minutes]
+
+
+def time_bucket(minutes):
+    """Time-of-day bucket for a clock time given in minutes after midnight"""
+    return int(minutes // BUCKET_MINUTES) % N_BUCKETS
+
+
+def point_key(name, lat, lon):
+    """Stable 64-bit id for a collection point (name + rounded coordinates)"""
+    text = f"{name}|{float(lat):.6f}|{float(lon):.6f}".encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(text, digest_size=8).digest(), 'little')
+
+
+def point_keys(points):
+    """Array of stable point ids, one per point"""
+    return np.fromiter(
+        (point_key(p['name'], p['lat'], p['lon']) for p in points),
+        dtype=np.uint64, count=len(points)
+    )
+
+
+def _mix(origin_keys, dest_keys):
+    """Order-independent 64-bit hash of two key arrays (splitmix64 finalizer)"""
+    lo = np.minimum(origin_keys, dest_keys)
+    hi = np.maximum(origin_keys, dest_keys)
+    h = lo * _GOLDEN ^ hi
+    h ^= h >> np.uint64(30)
+    h *= _MIX_1
+    h ^= h >> np.uint64(27)
+    h *= _MIX_2
+    h ^= h >> np.uint64(31)
+    return h
+
+
+class TrafficModel:
+    """Seeded table of traffic factors.
+
+    A leg's factor depends only on its two point keys and the time-of-day
+    bucket, so the same A->B leg always costs the same and results are
+    reproducible for a given seed. Factors are symmetric (A->B == B->A).
+    """
+
+    def __init__(self, seed=DEFAULT_SEED, table_size=TABLE_SIZE):
+        self.seed = seed
+        self.table_size = table_size
+        rng = np.random.default_rng(seed)
+        jitter = rng.uniform(0.95, 1.15, size=(N_BUCKETS, table_size))
+        self.table = jitter * HOURLY_PROFILE[:, None]
+
+    def factors(self, origin_keys, dest_keys, bucket):
+        """Vectorized traffic factors; key arrays broadcast against each other"""
+        origin_keys = np.asarray(origin_keys, dtype=np.uint64)
+        dest_keys = np.asarray(dest_keys, dtype=np.uint64)
+        slots = _mix(origin_keys, dest_keys) % np.uint64(self.table_size)
+        return self.table[bucket % N_BUCKETS][slots]
+
+    def factor(self, origin_key, dest_key, bucket):
+        """Traffic factor for a single leg"""
+        return float(self.factors([origin_key], [dest_key], bucket)[0])
+
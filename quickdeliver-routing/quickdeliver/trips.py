@@ -0,0 +1,145 @@
+"""Vehicle shifts, back-to-back depot trips and reporting of stops left unrouted"""
+import math
+
+from quickdeliver.model import point_column
+from quickdeliver.time_windows import MINUTES_PER_KM, RouteSchedule, TimeWindows, simulate_trip
+from quickdeliver.traffic import parse_hhmm
+
+DEFAULT_SHIFT_START = 8 * 60
+DEFAULT_SHIFT_MINUTES = 10 * 60
+# Time to unload and reload at the depot between two trips of one vehicle
+TRIP_TURNAROUND_MINUTES = 15
+
+
+def depot_hours(points):
+    """(open, close) of the depot in minutes after midnight"""
+    try:
+        start = parse_hhmm(points[0]['time_start'])
+        end = parse_hhmm(points[0]['time_end'])
+    except (KeyError, IndexError, ValueError):
+        return DEFAULT_SHIFT_START, DEFAULT_SHIFT_START + DEFAULT_SHIFT_MINUTES
+    return start, max(end, start)
+
+
+def _shift_minutes(vehicle, points):
+    """Shift length from an optional ``shift_hours`` column, else the depot hours"""
+    hours = vehicle.get('shift_hours')
+    if hours is not None and not (isinstance(hours, float) and math.isnan(hours)):
+        return float(hours) * 60
+    start, end = depot_hours(points)
+    return float(end - start)
+
+
+def prepare_fleet(vehicles, points):
+    """Vehicle dicts with their list position and shift length filled in"""
+    return [
+        {**vehicle, 'index': v, 'shift_minutes': _shift_minutes(vehicle, points)}
+        for v, vehicle in enumerate(vehicles)
+    ]
+
+
+def trip_overhead(trip_number):
+    """Depot turnaround time before a vehicle's ``trip_number``-th trip (1-based)"""
+    return TRIP_TURNAROUND_MINUTES if trip_number > 1 else 0
+
+
+def schedule_vehicle(trip_stops, shift_start, shift_end, dist, windows):
+    """Run one vehicle's trips back-to-back and check them against its shift.
+
+    Returns ``(times, schedules, feasible)``: the ``simulate_trip`` result
+    for each trip, a ``RouteSchedule`` for each trip (its return limit is
+    the latest the next trip can still leave), and whether every enforced
+    window is met with the vehicle back by ``shift_end``.
+    """
+    times = []
+    ready = shift_start
+    for t, stops in enumerate(trip_stops):
+        ready += trip_overhead(t + 1)
+        times.append(simulate_trip(stops, ready, dist, windows))
+        ready = times[-1]['end']
+    feasible = ready <= shift_end and all(trip['feasible'] for trip in times)
+
+    schedules = [None] * len(trip_stops)
+    limit = shift_end
+    ready_at = [shift_start] + [trip['end'] for trip in times[:-1]]
+    for t in range(len(trip_stops) - 1, -1, -1):
+        schedules[t] = RouteSchedule(trip_stops[t], times[t], ready_at[t] + trip_overhead(t + 1),
+                                     dist, windows, limit)
+        limit = schedules[t].latest_departure - trip_overhead(t + 1)
+    return times, schedules, feasible
+
+
+def schedule_trips(routes, points, dist, windows=None):
+    """Number each vehicle's trips and run them back-to-back from the depot opening.
+
+    Routes are reordered by vehicle, keeping each vehicle's trip order, and
+    get ``trip``, ``start_time``, ``end_time`` (minutes after midnight),
+    per-stop ``arrival``/``wait``/``departure`` arrays, total ``wait_time``
+    and ``late_stops``/``late_minutes`` (soft windows only). Trips with no stops are dropped.
+    """
+    if windows is None:
+        windows = TimeWindows(points)
+    shift_start, _ = depot_hours(points)
+    routes = sorted((r for r in routes if len(r['stops']) > 2), key=lambda r: r['vehicle_index'])
+    by_vehicle = {}
+    for route in routes:
+        by_vehicle.setdefault(route['vehicle_index'], []).append(route)
+
+    for trips in by_vehicle.values():
+        shift_end = shift_start + trips[0]['shift_minutes']
+        times, _, feasible = schedule_vehicle([r['stops'] for r in trips], shift_start, shift_end,
+                                              dist, windows)
+        for t, (route, trip) in enumerate(zip(trips, times)):
+            route['trip'] = t + 1
+            route['start_time'] = trip['start']
+            route['end_time'] = trip['end']
+            route['arrival'] = trip['arrival']
+            route['wait'] = trip['wait']
+            route['departure'] = trip['departure']
+            route['wait_time'] = float(trip['wait'].sum())
+            route['late_stops'] = trip['late_stops']
+            route['late_minutes'] = trip['late_minutes']
+            route['time_feasible'] = feasible
+    return routes
+
+
+def _window_reason(i, shift_start, shift_end, dist, windows):
+    """Why stop ``i`` can't be served on its own within its window, or None"""
+    outbound = float(dist[0, i]) * MINUTES_PER_KM
+    arrival = max(shift_start + outbound, windows.earliest[i])
+    if arrival > windows.latest[i]:
+        return "Time window closes before a vehicle can get there"
+    if arrival + windows.service[i] + float(dist[i, 0]) * MINUTES_PER_KM > shift_end:
+        return "Round trip from the depot does not fit any vehicle shift"
+    return None
+
+
+def find_unassigned(points, vehicles, routes, dist, parcels, windows=None):
+    """Stops not visited by any route, each with the reason it was left out"""
+    if windows is None:
+        windows = TimeWindows(points)
+    fleet = prepare_fleet(vehicles, points)
+    routed = set()
+    for route in routes:
+        routed.update(int(i) for i in route['stops'][1:-1])
+
+    shift_start, _ = depot_hours(points)
+    max_capacity = max((v['capacity'] for v in fleet), default=0)
+    max_shift = max((v['shift_minutes'] for v in fleet), default=0)
+    names = point_column(points, 'name', object)
+    unassigned = []
+    for i in range(1, len(points)):
+        if i in routed:
+            continue
+        if parcels[i] > max_capacity:
+            reason = f"Parcels ({parcels[i]}) exceed the largest vehicle capacity ({max_capacity})"
+        else:
+            reason = _window_reason(i, shift_start, shift_start + max_shift, dist, windows)
+            reason = reason or "Fleet capacity, shift time and time windows used up"
+        unassigned.append({
+            'index': i,
+            'name': names[i],
+            'parcels': parcels[i].item(),
+            'reason': reason
+        })
+    return unassigned